@@ -3,314 +3,128 @@ app.py
 Assembla tutti i componenti e genera il report HTML completo standalone.
 """
 
+import argparse
+import os
+from datetime import datetime
+from functools import lru_cache
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
 from monte_carlo_engine import run_monte_carlo_simulation
-from data_formatter import prepare_plotly_data, create_summary_table, format_currency
+from data_formatter import prepare_plotly_data, pack_plotly_data, create_summary_table, format_currency
 from chart_generator import create_monte_carlo_chart, COLORS
 
 
-def generate_html_report(params: dict) -> str:
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+# Nome del runtime grafico condiviso nei bundle offline
+CHART_RUNTIME_FILENAME = 'plotly.min.js'
+
+# Traiettorie casuali nei report salvati (la UI web mostra tutto il campione):
+# bastano poche linee per dare l'idea, ognuna pesa come una banda
+REPORT_SAMPLE_PATHS = 3
+
+
+@lru_cache(maxsize=None)
+def get_report_template():
     """
-    Genera report HTML completo con grafico e tabella.
+    Compila (una sola volta per processo) il template templates/report.html.
+    """
+    env = Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        autoescape=select_autoescape(['html'])
+    )
+    return env.get_template('report.html')
+
+
+def write_chart_runtime(output_dir: str) -> str:
+    """
+    Scrive (una sola volta) la copia locale di plotly.js condivisa dai report del bundle.
+    
+    Returns:
+        percorso del file runtime
+    """
+    import plotly.offline
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, CHART_RUNTIME_FILENAME)
+    runtime = plotly.offline.get_plotlyjs()
+    if not os.path.exists(path) or os.path.getsize(path) != len(runtime.encode('utf-8')):
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(runtime)
+        os.replace(tmp_path, path)
+    return path
+
+
+def render_html_report(params: dict, results: dict, bundle: bool = False) -> str:
+    """
+    Renderizza il report HTML a partire da risultati già simulati.
     
     Args:
         params: dizionario parametri simulazione
+        results: output di run_monte_carlo_simulation()
+        bundle: se True il report usa il runtime locale condiviso
+                (CHART_RUNTIME_FILENAME nella stessa cartella, vedi
+                write_chart_runtime) e funziona offline; altrimenti usa il CDN
         
     Returns:
         stringa HTML completa pronta da salvare
     """
-    
-    print("🔄 Eseguo simulazione Monte Carlo...")
-    results = run_monte_carlo_simulation(params)
-    
-    print("📊 Preparo dati per visualizzazione...")
+    # Serie arrotondate e impacchettate come typed array (molto più compatte del JSON testuale)
     plotly_data = prepare_plotly_data(results)
-    
-    print("🎨 Genero grafico interattivo...")
+    if 'samples' in plotly_data:
+        plotly_data['samples'] = plotly_data['samples'][:REPORT_SAMPLE_PATHS]
+    plotly_data = pack_plotly_data(plotly_data)
     fig = create_monte_carlo_chart(plotly_data, params)
-    
-    print("📋 Creo tabella scenari...")
     table_data = create_summary_table(results, params['capital'])
     
-    # Converti grafico in HTML (usa CDN per plotly.js)
+    # Converti grafico in HTML (runtime locale nel bundle, CDN altrimenti)
     chart_html = fig.to_html(
-        include_plotlyjs='cdn',
+        include_plotlyjs=CHART_RUNTIME_FILENAME if bundle else 'cdn',
+        full_html=False,
         div_id='monte-carlo-chart',
         config={'displayModeBar': True, 'displaylogo': False}
     )
     
-    # ========== COSTRUISCI RIGHE TABELLA ==========
-    table_rows = ""
-    for row in table_data:
-        table_rows += f"""
-                    <tr>
-                        <td class="scenario-label">{row['label']}</td>
-                        <td>{row['percentile']}</td>
-                        <td class="value">{row['value_formatted']}</td>
-                        <td class="positive">{row['variation']}</td>
-                        <td>{row['cagr_formatted']}</td>
-                    </tr>"""
+    return get_report_template().render(
+        params=params,
+        colors=COLORS,
+        chart_html=chart_html,
+        table_data=table_data,
+        capital_formatted=format_currency(params['capital']),
+        generated_at=datetime.now().strftime('%d/%m/%Y alle %H:%M')
+    )
+
+
+def generate_html_report(params: dict, bundle: bool = False) -> str:
+    """
+    Genera report HTML completo con grafico e tabella.
     
-    # ========== HTML COMPLETO ==========
-    html = f"""<!DOCTYPE html>
-<html lang="it">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Simulazione Monte Carlo - Futura SCF</title>
-    <style>
-        /* ===== RESET E BASE ===== */
-        * {{
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }}
-        
-        body {{
-            font-family: Futura, Trebuchet MS, Helvetica, Arial, sans-serif;
-            background-color: #f8f9fa;
-            color: {COLORS['text']};
-            line-height: 1.6;
-            padding: 20px;
-        }}
-        
-        /* ===== CONTAINER PRINCIPALE ===== */
-        .container {{
-            max-width: 1400px;
-            margin: 0 auto;
-            background: white;
-            padding: 40px;
-            border-radius: 8px;
-            box-shadow: 0 2px 12px rgba(0,0,0,0.08);
-        }}
-        
-        /* ===== HEADER ===== */
-        .header {{
-            text-align: center;
-            margin-bottom: 40px;
-            padding-bottom: 20px;
-            border-bottom: 2px solid {COLORS['primary_blue']};
-        }}
-        
-        h1 {{
-            color: {COLORS['primary_blue']};
-            font-size: 32px;
-            font-weight: 600;
-            margin-bottom: 10px;
-        }}
-        
-        .subtitle {{
-            color: #666;
-            font-size: 16px;
-            font-weight: 300;
-        }}
-        
-        /* ===== SEZIONE GRAFICO ===== */
-        .chart-section {{
-            margin: 40px 0;
-        }}
-        
-        /* ===== SEZIONE TABELLA ===== */
-        .table-section {{
-            margin-top: 50px;
-        }}
-        
-        h2 {{
-            color: {COLORS['primary_blue']};
-            font-size: 24px;
-            font-weight: 600;
-            margin-bottom: 20px;
-            padding-bottom: 10px;
-            border-bottom: 1px solid {COLORS['grid']};
-        }}
-        
-        /* ===== TABELLA SCENARI ===== */
-        table {{
-            width: 100%;
-            border-collapse: collapse;
-            margin-top: 20px;
-            font-size: 14px;
-            box-shadow: 0 1px 3px rgba(0,0,0,0.05);
-        }}
-        
-        thead {{
-            background-color: {COLORS['primary_blue']};
-            color: white;
-        }}
-        
-        th {{
-            padding: 15px 12px;
-            text-align: left;
-            font-weight: 600;
-            text-transform: uppercase;
-            font-size: 12px;
-            letter-spacing: 0.5px;
-        }}
-        
-        td {{
-            padding: 15px 12px;
-            border-bottom: 1px solid {COLORS['grid']};
-        }}
-        
-        tbody tr:hover {{
-            background-color: #f8f9fa;
-            transition: background-color 0.2s ease;
-        }}
-        
-        tbody tr:last-child td {{
-            border-bottom: none;
-        }}
-        
-        /* ===== STILI CELLE SPECIALI ===== */
-        .scenario-label {{
-            font-weight: 600;
-            color: {COLORS['primary_blue']};
-        }}
-        
-        .value {{
-            font-weight: 600;
-            color: {COLORS['text']};
-        }}
-        
-        .positive {{
-            color: {COLORS['green_optimistic']};
-            font-weight: 500;
-        }}
-        
-        /* ===== FOOTER ===== */
-        .footer {{
-            margin-top: 60px;
-            padding-top: 30px;
-            border-top: 2px solid {COLORS['grid']};
-            text-align: center;
-        }}
-        
-        .disclaimer {{
-            background-color: #fff3cd;
-            border-left: 4px solid #ffc107;
-            padding: 15px 20px;
-            margin-bottom: 20px;
-            font-size: 13px;
-            text-align: left;
-            border-radius: 4px;
-        }}
-        
-        .disclaimer strong {{
-            color: #856404;
-            display: block;
-            margin-bottom: 5px;
-        }}
-        
-        .footer-text {{
-            color: #666;
-            font-size: 13px;
-        }}
-        
-        .footer-text strong {{
-            color: {COLORS['primary_blue']};
-        }}
-        
-        /* ===== RESPONSIVE ===== */
-        @media (max-width: 768px) {{
-            .container {{
-                padding: 20px;
-            }}
-            
-            h1 {{
-                font-size: 24px;
-            }}
-            
-            h2 {{
-                font-size: 20px;
-            }}
-            
-            table {{
-                font-size: 12px;
-            }}
-            
-            th, td {{
-                padding: 10px 8px;
-            }}
-        }}
-        
-        /* ===== PRINT STYLES ===== */
-        @media print {{
-            body {{
-                background: white;
-                padding: 0;
-            }}
-            
-            .container {{
-                box-shadow: none;
-                padding: 20px;
-            }}
-            
-            .footer {{
-                page-break-before: avoid;
-            }}
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <!-- HEADER -->
-        <div class="header">
-            <h1>📊 Simulazione Monte Carlo</h1>
-            <p class="subtitle">Analisi Probabilistica Portafoglio {format_currency(params['capital'])}</p>
-        </div>
-        
-        <!-- GRAFICO -->
-        <div class="chart-section">
-            {chart_html}
-        </div>
-        
-        <!-- TABELLA SCENARI -->
-        <div class="table-section">
-            <h2>Scenari Probabilistici</h2>
-            <p style="color: #666; margin-bottom: 15px; font-size: 14px;">
-                Distribuzione dei possibili risultati finali dopo {params['years']} anni (10.000 simulazioni)
-            </p>
-            
-            <table>
-                <thead>
-                    <tr>
-                        <th>Scenario</th>
-                        <th>Percentile</th>
-                        <th>Valore Finale</th>
-                        <th>Variazione</th>
-                        <th>CAGR</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    {table_rows}
-                </tbody>
-            </table>
-        </div>
+    Args:
+        params: dizionario parametri simulazione
+        bundle: report per bundle offline (vedi render_html_report)
         
-        <!-- FOOTER E DISCLAIMER -->
-        <div class="footer">
-            <div class="disclaimer">
-                <strong>⚠️ Disclaimer Importante</strong>
-                Questa simulazione è basata su ipotesi probabilistiche (rendimento atteso {params['mu']*100:.2f}%, 
-                volatilità {params['sigma']*100:.2f}%) e modella la distribuzione storica dei rendimenti. 
-                I risultati NON costituiscono garanzia di performance futura. I mercati finanziari sono soggetti 
-                a rischi imprevedibili e eventi estremi che possono non essere catturati da modelli matematici.
-            </div>
-            
-            <p class="footer-text">
-                <strong>Futura SCF</strong> - Società di Consulenza Finanziaria<br>
-                Consulenza Finanziaria Indipendente<br>
-                Report generato il {__import__('datetime').datetime.now().strftime('%d/%m/%Y alle %H:%M')}
-            </p>
-        </div>
-    </div>
-</body>
-</html>"""
+    Returns:
+        stringa HTML completa pronta da salvare
+    """
     
-    return html
+    print("🔄 Eseguo simulazione Monte Carlo...")
+    results = run_monte_carlo_simulation(params)
+    
+    print("🎨 Genero grafico interattivo e tabella scenari...")
+    return render_html_report(params, results, bundle=bundle)
 
 
 # ========== ESECUZIONE PRINCIPALE ==========
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report Monte Carlo - Futura SCF")
+    parser.add_argument('--bundle', metavar='DIR', default=None,
+                        help="crea un bundle offline (report + runtime grafico locale) in DIR")
+    parser.add_argument('--stress', action='store_true',
+                        help="aggiunge gli scenari 1%% e 0,1%% stimati con importance sampling")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("🚀 GENERAZIONE REPORT MONTE CARLO - FUTURA SCF")
     print("=" * 60)
@@ -323,7 +137,8 @@ if __name__ == "__main__":
         'sigma': 0.0695,         # 6.95% volatilità annua
         'years': 30,             # Orizzonte 30 anni
         'n_sims': 10_000,        # 10.000 simulazioni
-        'seed': 42               # Seed per riproducibilità
+        'seed': 42,              # Seed per riproducibilità
+        'tail_sampling': args.stress  # Code estreme (1°, 0,1° percentile)
     }
     
     print("📝 Parametri simulazione:")
@@ -335,10 +150,13 @@ if __name__ == "__main__":
     print()
     
     # ===== GENERA REPORT =====
-    html_content = generate_html_report(params)
+    html_content = generate_html_report(params, bundle=args.bundle is not None)
     
     # ===== SALVA FILE =====
     output_filename = 'report_monte_carlo_futura_scf.html'
+    if args.bundle:
+        write_chart_runtime(args.bundle)
+        output_filename = os.path.join(args.bundle, output_filename)
     with open(output_filename, 'w', encoding='utf-8') as f:
         f.write(html_content)
     
@@ -0,0 +1,219 @@
+"""
+asset_statistics.py
+Statistiche degli asset (mu, sigma, correlazioni) calcolate su un unico
+DataFrame "largo" allineato, con operazioni vettoriali su tutte le colonne.
+
+pandas serve solo alla pipeline dati (fetch_returns.py) e viene importato al
+primo uso: il percorso web usa solo le funzioni matriciali in numpy
+(nearest_psd_correlation) e non deve caricarlo.
+"""
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# Fattore di annualizzazione per frequenza dello storico
+PERIODS_PER_YEAR = {'D': 252, 'M': 12}
+
+
+def monthly_compound(daily: 'pd.DataFrame') -> 'pd.DataFrame':
+    """
+    Rendimenti mensili composti da rendimenti giornalieri, per tutte le colonne insieme.
+
+    (1 + r_1)···(1 + r_n) - 1 = expm1(Σ log1p(r_i)): la composizione diventa una
+    somma raggruppata per mese, senza lambda Python per ogni mese.
+    Come resample().apply() su ogni serie, i mesi senza dati *all'interno* dello
+    storico di una colonna valgono 0, quelli prima dell'inizio/dopo la fine NaN.
+    """
+    log_returns = np.log1p(daily)
+    sums = log_returns.resample('ME').sum()
+    has_data = daily.notna().resample('ME').sum() > 0
+    inside = has_data.cummax() & has_data[::-1].cummax()[::-1]
+    return np.expm1(sums).where(inside)
+
+
+def masked_correlation(values: np.ndarray) -> np.ndarray:
+    """
+    Correlazioni a coppie su dati con buchi (NaN), con soli prodotti matriciali.
+
+    Per ogni coppia (i, j) usa solo i periodi in cui entrambe le serie sono
+    disponibili, come DataFrame.corr(): con M maschera di disponibilità e X i
+    valori (0 dove mancanti), le somme sulle sovrapposizioni sono
+    n = MᵀM, Σx = XᵀM, Σx² = (X²)ᵀM, Σxy = XᵀX.
+    """
+    mask = ~np.isnan(values)
+    m = mask.astype(float)
+    x = np.where(mask, values, 0.0)
+
+    # Centra ogni colonna sulla propria media (non cambia le covarianze,
+    # riduce la cancellazione numerica nelle somme)
+    col_mean = x.sum(axis=0) / np.maximum(m.sum(axis=0), 1)
+    x = np.where(mask, x - col_mean, 0.0)
+
+    n = m.T @ m
+    sum_x = x.T @ m
+    sum_y = sum_x.T
+    sum_xx = (x * x).T @ m
+    sum_yy = sum_xx.T
+    sum_xy = x.T @ x
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sum_xy - sum_x * sum_y / n
+        var_x = sum_xx - sum_x**2 / n
+        var_y = sum_yy - sum_y**2 / n
+        corr = cov / np.sqrt(var_x * var_y)
+
+    corr[n < 2] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+def compute_asset_statistics(returns: dict, specs: dict):
+    """
+    Calcola mu/sigma annualizzati e matrice di correlazione (su rendimenti mensili).
+
+    Args:
+        returns: {chiave asset: pd.Series di rendimenti} (giornalieri o mensili)
+        specs: {chiave asset: {'name': ..., 'freq': 'D' | 'M'}}
+
+    Returns:
+        tupla (stats, correlation_matrix, monthly):
+            - stats: {chiave: {'name', 'mu', 'sigma'}} nell'ordine di returns
+            - correlation_matrix: pd.DataFrame indicizzato per chiave asset
+            - monthly: DataFrame largo dei rendimenti mensili (fine mese)
+    """
+    import pandas as pd
+
+    keys = [k for k, r in returns.items() if r is not None and len(r) > 0]
+    daily_keys = [k for k in keys if specs[k]['freq'] == 'D']
+    monthly_keys = [k for k in keys if specs[k]['freq'] == 'M']
+
+    mu = {}
+    sigma = {}
+    monthly_parts = []
+
+    if daily_keys:
+        daily = pd.DataFrame({k: returns[k] for k in daily_keys})
+        periods = PERIODS_PER_YEAR['D']
+        mu.update(daily.mean() * periods)
+        sigma.update(daily.std() * (periods**0.5))
+        monthly_parts.append(monthly_compound(daily))
+
+    if monthly_keys:
+        monthly_raw = pd.DataFrame({k: returns[k] for k in monthly_keys})
+        periods = PERIODS_PER_YEAR['M']
+        mu.update(monthly_raw.mean() * periods)
+        sigma.update(monthly_raw.std() * (periods**0.5))
+        monthly_parts.append(monthly_raw)
+
+    # Allinea tutte le serie a fine mese e unisci (outer join)
+    aligned = []
+    for part in monthly_parts:
+        part = part.copy()
+        part.index = part.index.to_period('M').to_timestamp('M')
+        aligned.append(part)
+    monthly = pd.concat(aligned, axis=1)[keys]
+
+    correlation_matrix = pd.DataFrame(
+        masked_correlation(monthly.to_numpy(dtype=float)), index=keys, columns=keys)
+
+    stats = {
+        k: {
+            "name": specs[k]['name'],
+            "mu": float(mu[k]),
+            "sigma": float(sigma[k])
+        }
+        for k in keys
+    }
+    return stats, correlation_matrix, monthly
+
+
+# Autovalore minimo imposto nella riparazione PSD (la matrice resta definita
+# positiva, quindi la fattorizzazione di Cholesky esiste sempre)
+MIN_EIGENVALUE = 1e-6
+
+
+def shrinkage_correlation(values: np.ndarray):
+    """
+    Correlazioni a coppie con shrinkage verso l'identità (Ledoit-Wolf / Schäfer-Strimmer).
+
+    R* = (1 - λ) R + λ I, con intensità ottimale
+    λ = Σ_{i≠j} Var(r_ij) / Σ_{i≠j} r_ij², dove Var(r_ij) si stima dai
+    prodotti w_k = z_ki z_kj dei dati standardizzati sulle sole osservazioni
+    comuni: Var(r_ij) = n / (n - 1)³ · Σ_k (w_k - w̄)². Le coppie senza
+    sovrapposizione valgono 0 (il valore del target).
+
+    Returns:
+        tupla (matrice di correlazione N x N, intensità λ in [0, 1])
+    """
+    mask = ~np.isnan(values)
+    m = mask.astype(float)
+    mean = np.nanmean(values, axis=0)
+    std = np.nanstd(values, axis=0, ddof=1)
+    z = np.where(mask, (values - mean) / std, 0.0)
+
+    n = m.T @ m
+    sum_w = z.T @ z
+    sum_w2 = (z * z).T @ (z * z)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var_r = n / (n - 1)**3 * (sum_w2 - sum_w**2 / n)
+
+    correlation = np.nan_to_num(masked_correlation(values), nan=0.0)
+    off_diag = ~np.eye(len(correlation), dtype=bool) & (n >= 2)
+    denominator = np.sum(correlation[off_diag]**2)
+    lam = float(np.sum(var_r[off_diag]) / denominator) if denominator > 0 else 1.0
+    lam = min(max(lam, 0.0), 1.0)
+
+    shrunk = (1.0 - lam) * correlation
+    np.fill_diagonal(shrunk, 1.0)
+    return shrunk, lam
+
+
+def nearest_psd_correlation(correlation: np.ndarray, min_eigenvalue: float = MIN_EIGENVALUE) -> np.ndarray:
+    """
+    Riparazione PSD: taglia gli autovalori sotto min_eigenvalue e riporta la diagonale a 1.
+
+    Il riscalamento D^-1/2 A D^-1/2 è una congruenza, quindi non crea autovalori negativi.
+    """
+    eigenvalues, eigenvectors = np.linalg.eigh((correlation + correlation.T) / 2)
+    if eigenvalues.min() >= min_eigenvalue:
+        return correlation
+    repaired = (eigenvectors * np.maximum(eigenvalues, min_eigenvalue)) @ eigenvectors.T
+    d = np.sqrt(np.diag(repaired))
+    repaired = repaired / d[:, None] / d[None, :]
+    np.fill_diagonal(repaired, 1.0)
+    return (repaired + repaired.T) / 2
+
+
+def covariance_model(stats: dict, monthly: 'pd.DataFrame') -> dict:
+    """
+    Covarianza annualizzata stimata con shrinkage, garantita PSD, con fattore di Cholesky.
+
+    Le volatilità sono quelle di stats (storico completo di ogni asset), le
+    correlazioni quelle di shrinkage_correlation() riparate: Σ = D R* D.
+    I motori di simulazione generano shock correlati con un solo prodotto
+    matriciale: Z @ Lᵀ con Z normali standard indipendenti.
+
+    Returns:
+        dict serializzabile in JSON: keys, correlation, matrix, cholesky,
+        shrinkage, min_eigenvalue
+    """
+    keys = list(stats)
+    correlation, lam = shrinkage_correlation(monthly[keys].to_numpy(dtype=float))
+    correlation = nearest_psd_correlation(correlation)
+
+    sigma = np.array([stats[k]['sigma'] for k in keys])
+    covariance = sigma[:, None] * correlation * sigma[None, :]
+    cholesky = np.linalg.cholesky(covariance)
+
+    return {
+        'keys': keys,
+        'correlation': correlation.tolist(),
+        'matrix': covariance.tolist(),
+        'cholesky': cholesky.tolist(),
+        'shrinkage': lam,
+        'min_eigenvalue': float(np.linalg.eigvalsh(correlation).min())
+    }
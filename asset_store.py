@@ -0,0 +1,159 @@
+"""
+asset_store.py
+Pubblicazione atomica del dataset asset e copia in memoria ricaricata a caldo.
+
+La pipeline (fetch_returns.py) pubblica asset_data.json con publish_asset_data():
+file temporaneo nella stessa cartella, fsync, rename. Un lettore vede sempre
+la versione precedente completa oppure quella nuova, mai un file a metà.
+
+web_app tiene in un AssetDataStore il dataset già convertito in array
+(PortfolioModel: vettori mu/sigma e covarianza per indice asset, più le
+statistiche per finestra): un thread in background controlla con os.stat se
+è comparsa una nuova versione e sostituisce il riferimento in un colpo solo.
+Le richieste non leggono mai file.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from portfolio_model import PortfolioModel
+from window_statistics import load_window_statistics
+
+
+# Intervallo di controllo dei file pubblicati (secondi)
+DEFAULT_POLL_INTERVAL = 5.0
+
+
+def _fsync_directory(directory: str):
+    """
+    Rende persistente il rename (voce di directory) dove il sistema lo supporta.
+    """
+    try:
+        fd = os.open(directory or '.', os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def publish_asset_data(data: dict, path: str) -> str:
+    """
+    Pubblica asset_data.json in modo atomico con un identificativo di versione.
+
+    La versione combina data di pubblicazione e hash del contenuto, così due
+    export con gli stessi dati restano riconoscibili.
+
+    Returns:
+        la versione pubblicata
+    """
+    payload = {k: v for k, v in data.items() if k != 'version'}
+    digest = hashlib.sha1(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()[:10]
+    version = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{digest}"
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': version, **payload}, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_directory(directory)
+    return version
+
+
+def _file_signature(path: str):
+    """
+    Identità di un file pubblicato: un rename cambia inode e mtime.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class AssetDataStore:
+    """
+    Dataset asset in memoria (PortfolioModel + statistiche per finestra), ricaricato a caldo.
+
+    model e window_stats sono oggetti immutabili sostituiti per riferimento:
+    una richiesta che li legge all'inizio lavora su una versione coerente
+    anche se nel frattempo ne arriva una nuova.
+    """
+
+    def __init__(self, path: str, stats_path: str = None,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.path = path
+        self.stats_path = stats_path
+        self.poll_interval = poll_interval
+        self.model = None
+        self.window_stats = None
+        self._signatures = (None, None)
+        self._lock = threading.Lock()
+        self._watcher_pid = None
+        self.reload_if_changed()
+
+    @property
+    def version(self):
+        return self.model.version if self.model is not None else None
+
+    def reload_if_changed(self) -> bool:
+        """
+        Ricarica i file che hanno cambiato firma; True se è stato sostituito qualcosa.
+
+        Se il nuovo file non è leggibile resta in uso la versione precedente
+        (e non viene riletto finché non cambia di nuovo).
+        """
+        with self._lock:
+            data_sig = _file_signature(self.path)
+            stats_sig = _file_signature(self.stats_path) if self.stats_path else None
+            changed = False
+
+            if data_sig != self._signatures[0]:
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        self.model = PortfolioModel.from_asset_data(json.load(f))
+                    changed = True
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"⚠️ Dataset asset non ricaricato ({self.path}): {e}")
+
+            if stats_sig != self._signatures[1]:
+                try:
+                    self.window_stats = load_window_statistics(self.stats_path)
+                    changed = True
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"⚠️ Statistiche per finestra non ricaricate ({self.stats_path}): {e}")
+
+            self._signatures = (data_sig, stats_sig)
+            return changed
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            if self.reload_if_changed():
+                print(f"🔄 Dataset asset ricaricato (versione {self.version})")
+
+    def ensure_watcher(self):
+        """
+        Avvia il thread di controllo nel processo corrente, se non è già attivo.
+
+        Il controllo sul pid rende la chiamata sicura dopo un fork (gunicorn con
+        preload): ogni worker avvia il proprio thread alla prima richiesta.
+        """
+        pid = os.getpid()
+        if self._watcher_pid == pid:
+            return
+        with self._lock:
+            if self._watcher_pid == pid:
+                return
+            threading.Thread(target=self._watch, name='asset-data-watcher', daemon=True).start()
+            self._watcher_pid = pid
@@ -0,0 +1,281 @@
+"""
+load_test.py
+Test di carico di /simulate con diversi modelli di worker gunicorn.
+
+Per ogni combinazione (worker class, numero di worker, concorrenza) avvia
+gunicorn in locale su una porta libera, invia per la durata indicata un mix
+realistico di richieste (preset di allocazione, parametri manuali, n_sims e
+orizzonti con la distribuzione dell'interfaccia) da N client concorrenti a
+ciclo chiuso e riporta throughput e latenze p50/p95/p99.
+
+Uso:
+    python benchmarks/load_test.py --worker-class sync,gthread --workers 1,2,4 --concurrency 1,4,8
+    python benchmarks/load_test.py --worker-class gthread --workers 2 --pool-workers 4   # pool dedicato
+    python benchmarks/load_test.py --url http://127.0.0.1:5003 --concurrency 4   # server già avviato
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Preset dell'interfaccia (static/js/main.js), pesi % per chiave asset
+PRESETS = {
+    'conservative': {'sp500': 20, 'world_ex_usa': 10, 'euro_aggregate': 40,
+                     'global_aggregate': 20, 'gold': 10},
+    'balanced': {'sp500': 40, 'world_ex_usa': 20, 'emerging_markets': 5,
+                 'euro_aggregate': 15, 'global_aggregate': 10, 'gold': 10},
+    'aggressive': {'sp500': 50, 'world_ex_usa': 20, 'emerging_markets': 10, 'quality': 5,
+                   'value': 5, 'momentum': 5, 'gold': 5},
+    'golden_butterfly': {'sp500': 20, 'small_cap': 20, 'euro_aggregate': 20,
+                         'global_aggregate': 20, 'gold': 20},
+    'permanent': {'sp500': 25, 'euro_aggregate': 25, 'global_aggregate': 25, 'gold': 25},
+    'all_weather': {'sp500': 30, 'global_aggregate': 40, 'euro_aggregate': 15, 'gold': 15}
+}
+
+# Distribuzioni del mix di richieste: {valore: peso}
+PRESET_SHARE = 0.7                                   # resto: parametri manuali
+N_SIMS_MIX = {1_000: 0.2, 5_000: 0.3, 10_000: 0.5}   # 10.000 è il default dell'interfaccia
+YEARS_MIX = {10: 0.15, 20: 0.25, 30: 0.45, 40: 0.15}
+
+STARTUP_TIMEOUT = 60
+REQUEST_TIMEOUT = 120
+
+
+def build_payloads(n: int, seed: int = 0) -> list:
+    """
+    Genera n payload /simulate (mu e sigma in %, come li invia il browser).
+    """
+    from portfolio_model import load_portfolio_model
+
+    model = load_portfolio_model(os.path.join(ROOT, 'static', 'asset_data.json'))
+    preset_inputs = {}
+    for name, weights in PRESETS.items():
+        mu, sigma = model.portfolio_stats(model.weights_vector(weights))
+        preset_inputs[name] = (float(mu) * 100, float(sigma) * 100)
+
+    rng = random.Random(seed)
+    payloads = []
+    for _ in range(n):
+        if rng.random() < PRESET_SHARE:
+            mu, sigma = preset_inputs[rng.choice(list(PRESETS))]
+        else:
+            mu, sigma = round(rng.uniform(3, 9), 2), round(rng.uniform(5, 20), 2)
+        payloads.append({
+            'capital': rng.choice([100_000, 250_000, 400_000, 1_000_000]),
+            'mu': mu,
+            'sigma': sigma,
+            'years': rng.choices(list(YEARS_MIX), weights=list(YEARS_MIX.values()))[0],
+            'n_sims': rng.choices(list(N_SIMS_MIX), weights=list(N_SIMS_MIX.values()))[0]
+        })
+    return payloads
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_pool(workers: int, socket_path: str) -> subprocess.Popen:
+    """
+    Avvia il pool di simulazione (simulation_pool.py) e attende il socket.
+    """
+    process = subprocess.Popen([sys.executable, 'simulation_pool.py', '--socket', socket_path,
+                                '--workers', str(workers)],
+                               cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"pool terminato: {process.stderr.read().decode(errors='replace')}")
+        if os.path.exists(socket_path):
+            return process
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("il pool di simulazione non è partito entro il timeout di avvio")
+
+
+def start_server(worker_class: str, workers: int, threads: int, port: int,
+                 pool_socket: str = None) -> subprocess.Popen:
+    """
+    Avvia gunicorn in locale e attende che risponda (con pool_socket le
+    simulazioni vanno al pool dedicato).
+    """
+    cmd = [sys.executable, '-m', 'gunicorn', 'web_app:app',
+           '--bind', f'127.0.0.1:{port}',
+           '--worker-class', worker_class,
+           '--workers', str(workers),
+           '--timeout', str(REQUEST_TIMEOUT),
+           '--log-level', 'warning']
+    if worker_class == 'gthread':
+        cmd += ['--threads', str(threads)]
+    env = dict(os.environ, MC_POOL_SOCKET=pool_socket) if pool_socket else None
+    process = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn terminato: {process.stderr.read().decode(errors='replace')}")
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=2):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn non ha risposto entro il timeout di avvio")
+
+
+def stop_server(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def _post(url: str, payload: dict) -> bool:
+    request = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            response.read()
+            return response.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def run_load(base_url: str, payloads: list, concurrency: int, duration: float) -> dict:
+    """
+    Carico a ciclo chiuso: concurrency client, ciascuno invia la richiesta
+    successiva appena riceve la risposta, per duration secondi.
+    """
+    url = base_url.rstrip('/') + '/simulate'
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    cursor = [0]
+    stop_at = time.monotonic() + duration
+
+    def client():
+        while time.monotonic() < stop_at:
+            with lock:
+                payload = payloads[cursor[0] % len(payloads)]
+                cursor[0] += 1
+            start = time.perf_counter()
+            ok = _post(url, payload)
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    lat = np.array(latencies) if latencies else np.array([np.nan])
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'throughput': len(latencies) / wall,
+        'p50': float(np.percentile(lat, 50)),
+        'p95': float(np.percentile(lat, 95)),
+        'p99': float(np.percentile(lat, 99)),
+        'mean': float(np.mean(lat)),
+        'wall': wall
+    }
+
+
+def _int_list(value: str) -> list:
+    return [int(v) for v in value.split(',') if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test di carico di /simulate")
+    parser.add_argument('--worker-class', default='sync,gthread',
+                        help="worker class gunicorn separate da virgola (sync, gthread, gevent...)")
+    parser.add_argument('--workers', default='1,2', help="numeri di worker da provare")
+    parser.add_argument('--threads', type=int, default=4, help="thread per worker (gthread)")
+    parser.add_argument('--concurrency', default='1,4,8', help="client concorrenti da provare")
+    parser.add_argument('--duration', type=float, default=20.0, help="secondi di carico per combinazione")
+    parser.add_argument('--warmup', type=int, default=4, help="richieste di riscaldamento prima della misura")
+    parser.add_argument('--pool-workers', type=int, default=0,
+                        help="worker del pool di simulazione dedicato (0 = simulazione nei worker HTTP)")
+    parser.add_argument('--url', default=None, help="usa un server già avviato invece di gunicorn locale")
+    parser.add_argument('--seed', type=int, default=0, help="seed del mix di richieste")
+    parser.add_argument('--output', default=None, help="salva i risultati in JSON")
+    args = parser.parse_args()
+
+    payloads = build_payloads(500, args.seed)
+    concurrencies = _int_list(args.concurrency)
+
+    if args.url:
+        configs = [('external', 0, args.url)]
+    else:
+        configs = [(wc, w, None) for wc in args.worker_class.split(',') for w in _int_list(args.workers)]
+
+    pool, pool_socket = None, None
+    if args.pool_workers and not args.url:
+        pool_socket = os.path.join(ROOT, f'.load_test_pool_{os.getpid()}.sock')
+        pool = start_pool(args.pool_workers, pool_socket)
+        print(f"🧵 Pool di simulazione: {args.pool_workers} worker")
+
+    print(f"🔥 {len(configs)} configurazioni server x {len(concurrencies)} livelli di concorrenza, "
+          f"{args.duration:.0f}s ciascuno (CPU: {os.cpu_count()})")
+    print(f"{'worker':<10} {'n':>3} {'conc':>5} {'req':>6} {'err':>4} {'req/s':>7} "
+          f"{'p50':>8} {'p95':>8} {'p99':>8}")
+
+    results = []
+    for worker_class, workers, url in configs:
+        process = None
+        try:
+            if url is None:
+                port = _free_port()
+                process = start_server(worker_class, workers, args.threads, port, pool_socket)
+                url = f'http://127.0.0.1:{port}'
+            for payload in payloads[:args.warmup]:
+                _post(url.rstrip('/') + '/simulate', payload)
+
+            for concurrency in concurrencies:
+                r = run_load(url, payloads, concurrency, args.duration)
+                results.append({'worker_class': worker_class, 'workers': workers,
+                                'pool_workers': args.pool_workers,
+                                'threads': args.threads if worker_class == 'gthread' else 1,
+                                'concurrency': concurrency, **r})
+                print(f"{worker_class:<10} {workers:>3} {concurrency:>5} {r['requests']:>6} {r['errors']:>4} "
+                      f"{r['throughput']:7.2f} {r['p50'] * 1000:6.0f}ms {r['p95'] * 1000:6.0f}ms "
+                      f"{r['p99'] * 1000:6.0f}ms")
+        except RuntimeError as e:
+            print(f"❌ {worker_class} x{workers}: {e}")
+        finally:
+            if process is not None:
+                stop_server(process)
+
+    if pool is not None:
+        stop_server(pool)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'cpu_count': os.cpu_count(), 'duration': args.duration, 'results': results}, f, indent=2)
+        print(f"\n💾 Risultati salvati in '{args.output}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+run_benchmarks.py
+Suite di benchmark riproducibile dei percorsi critici (import a freddo, motore,
+post-processing, report HTML, endpoint /simulate), eseguibile interamente offline.
+
+Per ogni caso misura il tempo (mediana e minimo su più ripetizioni, dopo un
+warm-up) e il picco di memoria allocata (tracemalloc, in un'esecuzione a parte
+per non falsare i tempi). I risultati si salvano come baseline JSON; le
+esecuzioni successive vengono confrontate con la baseline e i casi più lenti
+oltre la soglia sono segnalati come regressioni (exit code 1). I casi che
+producono testo (report HTML) registrano anche la dimensione dell'output,
+confrontata con un limite fisso (SIZE_BUDGETS) anche senza baseline.
+
+La baseline non è versionata: i tempi dipendono dalla macchina, quindi va
+generata in locale con --save-baseline (in benchmarks/baselines/baseline.json)
+prima del primo confronto. Senza baseline la suite riporta solo i tempi e il
+controllo delle dimensioni, senza segnalare regressioni di tempo.
+
+Uso:
+    python benchmarks/run_benchmarks.py --save-baseline          # crea/aggiorna la baseline (primo passo)
+    python benchmarks/run_benchmarks.py                          # confronta con la baseline
+    python benchmarks/run_benchmarks.py --quick --filter engine  # sottoinsieme veloce
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baselines', 'baseline.json')
+
+# Regressione: mediana oltre baseline * (1 + soglia) e più lenta di almeno
+# MIN_REGRESSION_SECONDS (i casi sotto il millisecondo sono dominati dal rumore)
+DEFAULT_THRESHOLD = 0.20
+
+# Dimensione massima dell'output per caso (byte): il report di riferimento
+# report_monte_carlo_futura_scf.html era di 77.108 byte prima dei report compatti
+SIZE_BUDGETS = {'report/generate_html_report': 77_108}
+MIN_REGRESSION_SECONDS = 0.001
+
+# Durata minima di un campione di misura
+MIN_SAMPLE_SECONDS = 0.05
+
+# Griglia del motore (n_sims x anni)
+ENGINE_GRID = {
+    'n_sims': (1_000, 5_000, 10_000),
+    'years': (10, 30, 50)
+}
+QUICK_ENGINE_GRID = {
+    'n_sims': (1_000, 10_000),
+    'years': (30,)
+}
+
+# Parametri di riferimento (quelli di default dell'app)
+REFERENCE_PARAMS = {
+    'capital': 400_000,
+    'mu': 0.0523,
+    'sigma': 0.0695,
+    'years': 30,
+    'n_sims': 10_000,
+    'seed': 42
+}
+
+# Import a freddo (processo nuovo): moduli del percorso web e moduli pesanti
+# che non devono comparire fra le sue dipendenze
+IMPORT_MODULES = ('web_app', 'monte_carlo_engine', 'simulation_pool', 'chart_generator')
+WEB_FORBIDDEN_MODULES = ('pandas', 'plotly', 'scipy', 'yfinance')
+
+
+def import_case(module: str, forbidden=()):
+    """
+    Caso di benchmark: import di module in un interprete nuovo (tempo di
+    avvio di un worker). Fallisce se vengono caricati moduli in forbidden.
+    """
+    check = (f"import sys, {module}; "
+             f"loaded = [m for m in {tuple(forbidden)!r} if m in sys.modules]; "
+             f"sys.exit('moduli pesanti caricati: ' + ', '.join(loaded) if loaded else 0)")
+
+    def run():
+        completed = subprocess.run([sys.executable, '-c', check], cwd=ROOT,
+                                   capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"import {module}: {completed.stderr.strip()}")
+    return run
+
+
+def build_cases(quick: bool = False) -> list:
+    """
+    Elenco dei casi: (nome, funzione senza argomenti). Gli input sono preparati qui,
+    fuori dalla misura.
+    """
+    import plotly
+
+    from app import generate_html_report
+    from chart_generator import WEB_TEMPLATE, create_monte_carlo_chart, monte_carlo_figure
+    from data_formatter import create_summary_table, prepare_plotly_data
+    from monte_carlo_engine import run_monte_carlo_simulation
+
+    cases = []
+
+    # Interprete vuoto come riferimento per i tempi di import
+    cases.append(("import/python", import_case('sys')))
+    for module in IMPORT_MODULES:
+        forbidden = WEB_FORBIDDEN_MODULES if module != 'chart_generator' else ('plotly',)
+        cases.append((f"import/{module}", import_case(module, forbidden)))
+
+    grid = QUICK_ENGINE_GRID if quick else ENGINE_GRID
+    for n_sims in grid['n_sims']:
+        for years in grid['years']:
+            params = {**REFERENCE_PARAMS, 'n_sims': n_sims, 'years': years}
+            cases.append((f"engine/n{n_sims}_y{years}",
+                          lambda p=params: run_monte_carlo_simulation(p)))
+
+    # Tabella dei quantili: risposta senza simulare (tabella già costruita)
+    from quantile_table import QuantileTableCache
+    tables = QuantileTableCache()
+    table_params = {**REFERENCE_PARAMS, 'risk': False}
+    tables.simulate(table_params)
+    cases.append(("engine/quantile_table", lambda: tables.simulate(table_params)))
+    # Richiesta della UI (risk attivo): tabella più tracker sugli shock rigenerati
+    cases.append(("engine/quantile_table_risk", lambda: tables.simulate(REFERENCE_PARAMS)))
+
+    # Motore multi-asset: 11 asset equipesati, politica con e senza stato per passo
+    from portfolio_model import load_portfolio_model
+    from rebalancing_engine import run_rebalancing_simulation
+    model = load_portfolio_model(os.path.join(ROOT, 'static', 'asset_data.json'))
+    for policy in ('none', 'threshold'):
+        params = {**REFERENCE_PARAMS, 'asset_weights': np.ones(len(model.keys)), 'asset_mu': model.mu,
+                  'asset_covariance': model.covariance, 'rebalancing': policy, 'transaction_cost': 0.001}
+        cases.append((f"engine/rebalancing_{policy}", lambda p=params: run_rebalancing_simulation(p)))
+
+    # Modelli a volatilità variabile (return_models.py), 10k x 360
+    for model in ('garch', 'regime'):
+        params = {**REFERENCE_PARAMS, 'model': model}
+        cases.append((f"engine/model_{model}", lambda p=params: run_monte_carlo_simulation(p)))
+
+    # Code estreme con importance sampling (solo la simulazione di coda, 10k x 360)
+    from tail_sampling import run_tail_sampling
+    tail_params = dict(REFERENCE_PARAMS)
+    cases.append(("engine/tail_sampling", lambda: run_tail_sampling(tail_params)))
+
+    params = dict(REFERENCE_PARAMS)
+    results = run_monte_carlo_simulation(params)
+    plotly_data = prepare_plotly_data(results)
+    fig = create_monte_carlo_chart(plotly_data, params)
+    cases += [
+        ("post/prepare_plotly_data", lambda: prepare_plotly_data(results)),
+        ("post/create_summary_table", lambda: create_summary_table(results, params['capital'])),
+        ("post/create_monte_carlo_chart", lambda: create_monte_carlo_chart(plotly_data, params)),
+        ("post/json_encode", lambda: json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)),
+        ("post/monte_carlo_figure_json",
+         lambda: json.dumps(monte_carlo_figure(plotly_data, params, template=WEB_TEMPLATE))),
+    ]
+
+    def html_report():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return generate_html_report(params)
+    cases.append(("report/generate_html_report", html_report))
+
+    from web_app import app
+    client = app.test_client()
+    payload = {'capital': 400000, 'mu': 5.23, 'sigma': 6.95, 'years': 30, 'n_sims': 10000}
+
+    def simulate():
+        response = client.post('/simulate', json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"/simulate ha risposto {response.status_code}")
+        return response
+    cases.append(("web/simulate", simulate))
+
+    # Fase statistiche della pipeline dati (storico sintetico, vedi bench_asset_stats.py)
+    from bench_asset_stats import synthetic_returns
+    from asset_statistics import compute_asset_statistics
+    from fetch_returns import ASSET_SPECS
+    assets = synthetic_returns()
+    cases.append(("data/compute_asset_statistics",
+                  lambda: compute_asset_statistics(assets, ASSET_SPECS)))
+
+    return cases
+
+
+def measure(func, repeat: int) -> dict:
+    """
+    Tempo per chiamata (warm-up + repeat campioni) e picco di memoria (esecuzione separata).
+
+    Le funzioni molto veloci vengono ripetute più volte in ogni campione
+    (almeno MIN_SAMPLE_SECONDS), come timeit.
+    """
+    start = time.perf_counter()
+    func()  # warm-up: import pigri, cache, template
+    warmup = time.perf_counter() - start
+    number = max(1, int(MIN_SAMPLE_SECONDS / max(warmup, 1e-9)))
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+
+    tracemalloc.start()
+    try:
+        output = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    measured = {
+        'time_median': statistics.median(times),
+        'time_min': min(times),
+        'peak_mb': peak / 2**20,
+        'repeat': repeat,
+        'number': number
+    }
+    if isinstance(output, str):
+        measured['output_bytes'] = len(output.encode('utf-8'))
+    return measured
+
+
+def environment_info() -> dict:
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Casi la cui mediana supera la baseline oltre la soglia: [(nome, rapporto)].
+    """
+    regressions = []
+    for name, current in results.items():
+        reference = baseline.get('results', {}).get(name)
+        if not reference:
+            continue
+        ratio = current['time_median'] / reference['time_median']
+        slower = current['time_median'] - reference['time_median']
+        if ratio > 1 + threshold and slower > MIN_REGRESSION_SECONDS:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def check_sizes(results: dict) -> list:
+    """
+    Casi il cui output supera il limite di SIZE_BUDGETS: [(nome, byte, limite)].
+    """
+    return [(name, results[name]['output_bytes'], budget)
+            for name, budget in SIZE_BUDGETS.items()
+            if name in results and results[name].get('output_bytes', 0) > budget]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dei percorsi critici (offline)")
+    parser.add_argument('--repeat', type=int, default=5, help="ripetizioni per caso")
+    parser.add_argument('--quick', action='store_true', help="griglia ridotta del motore")
+    parser.add_argument('--filter', default=None, help="esegue solo i casi il cui nome contiene questo testo")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="file JSON della baseline")
+    parser.add_argument('--save-baseline', action='store_true', help="salva i risultati come nuova baseline")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="rallentamento relativo oltre cui segnalare una regressione")
+    parser.add_argument('--output', default=None, help="salva anche i risultati di questa esecuzione")
+    args = parser.parse_args()
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    cases = [(name, func) for name, func in build_cases(args.quick)
+             if not args.filter or args.filter in name]
+
+    print(f"📊 {len(cases)} casi, {args.repeat} ripetizioni ciascuno")
+    print(f"{'caso':<34} {'mediana':>10} {'min':>10} {'picco MB':>9} {'vs base':>8}")
+    results = {}
+    for name, func in cases:
+        results[name] = measure(func, args.repeat)
+        r = results[name]
+        reference = (baseline or {}).get('results', {}).get(name)
+        delta = f"{r['time_median'] / reference['time_median']:.2f}x" if reference else '-'
+        print(f"{name:<34} {r['time_median'] * 1000:8.2f}ms {r['time_min'] * 1000:8.2f}ms "
+              f"{r['peak_mb']:9.1f} {delta:>8}")
+
+    for name, r in results.items():
+        if 'output_bytes' in r:
+            print(f"   {name}: output {r['output_bytes'] / 1024:.1f} KB")
+    oversized = check_sizes(results)
+    for name, size, budget in oversized:
+        print(f"❌ {name}: output di {size:,} byte oltre il limite di {budget:,}")
+
+    report = {'environment': environment_info(), 'results': results}
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        if baseline is None and os.path.exists(args.baseline):
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        # Aggiorna solo i casi eseguiti (con --filter resta il resto della baseline)
+        merged = {'environment': report['environment'],
+                  'results': {**(baseline or {}).get('results', {}), **results}}
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(merged, f, indent=2)
+        print(f"\n💾 Baseline salvata in '{args.baseline}'")
+        return 1 if oversized else 0
+
+    if baseline is None:
+        print("\nℹ️ Nessuna baseline: eseguire con --save-baseline per crearla")
+        return 1 if oversized else 0
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n❌ Regressioni oltre il {args.threshold:.0%}:")
+        for name, ratio in regressions:
+            print(f"   {name}: {ratio:.2f}x")
+        return 1
+    print(f"\n✅ Nessuna regressione oltre il {args.threshold:.0%}")
+    return 1 if oversized else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
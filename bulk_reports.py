@@ -0,0 +1,246 @@
+"""
+bulk_reports.py
+Generazione massiva dei report cliente (es. chiusura trimestrale).
+
+Legge un file clienti (CSV o JSON), raggruppa i clienti con gli stessi parametri
+di simulazione in modo che ogni simulazione venga eseguita una sola volta e
+scrive i report in parallelo su un pool di processi.
+
+Uso:
+    python bulk_reports.py clienti.csv --output-dir reports --workers 8
+
+Formato del file clienti (una riga/oggetto per cliente):
+    client_id, capital, mu, sigma, years, n_sims, seed
+con mu e sigma in decimali (es. 0.0523), come in app.py.
+I clienti già presenti nella cartella di output vengono saltati: rilanciando
+lo stesso comando dopo un'interruzione si riprende da dove ci si era fermati.
+
+Con --bundle la cartella di output diventa un bundle offline: una sola copia
+locale di plotly.js condivisa da tutti i report (nessun accesso al CDN).
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from monte_carlo_engine import run_monte_carlo_simulation
+
+
+DEFAULTS = {
+    'years': 30,
+    'n_sims': 10_000,
+    'seed': 42
+}
+
+
+def load_clients(path: str) -> list:
+    """
+    Legge il file clienti (CSV o JSON) e normalizza i parametri.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.lower().endswith('.json'):
+            rows = json.load(f)
+        else:
+            rows = list(csv.DictReader(f))
+
+    clients = []
+    seen = set()
+    for i, row in enumerate(rows, start=1):
+        client_id = str(row.get('client_id') or '').strip()
+        if not client_id:
+            raise ValueError(f"Riga {i}: client_id mancante")
+        if client_id in seen:
+            raise ValueError(f"Riga {i}: client_id duplicato ({client_id})")
+        seen.add(client_id)
+
+        def value(key, cast):
+            raw = row.get(key)
+            if raw is None or raw == '':
+                if key not in DEFAULTS:
+                    raise ValueError(f"Riga {i} ({client_id}): campo '{key}' mancante")
+                return DEFAULTS[key]
+            return cast(raw)
+
+        clients.append({
+            'client_id': client_id,
+            'capital': value('capital', float),
+            'mu': value('mu', float),
+            'sigma': value('sigma', float),
+            'years': value('years', int),
+            'n_sims': value('n_sims', int),
+            'seed': value('seed', int)
+        })
+    return clients
+
+
+def report_filename(client_id: str) -> str:
+    """
+    Nome file del report di un cliente (solo caratteri sicuri per il filesystem).
+    """
+    safe = re.sub(r'[^A-Za-z0-9_.-]+', '_', client_id)
+    return f"report_{safe}.html"
+
+
+def simulation_key(client: dict) -> tuple:
+    """
+    Chiave di raggruppamento: tutti i parametri tranne il capitale.
+
+    Con seed fisso il GBM è lineare nel capitale iniziale (percentili e valori
+    scalano, CAGR e distribuzione no), quindi clienti che differiscono solo per
+    capitale condividono la stessa simulazione.
+    """
+    return (client['mu'], client['sigma'], client['years'], client['n_sims'], client['seed'])
+
+
+def scale_results(results: dict, capital: float) -> dict:
+    """
+    Riporta i risultati di una simulazione a capitale unitario al capitale del cliente.
+    """
+    percentiles_time = {k: v * capital for k, v in results['percentiles_time'].items()}
+    percentiles_final = {k: v * capital for k, v in results['percentiles_final'].items()}
+    stats = dict(results['stats'])
+    stats['mean'] = stats['mean'] * capital
+    stats['std'] = stats['std'] * capital
+
+    scaled = {
+        **results,
+        'percentiles_time': percentiles_time,
+        'percentiles_final': percentiles_final,
+        'stats': stats
+    }
+    if 'sample_paths' in results:
+        sample_paths = results['sample_paths']
+        scaled['sample_paths'] = {
+            'representative': {k: v * capital for k, v in sample_paths['representative'].items()},
+            'random': sample_paths['random'] * capital
+        }
+    return scaled
+
+
+def _write_atomic(path: str, content: str):
+    """
+    Scrive su file temporaneo e rinomina: un report interrotto non resta mai a metà.
+    """
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def simulate_group(key: tuple) -> dict:
+    """
+    Esegue la simulazione di un gruppo di clienti a capitale unitario.
+    """
+    mu, sigma, years, n_sims, seed = key
+    results = run_monte_carlo_simulation({
+        'capital': 1.0, 'mu': mu, 'sigma': sigma, 'years': years, 'n_sims': n_sims, 'seed': seed
+    })
+    results.pop('paths', None)  # non serve ai report e non va trasferito tra processi
+    return results
+
+
+def render_batch(unit_results: dict, clients: list, output_dir: str, bundle: bool = False) -> int:
+    """
+    Scrive i report di un blocco di clienti che condividono la stessa simulazione.
+
+    Eseguito nei processi del pool: il template viene compilato una volta per processo.
+    """
+    from app import render_html_report
+
+    for client in clients:
+        params = {k: client[k] for k in ('capital', 'mu', 'sigma', 'years', 'n_sims', 'seed')}
+        html = render_html_report(params, scale_results(unit_results, client['capital']), bundle=bundle)
+        _write_atomic(os.path.join(output_dir, report_filename(client['client_id'])), html)
+    return len(clients)
+
+
+def generate_bulk_reports(clients: list, output_dir: str, workers: int = None,
+                          batch_size: int = 10, bundle: bool = False) -> dict:
+    """
+    Genera i report mancanti in parallelo e restituisce le statistiche di throughput.
+
+    Due fasi sullo stesso pool: prima le simulazioni uniche, poi il rendering
+    a blocchi di batch_size clienti (così anche un gruppo molto numeroso viene
+    distribuito su tutti i processi).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if bundle:
+        from app import write_chart_runtime
+        write_chart_runtime(output_dir)
+
+    # Riprendi dopo un'interruzione: salta i report già scritti
+    pending = [c for c in clients
+               if not os.path.exists(os.path.join(output_dir, report_filename(c['client_id'])))]
+    skipped = len(clients) - len(pending)
+
+    groups = defaultdict(list)
+    for client in pending:
+        groups[simulation_key(client)].append(client)
+
+    print(f"📋 Clienti: {len(clients)} | già generati: {skipped} | da generare: {len(pending)}")
+    print(f"🔄 Simulazioni uniche: {len(groups)} | processi: {workers or os.cpu_count()}")
+
+    start = time.perf_counter()
+    sim_elapsed = 0.0
+    written = 0
+
+    if groups:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # 1) Simulazioni uniche
+            sim_futures = {pool.submit(simulate_group, key): key for key in groups}
+            render_futures = []
+            for future in as_completed(sim_futures):
+                group = groups[sim_futures[future]]
+                unit_results = future.result()
+                # 2) Rendering a blocchi, avviato appena la simulazione è pronta
+                for i in range(0, len(group), batch_size):
+                    render_futures.append(
+                        pool.submit(render_batch, unit_results, group[i:i + batch_size], output_dir, bundle))
+            sim_elapsed = time.perf_counter() - start
+
+            for future in as_completed(render_futures):
+                written += future.result()
+                elapsed = time.perf_counter() - start
+                print(f"   {written}/{len(pending)} report ({written / elapsed:.1f} report/s)")
+
+    elapsed = time.perf_counter() - start
+    return {
+        'clients': len(clients),
+        'skipped': skipped,
+        'written': written,
+        'simulations': len(groups),
+        'elapsed': elapsed,
+        'simulation_elapsed': sim_elapsed,
+        'reports_per_second': written / elapsed if elapsed > 0 else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generazione massiva report Monte Carlo")
+    parser.add_argument('clients', help="file clienti (.csv o .json)")
+    parser.add_argument('--output-dir', '-o', default='reports', help="cartella di output")
+    parser.add_argument('--workers', '-j', type=int, default=None,
+                        help="numero di processi (default: numero di core)")
+    parser.add_argument('--batch-size', type=int, default=10,
+                        help="clienti renderizzati per task")
+    parser.add_argument('--bundle', action='store_true',
+                        help="bundle offline con runtime grafico locale condiviso")
+    args = parser.parse_args()
+
+    clients = load_clients(args.clients)
+    summary = generate_bulk_reports(clients, args.output_dir, args.workers, args.batch_size, args.bundle)
+
+    print()
+    print(f"✅ Report scritti: {summary['written']} in {summary['elapsed']:.1f}s "
+          f"({summary['reports_per_second']:.1f} report/s)")
+    print(f"   Simulazioni eseguite: {summary['simulations']} "
+          f"(completate dopo {summary['simulation_elapsed']:.1f}s) | clienti saltati: {summary['skipped']}")
+
+
+if __name__ == "__main__":
+    main()
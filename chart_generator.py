@@ -3,7 +3,8 @@ chart_generator.py
 Genera il grafico Monte Carlo con lo stile professionale di Futura SCF.
 """
 
-import plotly.graph_objects as go
+import numpy as np
+
 from data_formatter import format_currency
 
 
@@ -29,115 +30,157 @@ FONT = {
 }
 
 
-def create_monte_carlo_chart(plotly_data: dict, params: dict) -> go.Figure:
+# Parti del template Plotly di default ("plotly") usate da un grafico a linee 2D:
+# la figura in formato dizionario non dipende da plotly.py, ma nel browser deve
+# apparire identica a quella costruita con go.Figure
+WEB_TEMPLATE = {
+    'data': {
+        'scatter': [{'fillpattern': {'fillmode': 'overlay', 'size': 10, 'solidity': 0.2}, 'type': 'scatter'}]
+    },
+    'layout': {
+        'autotypenumbers': 'strict',
+        'colorway': ['#636efa', '#EF553B', '#00cc96', '#ab63fa', '#FFA15A',
+                     '#19d3f3', '#FF6692', '#B6E880', '#FF97FF', '#FECB52'],
+        'font': {'color': '#2a3f5f'},
+        'hovermode': 'closest',
+        'hoverlabel': {'align': 'left'},
+        'paper_bgcolor': 'white',
+        'plot_bgcolor': '#E5ECF6',
+        'xaxis': {'gridcolor': 'white', 'linecolor': 'white', 'ticks': '', 'title': {'standoff': 15},
+                  'zerolinecolor': 'white', 'automargin': True, 'zerolinewidth': 2},
+        'yaxis': {'gridcolor': 'white', 'linecolor': 'white', 'ticks': '', 'title': {'standoff': 15},
+                  'zerolinecolor': 'white', 'automargin': True, 'zerolinewidth': 2},
+        'shapedefaults': {'line': {'color': '#2a3f5f'}},
+        'annotationdefaults': {'arrowcolor': '#2a3f5f', 'arrowhead': 0, 'arrowwidth': 1},
+        'title': {'x': 0.05}
+    }
+}
+
+HOVER_TEMPLATE = '<b>Anno:</b> %{x:.1f}<br><b>Valore:</b> €%{y:,.0f}<extra></extra>'
+
+
+def monte_carlo_figure(plotly_data: dict, params: dict, template: dict = None) -> dict:
     """
-    Crea il fan chart Monte Carlo con percentili evidenziati.
-    
+    Fan chart Monte Carlo come dizionario Plotly (data + layout), senza plotly.py.
+
+    È la forma usata da /simulate (json.dumps diretto, nessun import di plotly
+    nel processo web); create_monte_carlo_chart() ne ricava una go.Figure per i report.
+
     Args:
         plotly_data: output di prepare_plotly_data() con le liste dei percentili
         params: parametri simulazione (capital, mu, sigma, years, n_sims)
-        
+        template: template Plotly da incorporare nel layout (es. WEB_TEMPLATE);
+                  None lascia il template di default di chi renderizza
+
     Returns:
-        oggetto plotly Figure pronto per visualizzazione o esportazione
+        dizionario {'data': [...], 'layout': {...}}
     """
-    
-    # Crea figura Plotly vuota
-    fig = go.Figure()
-    
-    # ========== 1) AREA OMBREGGIATA P25-P75 (50% probabilità) ==========
-    # Prima traccia: bordo superiore (p75) - invisibile
-    fig.add_trace(go.Scatter(
-        x=plotly_data['time'],
-        y=plotly_data['p75'],
-        mode='lines',
-        line=dict(width=0),          # Linea invisibile
-        showlegend=False,             # Non mostrare in legenda
-        hoverinfo='skip'              # Non mostrare hover
-    ))
-    
-    # Seconda traccia: bordo inferiore (p25) - riempie area fino a p75
-    fig.add_trace(go.Scatter(
-        x=plotly_data['time'],
-        y=plotly_data['p25'],
-        mode='lines',
-        line=dict(width=0),
-        fillcolor=COLORS['gray_area'],   # Colore area trasparente
-        fill='tonexty',                   # Riempie fino alla traccia precedente (p75)
-        name='Area 25°-75° percentile',
-        hovertemplate='<b>Anno:</b> %{x:.1f}<br><b>Valore:</b> €%{y:,.0f}<extra></extra>'
-    ))
-    
-    # ========== 2) LINEA MEDIANA (P50) - PRINCIPALE ==========
-    fig.add_trace(go.Scatter(
-        x=plotly_data['time'],
-        y=plotly_data['p50'],
-        mode='lines',
-        name='Mediana (50° percentile)',
-        line=dict(
-            color=COLORS['light_blue'],
-            width=3                       # Linea spessa per evidenza
-        ),
-        hovertemplate='<b>Anno:</b> %{x:.1f}<br><b>Valore:</b> €%{y:,.0f}<extra></extra>'
-    ))
-    
-    # ========== 3) P3 PESSIMISTICO (linea tratteggiata rossa) ==========
-    fig.add_trace(go.Scatter(
-        x=plotly_data['time'],
-        y=plotly_data['p3'],
-        mode='lines',
-        name='3° percentile (pessimistico)',
-        line=dict(
-            color=COLORS['red_pessimistic'],
-            width=2,
-            dash='dash'                   # Linea tratteggiata
-        ),
-        hovertemplate='<b>Anno:</b> %{x:.1f}<br><b>Valore:</b> €%{y:,.0f}<extra></extra>'
-    ))
-    
-    # ========== 4) P75 OTTIMISTICO (linea punteggiata verde) ==========
-    fig.add_trace(go.Scatter(
-        x=plotly_data['time'],
-        y=plotly_data['p75'],
-        mode='lines',
-        name='75° percentile (ottimistico)',
-        line=dict(
-            color=COLORS['green_optimistic'],
-            width=1.5,
-            dash='dot'                    # Linea punteggiata
-        ),
-        hovertemplate='<b>Anno:</b> %{x:.1f}<br><b>Valore:</b> €%{y:,.0f}<extra></extra>'
-    ))
-    
+    traces = []
+
+    # ========== 0) TRAIETTORIE SINGOLE (spaghetti, sotto le bande) ==========
+    # Asse temporale implicito (x0 + dx) per tutte le tracce: evita di ripetere
+    # 'time' in ognuna; con le serie ridotte (passi non equispaziati) serve
+    # l'asse esplicito
+    time = np.asarray(plotly_data['time'], dtype=float)
+    steps = np.diff(time)
+    time_axis = dict(x0=float(time[0]), dx=float(time[1] - time[0])) \
+        if len(steps) and np.allclose(steps, steps[0]) else dict(x=plotly_data['time'])
+
+    # Campione casuale: linee sottili e trasparenti, una sola voce in legenda
+    for i, values in enumerate(plotly_data.get('samples', [])):
+        traces.append({
+            'type': 'scatter',
+            **time_axis,
+            'y': values,
+            'mode': 'lines',
+            'line': {'color': 'rgba(30, 58, 95, 0.12)', 'width': 1},
+            'name': 'Traiettorie simulate (campione)',
+            'legendgroup': 'samples',
+            'showlegend': i == 0,
+            'hoverinfo': 'skip'
+        })
+
+    # Traiettorie rappresentative: valore finale più vicino a ogni percentile
+    representative = [key for key in plotly_data if key.startswith('representative_')]
+    for i, key in enumerate(representative):
+        traces.append({
+            'type': 'scatter',
+            **time_axis,
+            'y': plotly_data[key],
+            'mode': 'lines',
+            'line': {'color': 'rgba(232, 135, 52, 0.35)', 'width': 1},
+            'name': 'Traiettorie rappresentative (per percentile)',
+            'legendgroup': 'representative',
+            'showlegend': i == 0,
+            'hoverinfo': 'skip'
+        })
+
+    # ========== 1) P75 OTTIMISTICO (linea punteggiata verde) ==========
+    # È anche il bordo superiore dell'area: la traccia successiva riempie fino a qui
+    traces.append({
+        'type': 'scatter',
+        **time_axis,
+        'y': plotly_data['p75'],
+        'mode': 'lines',
+        'name': '75° percentile (ottimistico)',
+        'line': {'color': COLORS['green_optimistic'], 'width': 1.5, 'dash': 'dot'},
+        'legendrank': 1001,                 # In legenda dopo le altre bande
+        'hovertemplate': HOVER_TEMPLATE
+    })
+
+    # ========== 2) AREA OMBREGGIATA P25-P75 (50% probabilità) ==========
+    # Bordo inferiore (p25) - riempie area fino a p75
+    traces.append({
+        'type': 'scatter',
+        **time_axis,
+        'y': plotly_data['p25'],
+        'mode': 'lines',
+        'line': {'width': 0},
+        'fillcolor': COLORS['gray_area'],   # Colore area trasparente
+        'fill': 'tonexty',                  # Riempie fino alla traccia precedente (p75)
+        'name': 'Area 25°-75° percentile',
+        'hovertemplate': HOVER_TEMPLATE
+    })
+
+    # ========== 3) LINEA MEDIANA (P50) - PRINCIPALE ==========
+    traces.append({
+        'type': 'scatter',
+        **time_axis,
+        'y': plotly_data['p50'],
+        'mode': 'lines',
+        'name': 'Mediana (50° percentile)',
+        'line': {'color': COLORS['light_blue'], 'width': 3},   # Linea spessa per evidenza
+        'hovertemplate': HOVER_TEMPLATE
+    })
+
+    # ========== 4) P3 PESSIMISTICO (linea tratteggiata rossa) ==========
+    traces.append({
+        'type': 'scatter',
+        **time_axis,
+        'y': plotly_data['p3'],
+        'mode': 'lines',
+        'name': '3° percentile (pessimistico)',
+        'line': {'color': COLORS['red_pessimistic'], 'width': 2, 'dash': 'dash'},
+        'hovertemplate': HOVER_TEMPLATE
+    })
+
     # ========== 5) LINEA CAPITALE INIZIALE (riferimento) ==========
-    fig.add_hline(
-        y=params['capital'],
-        line_dash='dash',
-        line_color='rgba(0,0,0,0.3)',     # Grigio trasparente
-        line_width=1,
-        annotation_text=f"Capitale iniziale ({format_currency(params['capital'])})",
-        annotation_position='right',
-        annotation_font=dict(size=11, color='gray')
-    )
-    
+    capital_line = {
+        'type': 'line',
+        'line': {'color': 'rgba(0,0,0,0.3)', 'dash': 'dash', 'width': 1},   # Grigio trasparente
+        'x0': 0, 'x1': 1, 'xref': 'x domain',
+        'y0': params['capital'], 'y1': params['capital'], 'yref': 'y'
+    }
+
     # ========== 6) LAYOUT E STILE PROFESSIONALE ==========
-    fig.update_layout(
-        # Titolo principale
-        title={
-            'text': f"Simulazione Monte Carlo - Portafoglio {format_currency(params['capital'])}",
-            'x': 0.5,                     # Centra titolo
-            'xanchor': 'center',
-            'font': dict(
-                size=18,
-                family=FONT['family'],
-                color=COLORS['primary_blue'],
-                weight='bold'
-            )
-        },
-        
+    n_sims_formatted = f"{int(params['n_sims']):,}".replace(',', '.')
+    layout = {
+        'shapes': [capital_line],
+
         # Sottotitolo con parametri
-        annotations=[{
+        'annotations': [{
             'text': (
-                f"10.000 simulazioni | "
+                f"{n_sims_formatted} simulazioni | "
                 f"Rendimento atteso: {params['mu']*100:.2f}% | "
                 f"Volatilità: {params['sigma']*100:.2f}% | "
                 f"Orizzonte: {params['years']} anni"
@@ -146,56 +189,86 @@ def create_monte_carlo_chart(plotly_data: dict, params: dict) -> go.Figure:
             'yref': 'paper',
             'x': 0.5,
             'y': 1.08,                    # Posiziona sopra il grafico
+            'yanchor': 'middle',
             'showarrow': False,
-            'font': dict(size=12, color='gray'),
+            'font': {'size': 12, 'color': 'gray'},
             'xanchor': 'center'
         }],
-        
+
+        # Titolo principale
+        'title': {
+            'text': f"Simulazione Monte Carlo - Portafoglio {format_currency(params['capital'])}",
+            'x': 0.5,                     # Centra titolo
+            'xanchor': 'center',
+            'font': {
+                'size': 18,
+                'family': FONT['family'],
+                'color': COLORS['primary_blue'],
+                'weight': 'bold'
+            }
+        },
+
         # Asse X (tempo)
-        xaxis=dict(
-            title='Anni',
-            showgrid=True,
-            gridcolor=COLORS['grid'],
-            tickfont=FONT,
-            title_font=FONT,
-            zeroline=False
-        ),
-        
+        'xaxis': {
+            'title': {'text': 'Anni', 'font': dict(FONT)},
+            'showgrid': True,
+            'gridcolor': COLORS['grid'],
+            'tickfont': dict(FONT),
+            'zeroline': False
+        },
+
         # Asse Y (valore portafoglio)
-        yaxis=dict(
-            title='Valore Portafoglio (€)',
-            showgrid=True,
-            gridcolor=COLORS['grid'],
-            tickformat=',.0f',            # Formato migliaia: 1,234,567
-            tickfont=FONT,
-            title_font=FONT,
-            zeroline=False
-        ),
-        
+        'yaxis': {
+            'title': {'text': 'Valore Portafoglio (€)', 'font': dict(FONT)},
+            'showgrid': True,
+            'gridcolor': COLORS['grid'],
+            'tickformat': ',.0f',         # Formato migliaia: 1,234,567
+            'tickfont': dict(FONT),
+            'zeroline': False
+        },
+
         # Colori sfondo
-        plot_bgcolor=COLORS['background'],
-        paper_bgcolor=COLORS['background'],
-        
+        'plot_bgcolor': COLORS['background'],
+        'paper_bgcolor': COLORS['background'],
+
         # Legenda
-        legend=dict(
-            x=0.02,                       # Sinistra
-            y=0.98,                       # Alto
-            bgcolor='rgba(255,255,255,0.9)',  # Bianco semi-trasparente
-            bordercolor=COLORS['grid'],
-            borderwidth=1,
-            font=FONT
-        ),
-        
+        'legend': {
+            'x': 0.02,                    # Sinistra
+            'y': 0.98,                    # Alto
+            'bgcolor': 'rgba(255,255,255,0.9)',   # Bianco semi-trasparente
+            'bordercolor': COLORS['grid'],
+            'borderwidth': 1,
+            'font': dict(FONT)
+        },
+
         # Hover unificato su asse X
-        hovermode='x unified',
-        
-        # Dimensioni responsive
-        autosize=True,
-        # height=600,  <-- RIMOSSO per adattarsi al container
-        margin=dict(t=80, b=40, l=60, r=40) # Margini ridotti
-    )
+        'hovermode': 'x unified',
+
+        # Dimensioni responsive (nessuna altezza fissa: si adatta al container)
+        'autosize': True,
+        'margin': {'t': 80, 'b': 40, 'l': 60, 'r': 40}   # Margini ridotti
+    }
+    if template is not None:
+        layout['template'] = template
+
+    return {'data': traces, 'layout': layout}
+
+
+def create_monte_carlo_chart(plotly_data: dict, params: dict):
+    """
+    Crea il fan chart Monte Carlo con percentili evidenziati.
     
-    return fig
+    Args:
+        plotly_data: output di prepare_plotly_data() con le liste dei percentili
+        params: parametri simulazione (capital, mu, sigma, years, n_sims)
+        
+    Returns:
+        oggetto plotly Figure pronto per visualizzazione o esportazione
+    """
+    # plotly.py solo qui (report, export): il percorso web usa monte_carlo_figure()
+    import plotly.graph_objects as go
+
+    return go.Figure(monte_carlo_figure(plotly_data, params))
 
 
 # ========== TEST DEL MODULO ==========
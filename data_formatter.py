@@ -3,8 +3,24 @@ data_formatter.py
 Funzioni per formattare i risultati numerici in formato leggibile per l'utente.
 """
 
+import numpy as np
+
+from decimation import DEFAULT_MAX_POINTS, shared_indices
+
 # Dizionario commenti per percentili bassi (30 anni)
 TAIL_RISK_CONTEXT = {
+    0.1: {
+        "alert_level": "extreme",
+        "commento": "🚨 STRESS TEST ESTREMO: 1 traiettoria su 1000. Scenario di riferimento per le prove di stress, ben oltre qualunque periodo di 30 anni osservato.",
+        "probabilita_descrittiva": "Eccezionale (1 su 1000 simulazioni)",
+        "nota_tecnica": "Stimato con importance sampling: traiettorie spostate verso la coda sfavorevole e pesate con il rapporto di verosimiglianza."
+    },
+    1: {
+        "alert_level": "extreme",
+        "commento": "🚨 STRESS TEST: 1 traiettoria su 100. Sequenza di crisi prolungate e ravvicinate, senza precedenti storici su 30 anni.",
+        "probabilita_descrittiva": "Rarissimo (1 su 100 simulazioni)",
+        "nota_tecnica": "Stimato con importance sampling: traiettorie spostate verso la coda sfavorevole e pesate con il rapporto di verosimiglianza."
+    },
     3: {
         "alert_level": "extreme",
         "commento": "⚠️ SCENARIO ESTREMO: Mai verificato in 120+ anni di mercati azionari. Il peggior caso storico reale su 30 anni è stato +4.7% annuo (1902-1932, include Grande Depressione).",
@@ -35,7 +51,7 @@ def get_tail_risk_comment(percentile, rendimento_annuo, n_sims=1000):
     """
     Restituisce il commento contestualizzato per i percentili bassi
     Args:
-        percentile (int): 3, 5, 7, o 10
+        percentile (int): 3, 5, 7, o 10 (0.1 e 1 per le code stimate con importance sampling)
         rendimento_annuo (float): Il rendimento annualizzato percentuale (es. 4.5 per 4.5%)
         n_sims (int): Numero di simulazioni totali per calcolo frequenza
     
@@ -89,6 +105,8 @@ def format_percentage(value: float) -> str:
 def create_summary_table(results: dict, initial_capital: float) -> list:
     """
     Crea i dati per la tabella riassuntiva dei percentili.
+    Con results['tail'] (tail_sampling) aggiunge gli scenari 1% e 0,1%,
+    stimati con importance sampling, con la relativa ESS in 'ess'.
     """
     percentiles_final = results['percentiles_final']
     stats = results['stats']
@@ -144,7 +162,29 @@ def create_summary_table(results: dict, initial_capital: float) -> list:
             'cagr': stats['cagr_p3']
         }
     ]
-    
+
+    # Code estreme stimate con importance sampling (solo con tail_sampling)
+    tail = results.get('tail')
+    if tail is not None:
+        scenarios += [
+            {
+                'label': 'Scenario 1% (Stress)',
+                'percentile_int': 1,
+                'percentile': '1°',
+                'value': tail['percentiles_final']['p1'],
+                'cagr': tail['stats']['cagr_p1'],
+                'importance_sampling': True
+            },
+            {
+                'label': 'Scenario 0,1% (Stress Estremo)',
+                'percentile_int': 0.1,
+                'percentile': '0,1°',
+                'value': tail['percentiles_final']['p0.1'],
+                'cagr': tail['stats']['cagr_p0.1'],
+                'importance_sampling': True
+            }
+        ]
+
     # Estrai numero simulazioni
     n_sims = results.get('n_sims', 1000)
 
@@ -155,27 +195,103 @@ def create_summary_table(results: dict, initial_capital: float) -> list:
         scenario['variation'] = format_percentage(variation_decimal)
         
         scenario['cagr_formatted'] = format_percentage(scenario['cagr'])
+
+        # Massimo drawdown al percentile complementare (coda sfavorevole)
+        if scenario.get('importance_sampling'):
+            drawdowns = tail['max_drawdown']
+        else:
+            drawdowns = results['risk']['max_drawdown'] if 'risk' in results else None
+        if drawdowns is not None:
+            max_drawdown = drawdowns[f"p{100 - scenario['percentile_int']:g}"]
+            scenario['max_drawdown'] = max_drawdown
+            scenario['max_drawdown_formatted'] = format_percentage(-max_drawdown)
         
         # Add Tail Risk Context if applicable
         cagr_percent = scenario['cagr'] * 100
-        context = get_tail_risk_comment(scenario['percentile_int'], cagr_percent, n_sims)
+        if scenario.get('importance_sampling'):
+            label = f"p{scenario['percentile_int']:g}"
+            scenario['ess'] = tail['ess_tail'][label]
+            context = get_tail_risk_comment(scenario['percentile_int'], cagr_percent, tail['n_sims'])
+            n_formatted = f"{tail['n_sims']:,}".replace(",", ".")
+            ess_formatted = f"{scenario['ess']:,.0f}".replace(",", ".")
+            context["probabilita_descrittiva"] = (
+                f"{scenario['percentile'].rstrip('°')}% (stima pesata su {n_formatted} traiettorie; "
+                f"campione effettivo in coda {ess_formatted})")
+        else:
+            context = get_tail_risk_comment(scenario['percentile_int'], cagr_percent, n_sims)
         if context:
             scenario['context'] = context
     
     return scenarios
 
 
-def prepare_plotly_data(results: dict) -> dict:
+def prepare_plotly_data(results: dict, max_points: int = DEFAULT_MAX_POINTS) -> dict:
     """
     Converte i risultati numpy in liste Python per Plotly.
+
+    Con più di max_points passi le serie vengono ridotte (LTTB, vedi
+    decimation.py): gli indici sono calcolati sulle bande dei percentili e
+    applicati a tutte le serie, che condividono così lo stesso asse 'time'.
+    max_points=None mantiene tutti i passi.
     """
     percentiles_time = results['percentiles_time']
-    time = results['time']
-    
-    return {
-        'time': time.tolist(),
-        'p3': percentiles_time['p3'].tolist(),
-        'p25': percentiles_time['p25'].tolist(),
-        'p50': percentiles_time['p50'].tolist(),
-        'p75': percentiles_time['p75'].tolist()
-    }
+    time = np.asarray(results['time'])
+    bands = ('p3', 'p25', 'p50', 'p75')
+    keep = shared_indices(time, [percentiles_time[b] for b in bands], max_points)
+
+    # Asse ridotto: esplicito in ogni traccia, basta la precisione di un'ora
+    plotly_data = {'time': (time if len(keep) == len(time) else np.round(time[keep], 4)).tolist()}
+    for band in bands:
+        plotly_data[band] = np.asarray(percentiles_time[band])[keep].tolist()
+
+    # Traiettorie singole (spaghetti), arrotondate all'euro per contenere il JSON
+    sample_paths = results.get('sample_paths')
+    if sample_paths:
+        plotly_data['samples'] = np.rint(np.asarray(sample_paths['random'])[:, keep]).astype(np.int64).tolist()
+        for label, values in sample_paths['representative'].items():
+            plotly_data[f'representative_{label}'] = np.rint(np.asarray(values)[keep]).astype(np.int64).tolist()
+
+    return plotly_data
+
+
+def pack_plotly_data(plotly_data: dict, decimals: int = 0) -> dict:
+    """
+    Versione compatta di prepare_plotly_data() per i report salvati su file.
+
+    Le serie vengono arrotondate (default: all'euro) e convertite in array
+    float32: Plotly le serializza come typed array base64 ("bdata") invece
+    che come lunghe liste di numeri in testo. Il tempo resta in float64: in
+    float32 il passo mensile perde precisione e chart_generator non
+    riconoscerebbe più l'asse equispaziato (x0/dx al posto di x esplicito).
+    """
+    packed = {}
+    for key, values in plotly_data.items():
+        arr = np.asarray(values, dtype=float)
+        if key == 'time':
+            packed[key] = arr
+            continue
+        packed[key] = np.round(arr, decimals).astype(np.float32)
+    return packed
+
+
+def format_goals(goals: list, time) -> list:
+    """
+    Versione serializzabile (JSON) dei risultati degli obiettivi di capitale.
+
+    Le curve mensili vengono ridotte a un punto per anno (fine anno).
+    """
+    time = np.asarray(time)
+    steps_per_year = int(round(1 / (time[1] - time[0]))) if len(time) > 1 else 12
+    yearly = slice(0, len(time), steps_per_year)
+
+    formatted = []
+    for goal in goals:
+        formatted.append({
+            'target': goal['target'],
+            'target_formatted': format_currency(goal['target']),
+            'years': np.round(time[yearly], 4).tolist(),
+            'probability': np.round(goal['probability'][yearly], 4).tolist(),
+            'reached_by': np.round(goal['reached_by'][yearly], 4).tolist(),
+            'first_passage': goal['first_passage']
+        })
+    return formatted
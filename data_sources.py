@@ -0,0 +1,186 @@
+"""
+data_sources.py
+Sorgenti dati intercambiabili per gli storici di prezzo usati da fetch_returns.py.
+
+Ogni sorgente espone fetch_prices(tickers, start=None) -> {ticker: pd.Series di prezzi}
+(start: solo le barre da quella data in poi) e può essere sostituita (es. FixtureSource) per eseguire la pipeline offline.
+Le sessioni HTTP sono condivise (connection pooling) e ogni download ha
+timeout e retry con backoff esponenziale.
+"""
+
+import io
+import os
+import threading
+import time
+
+import pandas as pd
+
+
+# Timeout (connessione, lettura) per le richieste HTTP dirette
+HTTP_TIMEOUT = (5, 60)
+
+# Retry: tentativi totali e backoff base (secondi, raddoppia a ogni tentativo)
+RETRY_ATTEMPTS = 4
+RETRY_BACKOFF = 1.0
+
+DATAHUB_GOLD_URL = "https://datahub.io/core/gold-prices/r/monthly.csv"
+
+_session_local = threading.local()
+
+
+def get_http_session():
+    """
+    Sessione requests riusata dal thread corrente (pool di connessioni keep-alive).
+
+    Il retry a livello di trasporto (errori di connessione, 429/5xx) è gestito
+    dall'adapter urllib3 con backoff esponenziale.
+    """
+    session = getattr(_session_local, 'session', None)
+    if session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=RETRY_ATTEMPTS - 1,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=('GET',)
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _session_local.session = session
+    return session
+
+
+def with_retry(func, *args, attempts: int = RETRY_ATTEMPTS, backoff: float = RETRY_BACKOFF, **kwargs):
+    """
+    Esegue func(*args, **kwargs) ritentando in caso di eccezione (backoff esponenziale).
+    Per le librerie che non espongono la sessione HTTP (yfinance).
+    """
+    for attempt in range(attempts):
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def _price_series(frame: pd.DataFrame) -> pd.Series:
+    """
+    Estrae la colonna prezzi ('Adj Close' se presente, altrimenti 'Close').
+    """
+    price_col = 'Adj Close' if 'Adj Close' in frame.columns else 'Close'
+    series = frame[price_col]
+    if isinstance(series, pd.DataFrame):
+        series = series.iloc[:, 0]
+    return series.dropna()
+
+
+class YahooSource:
+    """
+    Storici giornalieri da Yahoo Finance, scaricati in batch multi-ticker.
+    """
+
+    def __init__(self, batch_size: int = 10):
+        self.batch_size = batch_size
+
+    def fetch_prices(self, tickers: list, start=None) -> dict:
+        import yfinance as yf
+
+        # Storico completo, oppure solo dalla data indicata (aggiornamento incrementale)
+        period = {'start': pd.Timestamp(start).strftime('%Y-%m-%d')} if start is not None else {'period': 'max'}
+
+        prices = {}
+        for i in range(0, len(tickers), self.batch_size):
+            batch = list(tickers[i:i + self.batch_size])
+
+            def download():
+                data = yf.download(batch, group_by='ticker', threads=True,
+                                   progress=False, **period)
+                if data is None or data.empty:
+                    raise RuntimeError(f"Nessun dato scaricato per {batch}")
+                return data
+
+            data = with_retry(download)
+            for ticker in batch:
+                if isinstance(data.columns, pd.MultiIndex):
+                    if ticker not in data.columns.get_level_values(0):
+                        continue
+                    frame = data[ticker]
+                else:
+                    frame = data
+                series = _price_series(frame)
+                if len(series):
+                    prices[ticker] = series
+        return prices
+
+
+class DataHubSource:
+    """
+    Storico mensile dell'oro (CSV DataHub: colonne Date, Price).
+
+    L'URL è configurabile per puntare a un server locale sostitutivo.
+    """
+
+    def __init__(self, url: str = DATAHUB_GOLD_URL):
+        self.url = url
+
+    def fetch_prices(self, tickers: list, start=None) -> dict:
+        # Il CSV non supporta richieste parziali: si scarica tutto e si filtra
+        # Retry e backoff gestiti dall'adapter della sessione (404 & co. falliscono subito)
+        response = get_http_session().get(self.url, allow_redirects=True, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+
+        data = pd.read_csv(io.StringIO(response.content.decode('utf-8')))
+        data['Date'] = pd.to_datetime(data['Date'])
+        series = data.set_index('Date')['Price'].dropna()
+        if start is not None:
+            series = series[series.index >= pd.Timestamp(start)]
+        return {ticker: series for ticker in tickers}
+
+
+class FixtureSource:
+    """
+    Legge gli storici da una cartella locale: un file <ticker>.csv per ticker
+    (colonne Date e Price oppure Close). Per test e sviluppo offline.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @staticmethod
+    def filename(ticker: str) -> str:
+        return ''.join(c if c.isalnum() or c in '-_.' else '_' for c in ticker) + '.csv'
+
+    def fetch_prices(self, tickers: list, start=None) -> dict:
+        prices = {}
+        for ticker in tickers:
+            path = os.path.join(self.directory, self.filename(ticker))
+            if not os.path.exists(path):
+                continue
+            frame = pd.read_csv(path, parse_dates=['Date'], index_col='Date')
+            column = 'Price' if 'Price' in frame.columns else 'Close'
+            series = frame[column].dropna()
+            if start is not None:
+                series = series[series.index >= pd.Timestamp(start)]
+            prices[ticker] = series
+        return prices
+
+
+def default_sources(fixtures_dir: str = None, datahub_url: str = None) -> dict:
+    """
+    Mappa {nome sorgente: istanza} usata da fetch_returns.
+
+    Con fixtures_dir tutte le sorgenti leggono dalla cartella locale.
+    """
+    if fixtures_dir:
+        fixture = FixtureSource(fixtures_dir)
+        return {'yahoo': fixture, 'datahub': fixture}
+    return {
+        'yahoo': YahooSource(),
+        'datahub': DataHubSource(datahub_url or DATAHUB_GOLD_URL)
+    }
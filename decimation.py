@@ -0,0 +1,84 @@
+"""
+decimation.py
+Riduzione dei punti delle serie del grafico mantenendone la forma visiva.
+
+Le bande del fan chart (p3, p25, p50, p75) hanno un punto per passo: con
+orizzonti lunghi o passi più fini il JSON e il rendering nel browser crescono
+senza aggiungere nulla di visibile. Qui si scelgono i punti da mostrare con
+LTTB (Largest-Triangle-Three-Buckets, Steinarsson 2013): la serie viene
+divisa in bucket e da ognuno si tiene il punto che forma il triangolo di area
+massima con il punto scelto nel bucket precedente e la media del successivo,
+così picchi e cambi di pendenza sopravvivono.
+
+Gli indici sono calcolati una volta per banda e uniti: tutte le tracce
+(bande, area, traiettorie) usano lo stesso asse x ridotto e il riempimento
+fra p25 e p75 resta allineato.
+"""
+
+import numpy as np
+
+
+# Punti massimi dell'asse temporale condiviso dalle tracce del grafico
+DEFAULT_MAX_POINTS = 500
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indici dei punti scelti da LTTB (primo e ultimo sempre inclusi).
+
+    Args:
+        x: ascisse crescenti
+        y: ordinate (stessa lunghezza di x)
+        n_out: punti da tenere (≥ 3)
+
+    Returns:
+        indici crescenti, al massimo n_out
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # Bucket interni (primo e ultimo punto esclusi): limiti [edges[i], edges[i + 1])
+    edges = np.floor(np.linspace(1, n - 1, n_out - 1)).astype(np.int64)
+    edges[-1] = n - 1
+
+    # Media di ogni bucket (il "terzo vertice" per il bucket precedente)
+    csum_x = np.concatenate([[0.0], np.cumsum(x)])
+    csum_y = np.concatenate([[0.0], np.cumsum(y)])
+    counts = edges[1:] - edges[:-1]
+    mean_x = (csum_x[edges[1:]] - csum_x[edges[:-1]]) / counts
+    mean_y = (csum_y[edges[1:]] - csum_y[edges[:-1]]) / counts
+    # Dopo l'ultimo bucket il terzo vertice è l'ultimo punto
+    mean_x = np.append(mean_x[1:], x[-1])
+    mean_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Doppia area del triangolo (a, punto del bucket, media del successivo)
+        area = np.abs((x[a] - mean_x[i]) * (y[start:stop] - y[a])
+                      - (x[a] - x[start:stop]) * (mean_y[i] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def shared_indices(x: np.ndarray, series: list, max_points: int = DEFAULT_MAX_POINTS) -> np.ndarray:
+    """
+    Indici comuni a più serie sullo stesso asse: unione degli indici LTTB di
+    ciascuna, con il budget diviso fra le serie (l'unione non supera max_points).
+
+    Returns:
+        indici crescenti; tutti i punti se la serie è già entro il budget
+    """
+    n = len(x)
+    if max_points is None or n <= max_points or not series:
+        return np.arange(n)
+    per_series = max(max_points // len(series), 3)
+    return np.unique(np.concatenate([lttb_indices(x, y, per_series) for y in series]))
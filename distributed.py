@@ -0,0 +1,314 @@
+"""
+distributed.py
+Simulazione distribuita su più nodi per le elaborazioni molto grandi
+(decine di milioni di traiettorie, es. stress test notturni).
+
+Il coordinatore divide n_sims in shard con seed propri (seed della
+simulazione + indice dello shard): il risultato di uno shard non dipende dal
+nodo che lo esegue, quindi uno shard perso può essere riassegnato a un altro
+worker senza cambiare il risultato finale. Ogni worker simula il proprio
+shard a blocchi, un passo alla volta, e restituisce solo un riassunto
+fondibile (sketches.PathSummary: sketch dei quantili per passo, momenti,
+istogramma del CAGR, campione di traiettorie); il coordinatore li fonde
+nell'ordine degli shard e produce le stesse chiavi del motore standard.
+
+Protocollo HTTP minimale (solo libreria standard):
+    GET  /health  -> 200 "ok"
+    POST /shard   {"params": {...}, "shard": i, "size": n} -> PathSummary.to_bytes()
+Un 400 indica parametri non validi (errore definitivo); errori di rete,
+timeout e 5xx fanno rimettere lo shard in coda. Un worker che fallisce
+max_failures volte di fila viene escluso.
+
+Uso:
+    python distributed.py worker --port 8701
+    python distributed.py run --workers http://nodo1:8701,http://nodo2:8701 --n-sims 50000000
+    python distributed.py run --local 4 --n-sims 2000000      # worker su localhost
+"""
+
+import argparse
+import json
+import logging
+import queue
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.client import HTTPException
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+from typing import Dict, Any
+
+from monte_carlo_engine import PERCENTILES_FINAL, PERCENTILES_TIME, SKETCH_SHARD_SIZE, simulate_shard
+from sketches import PathSummary
+
+
+logger = logging.getLogger(__name__)
+
+# Traiettorie per shard (stessa suddivisione del motore a sketch locale)
+DEFAULT_SHARD_SIZE = SKETCH_SHARD_SIZE
+
+# Tempo massimo per uno shard prima di considerare perso il worker (secondi)
+DEFAULT_SHARD_TIMEOUT = 3600
+
+DEFAULT_MAX_FAILURES = 2
+DEFAULT_PORT = 8701
+STARTUP_TIMEOUT = 30
+
+
+# ========== WORKER ==========
+
+class ShardHandler(BaseHTTPRequestHandler):
+    """
+    Esegue uno shard per richiesta (un worker = un processo = uno shard alla volta).
+    """
+
+    def do_GET(self):
+        if self.path != '/health':
+            self.send_error(404)
+            return
+        self._reply(200, b'ok', 'text/plain')
+
+    def do_POST(self):
+        if self.path != '/shard':
+            self.send_error(404)
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            summary = simulate_shard(request['params'], int(request['shard']), int(request['size']))
+        except (KeyError, TypeError, ValueError) as e:
+            self._reply(400, str(e).encode('utf-8'), 'text/plain')
+            return
+        except Exception as e:
+            logger.exception("Errore nello shard")
+            self._reply(500, str(e).encode('utf-8'), 'text/plain')
+            return
+        self._reply(200, summary.to_bytes(), 'application/octet-stream')
+
+    def _reply(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def serve_worker(host: str = '127.0.0.1', port: int = DEFAULT_PORT):
+    server = HTTPServer((host, port), ShardHandler)
+    print(f"🛠️  Worker di simulazione su http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# ========== COORDINATORE ==========
+
+class ShardError(Exception):
+    """
+    Errore definitivo di uno shard (parametri rifiutati dal worker).
+    """
+
+
+class DistributedCoordinator:
+    """
+    Distribuisce gli shard ai worker HTTP e fonde i riassunti.
+    """
+
+    def __init__(self, workers: list, timeout: float = DEFAULT_SHARD_TIMEOUT,
+                 max_failures: int = DEFAULT_MAX_FAILURES):
+        if not workers:
+            raise ValueError("Nessun worker specificato")
+        self.workers = [url.rstrip('/') for url in workers]
+        self.timeout = timeout
+        self.max_failures = max_failures
+
+    def _post_shard(self, url: str, params: dict, shard: tuple) -> bytes:
+        body = json.dumps({'params': params, 'shard': shard[0], 'size': shard[1]}).encode('utf-8')
+        request = urllib.request.Request(f'{url}/shard', data=body,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 400:
+                raise ShardError(e.read().decode('utf-8', errors='replace')) from None
+            raise
+
+    def run(self, params: Dict[str, Any], shard_size: int = DEFAULT_SHARD_SIZE) -> Dict[str, Any]:
+        """
+        Esegue la simulazione sui worker.
+
+        Args:
+            params: parametri del motore standard (capital, mu, sigma, years,
+                n_sims, seed, sample_paths); senza seed ne viene estratto uno,
+                riportato nei risultati
+            shard_size: traiettorie per shard
+
+        Returns:
+            chiavi del motore standard (senza 'paths' e traiettorie
+            rappresentative) più 'sketch' (limiti dell'errore di rango) e
+            'distributed' (worker, shard, riassegnazioni, durata)
+        """
+        params = {k: (v.item() if isinstance(v, np.generic) else v) for k, v in params.items()}
+        if params.get('seed') is None:
+            params['seed'] = int(np.random.SeedSequence().entropy % 2**63)
+        n_sims = int(params['n_sims'])
+        shards = [(i, min(shard_size, n_sims - start))
+                  for i, start in enumerate(range(0, n_sims, shard_size))]
+
+        pending = queue.Queue()
+        for shard in shards:
+            pending.put(shard)
+        summaries = {}
+        lock = threading.Lock()
+        state = {'reissued': 0, 'fatal': None}
+
+        def finished():
+            with lock:
+                return len(summaries) == len(shards) or state['fatal'] is not None
+
+        def work(url: str):
+            failures = 0
+            while not finished():
+                try:
+                    shard = pending.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+                try:
+                    data = self._post_shard(url, params, shard)
+                    summary = PathSummary.from_bytes(data)
+                except ShardError as e:
+                    with lock:
+                        state['fatal'] = str(e)
+                    return
+                except (OSError, HTTPException, ValueError) as e:
+                    pending.put(shard)
+                    failures += 1
+                    with lock:
+                        state['reissued'] += 1
+                    logger.warning("Shard %d fallito su %s (%s): rimesso in coda", shard[0], url, e)
+                    if failures >= self.max_failures:
+                        logger.warning("Worker %s escluso dopo %d errori", url, failures)
+                        return
+                    continue
+                failures = 0
+                with lock:
+                    summaries[shard[0]] = summary
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=work, args=(url,), daemon=True) for url in self.workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if state['fatal'] is not None:
+            raise ValueError(f"Parametri rifiutati dai worker: {state['fatal']}")
+        if len(summaries) < len(shards):
+            raise RuntimeError(f"Nessun worker disponibile: completati {len(summaries)} "
+                               f"shard su {len(shards)}")
+
+        # Fusione nell'ordine degli shard: risultato indipendente dai worker
+        merged = summaries[0]
+        for i in range(1, len(shards)):
+            merged.merge(summaries[i])
+        results = merged.results(PERCENTILES_TIME, PERCENTILES_FINAL)
+        results['distributed'] = {
+            'seed': params['seed'],
+            'workers': len(self.workers),
+            'shards': len(shards),
+            'reissued': state['reissued'],
+            'elapsed': time.perf_counter() - start
+        }
+        return results
+
+
+def start_local_workers(n: int) -> tuple:
+    """
+    Avvia n worker su localhost (porte libere) e attende che rispondano.
+
+    Returns:
+        (processi, url)
+    """
+    import socket
+
+    processes, urls = [], []
+    for _ in range(n):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        processes.append(subprocess.Popen([sys.executable, __file__, 'worker', '--port', str(port)],
+                                          stdout=subprocess.DEVNULL))
+        urls.append(f'http://127.0.0.1:{port}')
+
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    for url in urls:
+        while True:
+            try:
+                with urllib.request.urlopen(f'{url}/health', timeout=2):
+                    break
+            except OSError:
+                if time.monotonic() > deadline:
+                    for process in processes:
+                        process.terminate()
+                    raise RuntimeError(f"Worker {url} non raggiungibile entro il timeout di avvio")
+                time.sleep(0.2)
+    return processes, urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulazione Monte Carlo distribuita")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    worker = commands.add_parser('worker', help="avvia un worker HTTP")
+    worker.add_argument('--host', default='127.0.0.1')
+    worker.add_argument('--port', type=int, default=DEFAULT_PORT)
+
+    run = commands.add_parser('run', help="esegue una simulazione sui worker")
+    run.add_argument('--workers', default='', help="URL dei worker separati da virgola")
+    run.add_argument('--local', type=int, default=0, help="avvia N worker su localhost")
+    run.add_argument('--n-sims', type=int, default=10_000_000)
+    run.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE)
+    run.add_argument('--capital', type=float, default=400_000)
+    run.add_argument('--mu', type=float, default=0.0523, help="rendimento annuo (decimale)")
+    run.add_argument('--sigma', type=float, default=0.0695, help="volatilità annua (decimale)")
+    run.add_argument('--years', type=int, default=30)
+    run.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        serve_worker(args.host, args.port)
+        return 0
+
+    processes, urls = [], [url for url in args.workers.split(',') if url]
+    if args.local:
+        processes, local_urls = start_local_workers(args.local)
+        urls += local_urls
+    try:
+        params = {'capital': args.capital, 'mu': args.mu, 'sigma': args.sigma, 'years': args.years,
+                  'n_sims': args.n_sims, 'seed': args.seed}
+        results = DistributedCoordinator(urls).run(params, args.shard_size)
+    finally:
+        for process in processes:
+            process.terminate()
+
+    info = results['distributed']
+    print(f"✅ {results['n_sims']:,} simulazioni in {info['elapsed']:.1f}s "
+          f"({info['shards']} shard, {info['workers']} worker, {info['reissued']} riassegnati)")
+    for label, value in results['percentiles_final'].items():
+        print(f"   {label:>4}: €{value:>14,.0f}")
+    errors = results['sketch']['rank_error']
+    print(f"   errore di rango massimo: finale {errors['terminal']:.3%}, nel tempo {errors['time']:.3%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
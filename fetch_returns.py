@@ -1,534 +1,263 @@
-import yfinance as yf
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
-import io
+
+from asset_store import publish_asset_data
+from asset_statistics import PERIODS_PER_YEAR, compute_asset_statistics, covariance_model
+from data_sources import default_sources
+from price_cache import DEFAULT_CACHE_DIR, cached_sources
+from return_models import fit_return_models
+from window_statistics import DEFAULT_STATS_PATH, compute_window_statistics, save_window_statistics
+
+
+# Asset esportati in asset_data.json: nome visualizzato, ticker/proxy,
+# sorgente dati e frequenza dello storico ('D' giornaliero, 'M' mensile)
+ASSET_SPECS = {
+    # S&P 500 Index - storico dal 1927 su Yahoo Finance
+    'sp500': {'name': 'S&P 500 (USA)', 'ticker': '^GSPC', 'source': 'yahoo', 'freq': 'D'},
+    # iShares MSCI EAFE ETF - Proxy Developed Markets ex-US, dal 2001
+    # (ACWX, ACWI ex US, parte solo dal 2008)
+    'world_ex_usa': {'name': 'World ex USA', 'ticker': 'EFA', 'source': 'yahoo', 'freq': 'D'},
+    # iShares MSCI Emerging Markets ETF - il più vecchio ETF EM, dal 7 aprile 2003
+    'emerging_markets': {'name': 'Emerging Markets', 'ticker': 'EEM', 'source': 'yahoo', 'freq': 'D'},
+    # iShares MSCI USA Quality Factor ETF - dal 16 luglio 2013
+    'quality': {'name': 'Quality Factor', 'ticker': 'QUAL', 'source': 'yahoo', 'freq': 'D'},
+    # iShares Russell 1000 Value ETF - dal 22 maggio 2000
+    'value': {'name': 'Value Factor (IWD)', 'ticker': 'IWD', 'source': 'yahoo', 'freq': 'D'},
+    # iShares MSCI USA Momentum Factor ETF - dal 16 aprile 2013
+    'momentum': {'name': 'Momentum Factor', 'ticker': 'MTUM', 'source': 'yahoo', 'freq': 'D'},
+    # iShares Russell 2000 ETF - il più vecchio ETF Small Cap, dal 22 maggio 2000
+    'small_cap': {'name': 'Small Cap (IWM)', 'ticker': 'IWM', 'source': 'yahoo', 'freq': 'D'},
+    # JPMorgan Diversified Return US Equity ETF - dal settembre 2015
+    'multifactor': {'name': 'Multifactor', 'ticker': 'JPUS', 'source': 'yahoo', 'freq': 'D'},
+    # iShares Core Euro Aggregate Bond UCITS ETF (Euronext Amsterdam), dal 2009
+    'euro_aggregate': {'name': 'Euro Aggregate', 'ticker': 'IEAG.AS', 'source': 'yahoo', 'freq': 'D'},
+    # Xtrackers II Global Aggregate Bond Swap UCITS ETF 1D - EUR Hedged (Xetra), dal 2013-08-14
+    'global_aggregate': {'name': 'Global Agg Hedged', 'ticker': 'XG7S.DE', 'source': 'yahoo', 'freq': 'D'},
+    # DataHub - prezzi mensili dell'oro dal 1950
+    'gold': {'name': 'Gold (Spot)', 'ticker': 'gold-monthly', 'source': 'datahub', 'freq': 'M'}
+}
+
+# Asset disponibili ma non esportati
+EXTRA_SPECS = {
+    # MSCI World Net Total Return USD Index
+    'msci_world': {'name': 'MSCI World', 'ticker': '^990100-USD-STRD', 'source': 'yahoo', 'freq': 'D'}
+}
+
+def _spec(key: str) -> dict:
+    return ASSET_SPECS.get(key) or EXTRA_SPECS[key]
+
+
+def fetch_price_histories(keys: list, sources: dict = None, max_workers: int = 4) -> dict:
+    """
+    Scarica in parallelo gli storici di prezzo degli asset richiesti.
+
+    I ticker vengono raggruppati per sorgente (e in batch multi-ticker dove la
+    sorgente lo supporta); ogni batch è un task di un pool di thread limitato,
+    quindi il tempo totale si avvicina a quello del download più lento.
+
+    Returns:
+        {chiave asset: pd.Series di prezzi}; gli asset non scaricati sono assenti
+    """
+    sources = sources or default_sources()
+
+    tickers_by_source = {}
+    for key in keys:
+        spec = _spec(key)
+        tickers_by_source.setdefault(spec['source'], []).append(spec['ticker'])
+
+    tasks = []
+    for source_name, tickers in tickers_by_source.items():
+        source = sources[source_name]
+        batch_size = getattr(source, 'batch_size', len(tickers))
+        for i in range(0, len(tickers), batch_size):
+            tasks.append((source_name, source, tickers[i:i + batch_size]))
+
+    prices_by_ticker = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [(name, tickers, pool.submit(source.fetch_prices, tickers))
+                   for name, source, tickers in tasks]
+        for name, tickers, future in futures:
+            try:
+                prices_by_ticker.update(future.result())
+            except Exception as e:
+                print(f"❌ Errore download {name} {tickers}: {e}")
+
+    return {key: prices_by_ticker[_spec(key)['ticker']]
+            for key in keys if _spec(key)['ticker'] in prices_by_ticker}
+
+
+def returns_from_prices(prices: pd.Series) -> pd.Series:
+    """
+    Rendimenti semplici periodo su periodo (giornalieri o mensili), senza NaN iniziale.
+    """
+    return prices.pct_change().dropna()
+
+
+def _print_summary(key: str, returns: pd.Series):
+    spec = _spec(key)
+    periods = PERIODS_PER_YEAR[spec['freq']]
+    mean_ann = returns.mean() * periods
+    std_ann = returns.std() * (periods**0.5)
+    unit = 'giorni' if spec['freq'] == 'D' else 'mesi'
+    print(f"✅ {spec['name']} ({spec['ticker']}): {len(returns)} {unit} "
+          f"({returns.index[0].date()} - {returns.index[-1].date()})")
+    print(f"   Rendimento: {mean_ann:.2%}, Volatilità: {std_ann:.2%}")
+
+
+def fetch_all_returns(keys: list, sources: dict = None, max_workers: int = 4) -> dict:
+    """
+    Scarica gli storici in parallelo e li converte in serie di rendimenti.
+    """
+    prices = fetch_price_histories(keys, sources, max_workers)
+    returns = {}
+    for key in keys:
+        if key not in prices or len(prices[key]) < 2:
+            print(f"❌ Nessun dato per {_spec(key)['name']} ({_spec(key)['ticker']})")
+            returns[key] = None
+            continue
+        returns[key] = returns_from_prices(prices[key])
+        _print_summary(key, returns[key])
+    return returns
+
+
+def fetch_asset_returns(key: str, sources: dict = None):
+    """
+    Rendimenti storici di un singolo asset (giornalieri, o mensili per l'oro).
+    """
+    print(f"\n⏳ Scarico dati storici {_spec(key)['name']} ({_spec(key)['ticker']})...")
+    return fetch_all_returns([key], sources)[key]
+
 
 def fetch_msci_world_returns():
-    # Ticker Yahoo Finance per "MSCI World Net Total Return USD Index"
-    # Codice comune: ^990100-USD-STRD
-    ticker = "^990100-USD-STRD"
-    
-    print(f"⏳ Scarico dati storici INDICE MSCI World ({ticker})...")
-    
-    # Scarichiamo il massimo storico disponibile
-    try:
-        data = yf.download(ticker, period="max", progress=False)
-    except Exception as e:
-        print(f"❌ Errore durante il download: {e}")
-        return
-
-    if data.empty:
-        print("❌ Errore: Nessun dato scaricato. Il ticker potrebbe essere momentaneamente non disponibile.")
-        return
-
-    print(f"✅ Dati scaricati: {len(data)} giorni di trading dal {data.index[0].strftime('%Y-%m-%d')} al {data.index[-1].strftime('%Y-%m-%d')}")
-    
-    # Calcolo rendimenti giornalieri (Close to Close)
-    # Per gli indici spesso 'Close' e 'Adj Close' coincidono, ma usiamo Adj Close per sicurezza
-    price_col = 'Adj Close' if 'Adj Close' in data.columns else 'Close'
-    
-    # Gestione multi-index se presente (yfinance a volte ritorna multi-level columns)
-    if isinstance(data.columns, pd.MultiIndex):
-        daily_returns = data.xs(price_col, axis=1, level=0).pct_change()
-        # Se rimane ancora un livello (es. ticker), prendilo
-        if daily_returns.shape[1] == 1:
-             daily_returns = daily_returns.iloc[:, 0]
-    else:
-        daily_returns = data[price_col].pct_change()
-    
-    # Rimuovi NaN iniziale
-    daily_returns = daily_returns.dropna()
-    
-    # Statistiche di base
-    mean_daily = daily_returns.mean()
-    std_daily = daily_returns.std()
-    
-    # Annualizzazione (approssimata a 252 giorni di trading)
-    mean_annual = mean_daily * 252
-    std_annual = std_daily * (252**0.5)
-    
-    print("\n📊 Prime 5 righe (Rendimenti Giornalieri):")
-    print(daily_returns.head())
-    
-    print("\n📈 Statistiche Storiche INDICE (Annualizzate):")
-    print(f"   Rendimento Medio Annuo: {mean_annual:.2%}")
-    print(f"   Volatilità Annua:       {std_annual:.2%}")
-    
-    return daily_returns
+    return fetch_asset_returns('msci_world')
 
 def fetch_euro_aggregate_returns():
-    # Ticker proxy: iShares Core Euro Aggregate Bond UCITS ETF
-    # Ticker Yahoo: IEAG.AS (Euronext Amsterdam)
-    # È uno dei più grandi e liquidi, con storico dal 2009.
-    ticker = "IEAG.AS"
-    
-    print(f"\n⏳ Scarico dati storici Bloomberg Euro Aggregate (Proxy: {ticker})...")
-    
-    try:
-        data = yf.download(ticker, period="max", progress=False)
-    except Exception as e:
-        print(f"❌ Errore durante il download: {e}")
-        return
-
-    if data.empty:
-        print("❌ Errore: Nessun dato scaricato.")
-        return
-
-    print(f"✅ Dati scaricati: {len(data)} giorni di trading dal {data.index[0].strftime('%Y-%m-%d')} al {data.index[-1].strftime('%Y-%m-%d')}")
-    
-    price_col = 'Adj Close' if 'Adj Close' in data.columns else 'Close'
-    
-    if isinstance(data.columns, pd.MultiIndex):
-        daily_returns = data.xs(price_col, axis=1, level=0).pct_change()
-        if daily_returns.shape[1] == 1:
-             daily_returns = daily_returns.iloc[:, 0]
-    else:
-        daily_returns = data[price_col].pct_change()
-    
-    daily_returns = daily_returns.dropna()
-    
-    mean_daily = daily_returns.mean()
-    std_daily = daily_returns.std()
-    
-    mean_annual = mean_daily * 252
-    std_annual = std_daily * (252**0.5)
-    
-    print("\n📊 Prime 5 righe (Rendimenti Giornalieri):")
-    print(daily_returns.head())
-    
-    print("\n📈 Statistiche Storiche EURO AGGREGATE (Annualizzate):")
-    print(f"   Rendimento Medio Annuo: {mean_annual:.2%}")
-    print(f"   Volatilità Annua:       {std_annual:.2%}")
-    
-    return daily_returns
-
-    return daily_returns
+    return fetch_asset_returns('euro_aggregate')
 
 def fetch_global_aggregate_hedged_returns():
-    # Ticker proxy: Xtrackers II Global Aggregate Bond Swap UCITS ETF 1D - EUR Hedged
-    # Ticker Yahoo: XG7S.DE (Xetra)
-    # Storico dal 2013-08-14.
-    ticker = "XG7S.DE"
-    
-    print(f"\n⏳ Scarico dati storici Bloomberg Global Aggregate EUR Hedged (Proxy: {ticker})...")
-    
-    try:
-        data = yf.download(ticker, period="max", progress=False)
-    except Exception as e:
-        print(f"❌ Errore durante il download: {e}")
-        return
-
-    if data.empty:
-        print("❌ Errore: Nessun dato scaricato.")
-        return
-
-    print(f"✅ Dati scaricati: {len(data)} giorni di trading dal {data.index[0].strftime('%Y-%m-%d')} al {data.index[-1].strftime('%Y-%m-%d')}")
-    
-    price_col = 'Adj Close' if 'Adj Close' in data.columns else 'Close'
-    
-    if isinstance(data.columns, pd.MultiIndex):
-        daily_returns = data.xs(price_col, axis=1, level=0).pct_change()
-        if daily_returns.shape[1] == 1:
-             daily_returns = daily_returns.iloc[:, 0]
-    else:
-        daily_returns = data[price_col].pct_change()
-    
-    daily_returns = daily_returns.dropna()
-    
-    mean_daily = daily_returns.mean()
-    std_daily = daily_returns.std()
-    
-    mean_annual = mean_daily * 252
-    std_annual = std_daily * (252**0.5)
-    
-    print("\n📊 Prime 5 righe (Rendimenti Giornalieri):")
-    print(daily_returns.head())
-    
-    print("\n📈 Statistiche Storiche GLOBAL AGGREGATE HEDGED (Annualizzate):")
-    print(f"   Rendimento Medio Annuo: {mean_annual:.2%}")
-    print(f"   Volatilità Annua:       {std_annual:.2%}")
-    
-    return daily_returns
-
-    return daily_returns
+    return fetch_asset_returns('global_aggregate')
 
 def fetch_gold_long_term():
-    import requests
-    import io
-    
-    # Fonte: DataHub (Monthly Gold Prices since 1950)
-    url = "https://datahub.io/core/gold-prices/r/monthly.csv"
-    
-    print(f"\n⏳ Scarico dati storici Gold (Long Term) da DataHub...")
-    
-    try:
-        response = requests.get(url, allow_redirects=True)
-        if response.status_code != 200:
-            print(f"❌ Download failed. Status: {response.status_code}")
-            return
-            
-        content = response.content.decode('utf-8')
-        data = pd.read_csv(io.StringIO(content))
-        
-        # Parsing data: formato atteso 'YYYY-MM'
-        data['Date'] = pd.to_datetime(data['Date'])
-        data.set_index('Date', inplace=True)
-        
-        # Uso tutto lo storico disponibile (dal 1950)
-        # data = data[data.index >= '1970-01-01']
-        
-    except Exception as e:
-        print(f"❌ Errore durante elaborazione DataHub: {e}")
-        return
-
-    print(f"✅ Dati scaricati: {len(data)} mesi dal {data.index[0].strftime('%Y-%m')} al {data.index[-1].strftime('%Y-%m')}")
-    
-    # Calcolo rendimenti MENSILI
-    # DataHub ha colonna 'Price'
-    monthly_returns = data['Price'].pct_change().dropna()
-    
-    # Statistiche MENSILI
-    mean_monthly = monthly_returns.mean()
-    std_monthly = monthly_returns.std()
-    
-    # Annualizzazione (x12 per rendimento, xSQRT(12) per volatilità)
-    mean_annual = mean_monthly * 12
-    std_annual = std_monthly * (12**0.5)
-    
-    print("\n📊 Prime 5 righe (Rendimenti Mensili):")
-    print(monthly_returns.head())
-    
-    print("\n📈 Statistiche Storiche GOLD (1970-Oggi, Annualizzate da dati Mensili):")
-    print(f"   Rendimento Medio Annuo: {mean_annual:.2%}")
-    print(f"   Volatilità Annua:       {std_annual:.2%}")
-    
-    return monthly_returns
-
-    return monthly_returns
-
-    return monthly_returns
+    return fetch_asset_returns('gold')
 
 def fetch_sp500_long_term():
-    # Ticker: ^GSPC (S&P 500 Index)
-    # Storico: dal 1927 su Yahoo Finance
-    ticker = "^GSPC"
-    print(f"\n⏳ Scarico dati storici S&P 500 (Long Term: {ticker})...")
-    try:
-        data = yf.download(ticker, period="max", progress=False)
-        if data.empty: return None
-        
-        price_col = 'Adj Close' if 'Adj Close' in data.columns else 'Close'
-        if isinstance(data.columns, pd.MultiIndex):
-            returns = data.xs(price_col, axis=1, level=0).pct_change()
-            if returns.shape[1] == 1: returns = returns.iloc[:, 0]
-        else:
-            returns = data[price_col].pct_change()
-            
-        returns = returns.dropna()
-        
-        # Stats
-        mean_ann = returns.mean() * 252
-        std_ann = returns.std() * (252**0.5)
-        print(f"✅ S&P 500: {len(returns)} giorni ({returns.index[0].date()} - {returns.index[-1].date()})")
-        print(f"   Rendimento: {mean_ann:.2%}, Volatilità: {std_ann:.2%}")
-        
-        return returns
-    except Exception as e:
-        print(f"❌ Errore S&P 500: {e}")
-        return None
+    return fetch_asset_returns('sp500')
 
 def fetch_world_ex_usa():
-    # Ticker: EFA (iShares MSCI EAFE ETF) - Proxy Developed Markets ex-US
-    # Storico: dal 2001
-    # ACWX (ACWI ex US) parte solo dal 2008
-    ticker = "EFA" 
-    print(f"\n⏳ Scarico dati storici World ex USA (Proxy: {ticker})...")
-    try:
-        data = yf.download(ticker, period="max", progress=False)
-        if data.empty: return None
-        
-        price_col = 'Adj Close' if 'Adj Close' in data.columns else 'Close'
-        if isinstance(data.columns, pd.MultiIndex):
-            returns = data.xs(price_col, axis=1, level=0).pct_change()
-            if returns.shape[1] == 1: returns = returns.iloc[:, 0]
-        else:
-            returns = data[price_col].pct_change()
-            
-        returns = returns.dropna()
-        
-        # Stats
-        mean_ann = returns.mean() * 252
-        std_ann = returns.std() * (252**0.5)
-        print(f"✅ World ex USA: {len(returns)} giorni ({returns.index[0].date()} - {returns.index[-1].date()})")
-        print(f"   Rendimento: {mean_ann:.2%}, Volatilità: {std_ann:.2%}")
-        
-        return returns
-    except Exception as e:
-        print(f"❌ Errore World ex USA: {e}")
-        return None
+    return fetch_asset_returns('world_ex_usa')
 
 def fetch_emerging_markets():
-    # Ticker: EEM (iShares MSCI Emerging Markets ETF)
-    # Oldest EM ETF - Historical data since April 7, 2003
-    ticker = "EEM"
-    print(f"\n⏳ Scarico dati storici Mercati Emergenti (Proxy: {ticker})...")
-    try:
-        data = yf.download(ticker, period="max", progress=False)
-        if data.empty: return None
-        
-        price_col = 'Adj Close' if 'Adj Close' in data.columns else 'Close'
-        if isinstance(data.columns, pd.MultiIndex):
-            returns = data.xs(price_col, axis=1, level=0).pct_change()
-            if returns.shape[1] == 1: returns = returns.iloc[:, 0]
-        else:
-            returns = data[price_col].pct_change()
-            
-        returns = returns.dropna()
-        
-        # Stats
-        mean_ann = returns.mean() * 252
-        std_ann = returns.std() * (252**0.5)
-        print(f"✅ Emerging Markets: {len(returns)} giorni ({returns.index[0].date()} - {returns.index[-1].date()})")
-        print(f"   Rendimento: {mean_ann:.2%}, Volatilità: {std_ann:.2%}")
-        
-        return returns
-    except Exception as e:
-        print(f"❌ Errore Emerging Markets: {e}")
-        return None
+    return fetch_asset_returns('emerging_markets')
 
 def fetch_quality_factor():
-    # Ticker: QUAL (iShares MSCI USA Quality Factor ETF)
-    # Historical data since July 16, 2013
-    ticker = "QUAL"
-    print(f"\n⏳ Scarico dati storici Quality Factor (Proxy: {ticker})...")
-    try:
-        data = yf.download(ticker, period="max", progress=False)
-        if data.empty: return None
-        
-        price_col = 'Adj Close' if 'Adj Close' in data.columns else 'Close'
-        if isinstance(data.columns, pd.MultiIndex):
-            returns = data.xs(price_col, axis=1, level=0).pct_change()
-            if returns.shape[1] == 1: returns = returns.iloc[:, 0]
-        else:
-            returns = data[price_col].pct_change()
-            
-        returns = returns.dropna()
-        
-        mean_ann = returns.mean() * 252
-        std_ann = returns.std() * (252**0.5)
-        print(f"✅ Quality Factor: {len(returns)} giorni ({returns.index[0].date()} - {returns.index[-1].date()})")
-        print(f"   Rendimento: {mean_ann:.2%}, Volatilità: {std_ann:.2%}")
-        
-        return returns
-    except Exception as e:
-        print(f"❌ Errore Quality Factor: {e}")
-        return None
+    return fetch_asset_returns('quality')
 
 def fetch_value_factor():
-    # Ticker: IWD (iShares Russell 1000 Value ETF)
-    # Historical data since May 22, 2000
-    ticker = "IWD"
-    print(f"\n⏳ Scarico dati storici Value Factor (Proxy: {ticker})...")
-    try:
-        data = yf.download(ticker, period="max", progress=False)
-        if data.empty: return None
-        
-        price_col = 'Adj Close' if 'Adj Close' in data.columns else 'Close'
-        if isinstance(data.columns, pd.MultiIndex):
-            returns = data.xs(price_col, axis=1, level=0).pct_change()
-            if returns.shape[1] == 1: returns = returns.iloc[:, 0]
-        else:
-            returns = data[price_col].pct_change()
-            
-        returns = returns.dropna()
-        
-        mean_ann = returns.mean() * 252
-        std_ann = returns.std() * (252**0.5)
-        print(f"✅ Value Factor: {len(returns)} giorni ({returns.index[0].date()} - {returns.index[-1].date()})")
-        print(f"   Rendimento: {mean_ann:.2%}, Volatilità: {std_ann:.2%}")
-        
-        return returns
-    except Exception as e:
-        print(f"❌ Errore Value Factor: {e}")
-        return None
-
+    return fetch_asset_returns('value')
 
 def fetch_momentum_factor():
-    # Ticker: MTUM (iShares MSCI USA Momentum Factor ETF)
-    # Historical data since April 16, 2013
-    ticker = "MTUM"
-    print(f"\n⏳ Scarico dati storici Momentum Factor (Proxy: {ticker})...")
-    try:
-        data = yf.download(ticker, period="max", progress=False)
-        if data.empty: return None
-        
-        price_col = 'Adj Close' if 'Adj Close' in data.columns else 'Close'
-        if isinstance(data.columns, pd.MultiIndex):
-            returns = data.xs(price_col, axis=1, level=0).pct_change()
-            if returns.shape[1] == 1: returns = returns.iloc[:, 0]
-        else:
-            returns = data[price_col].pct_change()
-            
-        returns = returns.dropna()
-        
-        mean_ann = returns.mean() * 252
-        std_ann = returns.std() * (252**0.5)
-        print(f"✅ Momentum Factor: {len(returns)} giorni ({returns.index[0].date()} - {returns.index[-1].date()})")
-        print(f"   Rendimento: {mean_ann:.2%}, Volatilità: {std_ann:.2%}")
-        
-        return returns
-    except Exception as e:
-        print(f"❌ Errore Momentum Factor: {e}")
-        return None
+    return fetch_asset_returns('momentum')
 
 def fetch_small_cap():
-    # Ticker: IWM (iShares Russell 2000 ETF)
-    # Oldest Small Cap ETF - Historical data since May 22, 2000
-    ticker = "IWM"
-    print(f"\n⏳ Scarico dati storici Small Cap (Proxy: {ticker})...")
-    try:
-        data = yf.download(ticker, period="max", progress=False)
-        if data.empty: return None
-        
-        price_col = 'Adj Close' if 'Adj Close' in data.columns else 'Close'
-        if isinstance(data.columns, pd.MultiIndex):
-            returns = data.xs(price_col, axis=1, level=0).pct_change()
-            if returns.shape[1] == 1: returns = returns.iloc[:, 0]
-        else:
-            returns = data[price_col].pct_change()
-            
-        returns = returns.dropna()
-        
-        mean_ann = returns.mean() * 252
-        std_ann = returns.std() * (252**0.5)
-        print(f"✅ Small Cap: {len(returns)} giorni ({returns.index[0].date()} - {returns.index[-1].date()})")
-        print(f"   Rendimento: {mean_ann:.2%}, Volatilità: {std_ann:.2%}")
-        
-        return returns
-    except Exception as e:
-        print(f"❌ Errore Small Cap: {e}")
-        return None
+    return fetch_asset_returns('small_cap')
 
 def fetch_multifactor():
-    # Ticker: JPUS (JPMorgan Diversified Return US Equity ETF)
-    # Oldest Multifactor ETF - Historical data since September 2015
-    ticker = "JPUS"
-    print(f"\n⏳ Scarico dati storici Multifactor (Proxy: {ticker})...")
-    try:
-        data = yf.download(ticker, period="max", progress=False)
-        if data.empty: return None
-        
-        price_col = 'Adj Close' if 'Adj Close' in data.columns else 'Close'
-        if isinstance(data.columns, pd.MultiIndex):
-            returns = data.xs(price_col, axis=1, level=0).pct_change()
-            if returns.shape[1] == 1: returns = returns.iloc[:, 0]
-        else:
-            returns = data[price_col].pct_change()
-            
-        returns = returns.dropna()
-        
-        mean_ann = returns.mean() * 252
-        std_ann = returns.std() * (252**0.5)
-        print(f"✅ Multifactor: {len(returns)} giorni ({returns.index[0].date()} - {returns.index[-1].date()})")
-        print(f"   Rendimento: {mean_ann:.2%}, Volatilità: {std_ann:.2%}")
-        
-        return returns
-    except Exception as e:
-        print(f"❌ Errore Multifactor: {e}")
-        return None
-
-def export_asset_data():
-    import json
-    import numpy as np
-    
+    return fetch_asset_returns('multifactor')
+
+
+def export_asset_data(sources: dict = None, max_workers: int = 4,
+                      output_path: str = 'static/asset_data.json',
+                      stats_path: str = DEFAULT_STATS_PATH):
     print("\n🔄 -- ELABORAZIONE FINALE E ESPORTAZIONE --")
-    
-    # 1. Fetch Returns (Daily or Monthly)
-    assets = {}
-    
-    print("1. Scarico Asset Core...")
-    assets['sp500'] = fetch_sp500_long_term()
-    assets['world_ex_usa'] = fetch_world_ex_usa()
-    assets['emerging_markets'] = fetch_emerging_markets()
-    
-    print("2. Scarico Smart Beta / Factors...")
-    assets['quality'] = fetch_quality_factor()
-    assets['value'] = fetch_value_factor()
-    assets['momentum'] = fetch_momentum_factor()
-    assets['small_cap'] = fetch_small_cap()
-    assets['multifactor'] = fetch_multifactor()
-    
-    print("3. Scarico Bonds & Alternatives...")
-    assets['euro_aggregate'] = fetch_euro_aggregate_returns()
-    assets['global_aggregate'] = fetch_global_aggregate_hedged_returns()
-    assets['gold'] = fetch_gold_long_term() 
-    
-    # Define display names and scalar for annualization
-    meta = {
-        'sp500': {'name': 'S&P 500 (USA)', 'freq': 'D'},
-        'world_ex_usa': {'name': 'World ex USA', 'freq': 'D'},
-        'emerging_markets': {'name': 'Emerging Markets', 'freq': 'D'},
-        'quality': {'name': 'Quality Factor', 'freq': 'D'},
-        'value': {'name': 'Value Factor (IWD)', 'freq': 'D'},
-        'momentum': {'name': 'Momentum Factor', 'freq': 'D'},
-        'small_cap': {'name': 'Small Cap (IWM)', 'freq': 'D'},
-        'multifactor': {'name': 'Multifactor', 'freq': 'D'},
-        'euro_aggregate': {'name': 'Euro Aggregate', 'freq': 'D'},
-        'global_aggregate': {'name': 'Global Agg Hedged', 'freq': 'D'},
-        'gold': {'name': 'Gold (Spot)', 'freq': 'M'}
-    }
-    
+
+    # 1. Fetch Returns (Daily or Monthly), tutti i download in parallelo
+    print(f"⏳ Scarico {len(ASSET_SPECS)} storici (max {max_workers} download paralleli)...")
+    start = time.perf_counter()
+    assets = fetch_all_returns(list(ASSET_SPECS), sources, max_workers)
+    print(f"⏱️ Download completati in {time.perf_counter() - start:.1f}s")
+
     # 2. Calculate Stats (on full available history for each)
-    stats = {}
-    monthly_series = {}
-    
+    # Tutte le serie in un unico DataFrame largo: composizione mensile,
+    # mu/sigma e correlazioni a coppie calcolati per tutte le colonne insieme
     for key, data in assets.items():
         if data is None or len(data) == 0:
             print(f"⚠️ Dati mancanti per {key}")
-            continue
-            
-        # Stats
-        if meta[key]['freq'] == 'D':
-            mu = data.mean() * 252
-            sigma = data.std() * (252**0.5)
-            # Resample to Monthly for Correlation
-            monthly = data.resample('M').apply(lambda x: (1 + x).prod() - 1)
-        else: # Monthly (Gold)
-            mu = data.mean() * 12
-            sigma = data.std() * (12**0.5)
-            monthly = data
-            
-        stats[key] = {
-            "name": meta[key]['name'],
-            "mu": mu,
-            "sigma": sigma
-        }
-        
-        # Align index to end of month for consistency
-        monthly.index = monthly.index.to_period('M').to_timestamp('M')
-        monthly.name = meta[key]['name']
-        monthly_series[key] = monthly
-
-    # 3. Create Master DataFrame for Correlation
-    # We use inner join or outer? 
-    # Pairwise correlation in pandas ignores NaNs, so Outer Join is best to maximize data for each pair.
-    df_all = pd.DataFrame(monthly_series)
-    
-    # 4. Correlation Matrix
-    correlation_matrix = df_all.corr()
-    
+
+    start = time.perf_counter()
+    stats, correlation_matrix, monthly = compute_asset_statistics(assets, ASSET_SPECS)
+    print(f"⏱️ Statistiche calcolate in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    # Statistiche per finestra (10/20/30 anni e storia completa) per ogni mese
+    if stats_path:
+        start = time.perf_counter()
+        window_stats = compute_window_statistics(monthly)
+        save_window_statistics(window_stats, {k: s['name'] for k, s in stats.items()}, stats_path)
+        print(f"⏱️ Statistiche per finestra ({len(window_stats['months'])} mesi) "
+              f"calcolate in {(time.perf_counter() - start) * 1000:.0f}ms -> '{stats_path}'")
+
+    # 3. Covarianza con shrinkage e riparazione PSD (le correlazioni a coppie su
+    # finestre diverse non formano in generale una matrice PSD)
+    covariance = covariance_model(stats, monthly)
+    shrunk_correlation = pd.DataFrame(covariance['correlation'],
+                                      index=covariance['keys'], columns=covariance['keys'])
+    print(f"📐 Shrinkage correlazioni: {covariance['shrinkage']:.3f} | "
+          f"autovalore minimo: {covariance['min_eigenvalue']:.2e} "
+          f"(a coppie: {np.linalg.eigvalsh(correlation_matrix.fillna(0).to_numpy()).min():.2e})")
+
     print("\n🔗 Matrice di Correlazione (Anteprima):")
-    print(correlation_matrix.iloc[:5, :5])
-    
+    print(shrunk_correlation.iloc[:5, :5])
+
+    # Forma dei modelli GARCH e a regimi per asset (parametri per model_params)
+    start = time.perf_counter()
+    return_models = fit_return_models(monthly)
+    print(f"⏱️ Modelli GARCH/regimi stimati per {len(return_models)} asset "
+          f"in {(time.perf_counter() - start) * 1000:.0f}ms")
+
     output_data = {
         "stats": stats,
-        # fillna(0) just in case, though corr() usually returns 1s on diag and values elsewhere
-        "correlations": correlation_matrix.fillna(0).to_dict()
+        # Correlazioni coerenti con la covarianza (stesse usate dal browser e dal server)
+        "correlations": shrunk_correlation.to_dict(),
+        # Matrice e fattore di Cholesky: shock correlati = Z @ Lᵀ
+        "covariance": {k: v for k, v in covariance.items() if k != 'correlation'},
+        # Stime dei modelli a volatilità variabile (vedi return_models.py)
+        "return_models": return_models
     }
-    
-    with open('static/asset_data.json', 'w') as f:
-        json.dump(output_data, f, indent=4)
-        
-    print("\n💾 Dati aggiornati ed esportati in 'static/asset_data.json'")
+
+    # Pubblicazione atomica: il server e il browser non vedono mai un file a metà
+    version = publish_asset_data(output_data, output_path)
+
+    print(f"\n💾 Dati aggiornati ed esportati in '{output_path}' (versione {version})")
 
 if __name__ == "__main__":
-    export_asset_data()
+    parser = argparse.ArgumentParser(description="Aggiorna static/asset_data.json dagli storici di mercato")
+    parser.add_argument('--fixtures', metavar='DIR', default=None,
+                        help="legge gli storici da una cartella locale (<ticker>.csv) invece che dalla rete")
+    parser.add_argument('--datahub-url', default=None,
+                        help="URL alternativo per il CSV mensile dell'oro (es. server locale)")
+    parser.add_argument('--workers', type=int, default=4, help="download paralleli")
+    parser.add_argument('--output', default='static/asset_data.json', help="file JSON di output")
+    parser.add_argument('--stats-output', default=DEFAULT_STATS_PATH,
+                        help="artefatto NPZ delle statistiche per finestra (lookback)")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help="cartella della cache locale degli storici")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="scarica sempre lo storico completo, senza cache")
+    parser.add_argument('--cache-only', action='store_true',
+                        help="ricalcola dalla sola cache locale, senza accesso alla rete")
+    args = parser.parse_args()
+
+    sources = default_sources(args.fixtures, args.datahub_url)
+    if not args.no_cache:
+        # Solo le barre successive all'ultima data in cache vengono scaricate
+        sources = cached_sources(sources, args.cache_dir, offline=args.cache_only)
+
+    export_asset_data(
+        sources=sources,
+        max_workers=args.workers,
+        output_path=args.output,
+        stats_path=args.stats_output
+    )
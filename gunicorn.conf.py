@@ -0,0 +1,50 @@
+"""
+gunicorn.conf.py
+Configurazione di gunicorn per web_app (usata dal Procfile).
+
+Con preload_app l'applicazione (Flask, numpy, dataset asset in memoria) viene
+importata una sola volta nel processo master prima del fork: i worker
+condividono quelle pagine copy-on-write e un worker riciclato riparte senza
+ripetere gli import. Il percorso di /simulate carica solo numpy e Flask;
+pandas e plotly restano fuori dal grafo degli import del web.
+
+Variabili d'ambiente:
+    PORT             porta di ascolto (default 8000)
+    WEB_CONCURRENCY  numero di worker (default: core disponibili)
+    MC_WARM_TABLES   se 1, costruisce nel master le tabelle dei quantili più
+                     richieste (vedi simulation_pool.WARM_*), condivise dai worker
+"""
+
+import os
+
+from simulation_pool import available_cores
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', available_cores()))
+preload_app = True
+
+
+def when_ready(server):
+    """
+    Master pronto, app già importata: eventuale warm-up prima del fork dei worker.
+    """
+    if os.environ.get('MC_WARM_TABLES') != '1':
+        return
+    from simulation_pool import WARM_N_SIMS, WARM_SEEDS, WARM_YEARS
+    from web_app import QUANTILE_TABLES
+
+    for seed in WARM_SEEDS:
+        for n_sims in WARM_N_SIMS:
+            for years in WARM_YEARS:
+                QUANTILE_TABLES.get(seed, n_sims, years * 12)
+    server.log.info("Tabelle dei quantili pronte: %d", len(WARM_SEEDS) * len(WARM_N_SIMS) * len(WARM_YEARS))
+
+
+def post_fork(server, worker):
+    """
+    Stato casuale globale di numpy ereditato dal master: senza un nuovo seed
+    tutti i worker estrarrebbero gli stessi numeri per le simulazioni senza seed.
+    """
+    import numpy as np
+    np.random.seed()
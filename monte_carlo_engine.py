@@ -1,11 +1,27 @@
 import numpy as np
 from typing import Dict, Any
 
+from path_sampling import DEFAULT_SAMPLE_PATHS, representative_indices, sample_path_indices
+from path_trackers import build_trackers
+from return_models import simulate_log_returns
+from sketches import PathSummary
+from tail_sampling import run_tail_sampling
+
+
+# Percentili calcolati nel tempo (bande del grafico) e sul valore finale (tabella)
+PERCENTILES_TIME = (3, 25, 50, 75)
+PERCENTILES_FINAL = (3, 5, 7, 10, 25, 50, 75)
+
+# Motore a sketch: traiettorie per shard (unità di fusione e di seed) e per
+# blocco simulato in memoria all'interno di uno shard
+SKETCH_SHARD_SIZE = 1_000_000
+SKETCH_BLOCK_SIZE = 100_000
+
 
 def run_monte_carlo_simulation(params: Dict[str, Any]) -> Dict[str, Any]:
     """
     Esegue simulazione Monte Carlo su portafoglio con GBM.
-    
+
     Args:
         params: dizionario con:
             - capital: capitale iniziale (€)
@@ -14,15 +30,51 @@ def run_monte_carlo_simulation(params: Dict[str, Any]) -> Dict[str, Any]:
             - years: orizzonte temporale (anni)
             - n_sims: numero simulazioni
             - seed: seed random (opzionale, default None)
-    
+            - streaming: se True usa il motore a memoria limitata (opzionale,
+              vedi run_streaming_simulation; stessa distribuzione, altri numeri casuali)
+            - sample_paths: traiettorie casuali da restituire per il grafico
+              (opzionale, default DEFAULT_SAMPLE_PATHS)
+            - targets: livelli obiettivo di capitale (€, opzionale): probabilità
+              di essere sopra l'obiettivo nel tempo e tempi di primo raggiungimento
+            - risk: se False salta le metriche di rischio di percorso (default True,
+              tranne con statistics='sketch')
+            - statistics: 'exact' (default) o 'sketch' per statistiche a memoria
+              limitata su n_sims arbitrari (vedi run_sketch_simulation; senza
+              metriche di percorso, risk=True o targets sono un errore)
+            - model: modello dei rendimenti, 'gbm' (default), 'garch' o 'regime'
+              (vedi return_models.py), con model_params (forma del modello,
+              opzionale) e jit (kernel numba se disponibile)
+            - tail_sampling: se True aggiunge 'tail', i percentili di coda
+              estrema (1°, 0,1°) stimati con importance sampling su una
+              simulazione separata (solo GBM, vedi tail_sampling.py)
+
     Returns:
         dizionario con:
-            - paths: array (n_sims x n_steps) con valori portafoglio
+            - paths: array (n_sims x n_steps) con valori portafoglio (solo motore standard)
             - time: array con timestamp (anni)
             - percentiles_time: dict con p3, p25, p50, p75 nel tempo
             - percentiles_final: dict con valori finali per percentile
             - stats: dict con statistiche (mean, std, cagr)
+            - sample_paths: traiettorie rappresentative (più vicine a ogni
+              percentile finale) e campione casuale, per il grafico
+            - goals: solo con targets, vedi path_trackers.GoalTracker
+            - risk: massimo drawdown, tempo sott'acqua, VaR/CVaR e probabilità
+              di perdita per anno, vedi path_trackers.RiskTracker
+            - tail: solo con tail_sampling, vedi tail_sampling.run_tail_sampling
     """
+    if params.get('tail_sampling'):
+        if params.get('model', 'gbm') != 'gbm':
+            raise ValueError("L'importance sampling delle code è disponibile solo con il modello GBM")
+        results = run_monte_carlo_simulation({**params, 'tail_sampling': False})
+        results['tail'] = run_tail_sampling(params)
+        return results
+    if params.get('model', 'gbm') != 'gbm':
+        return run_model_simulation(params)
+    if params.get('statistics', 'exact') == 'sketch':
+        return run_sketch_simulation(params)
+    if params.get('streaming'):
+        return run_streaming_simulation(params)
+
     # Estrai parametri
     S0 = params['capital']
     mu = params['mu']
@@ -30,94 +82,348 @@ def run_monte_carlo_simulation(params: Dict[str, Any]) -> Dict[str, Any]:
     T = params['years']
     n_sims = params['n_sims']
     seed = params.get('seed', None)
-    
+
     # Setup
     if seed is not None:
         np.random.seed(seed)
-    
+
     dt = 1/12  # step mensile
     n_steps = int(T / dt)
-    
+
     # Genera shock normali
     Z = np.random.randn(n_sims, n_steps)
-    
+
     # GBM formula
     drift = (mu - 0.5 * sigma**2) * dt
     diffusion = sigma * np.sqrt(dt)
     log_returns = drift + diffusion * Z
-    
+
     # Cumulative per prezzi
     cum_log_returns = np.cumsum(log_returns, axis=1)
     paths = S0 * np.exp(cum_log_returns)
-    
+
     # Aggiungi S0 come primo valore
     paths = np.column_stack([np.full(n_sims, S0), paths])
     time = np.linspace(0, T, n_steps + 1)
-    
+
+    return summarize_paths(paths, time, params, np.random.default_rng(seed))
+
+
+def run_model_simulation(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Motore per i modelli a volatilità variabile (GARCH, regimi): stessa media
+    e varianza di lungo periodo di mu/sigma, stesse chiavi dei risultati del
+    motore standard. I log-rendimenti sono generati da
+    return_models.simulate_log_returns con un generatore default_rng(seed).
+    """
+    if params.get('streaming') or params.get('statistics', 'exact') != 'exact':
+        raise ValueError("I modelli GARCH e a regimi sono disponibili solo con il motore standard")
+
+    S0 = params['capital']
+    T = params['years']
+    n_sims = params['n_sims']
+    rng = np.random.default_rng(params.get('seed'))
+
+    dt = 1/12
+    n_steps = int(T / dt)
+    log_returns = simulate_log_returns(params['model'], params, n_sims, n_steps, rng)
+
+    paths = S0 * np.exp(np.cumsum(log_returns, axis=1))
+    paths = np.column_stack([np.full(n_sims, S0), paths])
+    time = np.linspace(0, T, n_steps + 1)
+
+    return summarize_paths(paths, time, params, rng)
+
+
+def run_streaming_simulation(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Motore GBM a memoria limitata: avanza tutte le traiettorie un passo alla volta
+    conservando solo lo stato corrente (O(n_sims)), mai la matrice n_sims x n_steps.
+
+    Lo shock totale W_n = Σ Z_k di ogni traiettoria viene estratto per primo
+    (W_n ~ N(0, n)): il valore finale dipende solo da W_n, quindi statistiche
+    finali e traiettorie rappresentative sono note prima di simulare il percorso.
+    Il percorso viene poi generato con il ponte browniano condizionato a W_n:
+    con m passi rimanenti e residuo R = W_n - W_k,
+        Z_{k+1} = R / m + sqrt((m - 1) / m) · ε,  ε ~ N(0, 1)
+    che ha la stessa distribuzione congiunta degli shock indipendenti.
+
+    Stessi parametri e stesse chiavi di run_monte_carlo_simulation, senza
+    'paths' e con 'terminal_w' (W_n di ogni traiettoria).
+    """
+    S0 = params['capital']
+    mu = params['mu']
+    sigma = params['sigma']
+    T = params['years']
+    n_sims = params['n_sims']
+    rng = np.random.default_rng(params.get('seed'))
+
+    dt = 1/12
+    n_steps = int(T / dt)
+    drift = (mu - 0.5 * sigma**2) * dt
+    diffusion = sigma * np.sqrt(dt)
+    time = np.linspace(0, T, n_steps + 1)
+
+    # 1) Valori finali dallo shock totale
+    terminal_w = rng.standard_normal(n_sims) * np.sqrt(n_steps)
+    final_values = S0 * np.exp(drift * n_steps + diffusion * terminal_w)
+    results = _terminal_statistics(final_values, S0, T, n_sims)
+
+    # 2) Traiettorie da registrare, scelte prima di simulare il percorso
+    representative = representative_indices(final_values, results['percentiles_final'])
+    sampled = sample_path_indices(n_sims, params.get('sample_paths', DEFAULT_SAMPLE_PATHS), rng)
+    tracked = np.concatenate([np.fromiter(representative.values(), dtype=np.int64, count=len(representative)),
+                              sampled])
+    tracked_values = np.empty((len(tracked), n_steps + 1))
+    tracked_values[:, 0] = S0
+
+    percentiles_time = np.empty((len(PERCENTILES_TIME), n_steps + 1))
+    percentiles_time[:, 0] = S0
+
+    trackers = build_trackers(params, n_sims, n_steps)
+    for tracker in trackers:
+        tracker.update(0, np.full(n_sims, float(S0)))
+
+    # 3) Ponte browniano: un passo alla volta su tutte le traiettorie
+    w = np.zeros(n_sims)
+    eps = np.empty(n_sims)
+    values = np.empty(n_sims)
+    for k in range(n_steps):
+        m = n_steps - k
+        if m > 1:
+            rng.standard_normal(out=eps)
+            w += (terminal_w - w) / m + np.sqrt((m - 1) / m) * eps
+        else:
+            w[:] = terminal_w
+        np.exp(drift * (k + 1) + diffusion * w, out=values)
+        values *= S0
+        percentiles_time[:, k + 1] = np.percentile(values, PERCENTILES_TIME)
+        tracked_values[:, k + 1] = values[tracked]
+        for tracker in trackers:
+            tracker.update(k + 1, values)
+
+    for tracker in trackers:
+        results.update(tracker.result(time))
+
+    n_representative = len(representative)
+    return {
+        'time': time,
+        'percentiles_time': {f'p{q}': percentiles_time[i] for i, q in enumerate(PERCENTILES_TIME)},
+        **results,
+        'terminal_w': terminal_w,
+        'sample_paths': {
+            'representative': {label: tracked_values[i] for i, label in enumerate(representative)},
+            'random': tracked_values[n_representative:]
+        }
+    }
+
+
+def simulate_shard(params: Dict[str, Any], shard: int, size: int) -> PathSummary:
+    """
+    Simula uno shard di size traiettorie GBM e ne restituisce il riassunto
+    fondibile (sketches.PathSummary).
+
+    I numeri casuali dipendono solo da (seed, shard): lo stesso shard
+    rieseguito in un altro processo o su un altro nodo dà lo stesso riassunto.
+    Memoria: un blocco di SKETCH_BLOCK_SIZE valori più gli sketch.
+    """
+    S0 = params['capital']
+    mu = params['mu']
+    sigma = params['sigma']
+    T = params['years']
+    if params.get('seed') is None:
+        raise ValueError("Il motore a sketch richiede un seed per shard")
+    targets = params.get('targets')
+    if params.get('risk') or (targets is not None and len(np.atleast_1d(targets))):
+        raise ValueError("Obiettivi e metriche di rischio non sono disponibili con le statistiche "
+                         "a sketch: passare risk=False e nessun target")
+
+    dt = 1/12
+    n_steps = int(T / dt)
+    drift = (mu - 0.5 * sigma**2) * dt
+    diffusion = sigma * np.sqrt(dt)
+    rng = np.random.default_rng([int(params['seed']), shard])
+
+    summary = PathSummary(n_steps, S0, T, sample_paths=params.get('sample_paths', DEFAULT_SAMPLE_PATHS))
+    for start in range(0, size, SKETCH_BLOCK_SIZE):
+        block = min(SKETCH_BLOCK_SIZE, size - start)
+
+        # Candidate al campione casuale: bottom-k delle chiavi del blocco
+        keys = rng.random(block)
+        candidates = np.argsort(keys, kind='stable')[:summary.sample_paths]
+        tracked = np.empty((len(candidates), n_steps + 1))
+        tracked[:, 0] = S0
+
+        log_growth = np.zeros(block)
+        values = np.full(block, float(S0))
+        summary.update_step(0, values)
+        for k in range(n_steps):
+            log_growth += drift + diffusion * rng.standard_normal(block)
+            np.exp(log_growth, out=values)
+            values *= S0
+            summary.update_step(k + 1, values)
+            tracked[:, k + 1] = values[candidates]
+
+        summary.update_final(values)
+        summary.offer_samples(keys[candidates], tracked)
+    return summary
+
+
+def _simulate_shard_task(task: tuple) -> PathSummary:
+    return simulate_shard(*task)
+
+
+def run_sketch_simulation(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Motore GBM con statistiche a sketch: memoria limitata per qualunque n_sims
+    (es. 10^8 traiettorie), anche oltre la RAM disponibile.
+
+    Le traiettorie sono divise in shard da SKETCH_SHARD_SIZE con seed
+    (seed, indice shard) e simulate a blocchi un passo alla volta; ogni shard
+    produce un riassunto fondibile (sketch KLL dei valori a ogni passo e dei
+    valori finali, momenti, istogramma del CAGR, campione bottom-k) e i
+    riassunti vengono fusi nell'ordine degli shard. Il risultato è identico a
+    quello di distributed.DistributedCoordinator con gli stessi parametri.
+
+    Errore: 'sketch' → 'rank_error' riporta il limite garantito dell'errore
+    sul rango normalizzato, per i percentili finali ('terminal') e per le
+    bande nel tempo ('time', il massimo sui passi). Un valore ε significa che
+    il percentile p riportato ha rango vero compreso fra p - ε e p + ε; con
+    le dimensioni di default è tipicamente sotto lo 0,1% per i valori finali
+    e sotto lo 0,5% nel tempo (l'errore effettivo è molto più piccolo del
+    limite). Finché i valori di un passo non superano la dimensione k dello
+    sketch (vedi sketches.py) i percentili sono esatti.
+
+    Memoria: O(n_steps · k) per gli sketch più un blocco di traiettorie per
+    processo, indipendente da n_sims.
+
+    Args:
+        params: parametri di run_monte_carlo_simulation più:
+            - processes: processi locali su cui distribuire gli shard (default 1)
+        (risk=True esplicito o targets sollevano ValueError: le metriche di
+        percorso richiedono stato per traiettoria; senza 'risk' non vengono
+        calcolate)
+
+    Returns:
+        chiavi di run_monte_carlo_simulation senza 'paths', traiettorie
+        rappresentative e metriche di percorso, più 'sketch' con i limiti di
+        errore e il seed usato
+    """
+    params = dict(params)
+    if params.get('seed') is None:
+        params['seed'] = int(np.random.SeedSequence().entropy % 2**63)
+    n_sims = int(params['n_sims'])
+    tasks = [(params, i, min(SKETCH_SHARD_SIZE, n_sims - start))
+             for i, start in enumerate(range(0, n_sims, SKETCH_SHARD_SIZE))]
+    processes = min(int(params.get('processes', 1)), len(tasks))
+
+    if processes > 1:
+        from multiprocessing import get_context
+        with get_context('fork').Pool(processes) as pool:
+            # imap: riassunti fusi in ordine di shard man mano che arrivano
+            summaries = pool.imap(_simulate_shard_task, tasks)
+            merged = next(summaries)
+            for summary in summaries:
+                merged.merge(summary)
+    else:
+        merged = simulate_shard(*tasks[0])
+        for task in tasks[1:]:
+            merged.merge(simulate_shard(*task))
+
+    results = merged.results(PERCENTILES_TIME, PERCENTILES_FINAL)
+    results['sketch']['seed'] = params['seed']
+    return results
+
+
+def summarize_paths(paths: np.ndarray, time: np.ndarray, params: Dict[str, Any],
+                    rng: np.random.Generator) -> Dict[str, Any]:
+    """
+    Risultati standard a partire dalla matrice completa delle traiettorie
+    (n_sims x n_steps + 1): percentili, statistiche finali, tracker di
+    percorso e traiettorie per il grafico. Usata dai motori che costruiscono
+    la matrice paths (standard e ribilanciamento).
+
+    Args:
+        paths: valori del portafoglio, prima colonna = capitale iniziale
+        time: timestamp (anni)
+        params: parametri della simulazione (capital, years, n_sims, ...)
+        rng: generatore per il campione di traiettorie (separato dagli shock)
+    """
+    S0 = params['capital']
+    n_sims, n_steps = paths.shape[0], paths.shape[1] - 1
+
     # Calcola percentili nel tempo
-    p3_time = np.percentile(paths, 3, axis=0)
-    p25_time = np.percentile(paths, 25, axis=0)
-    p50_time = np.percentile(paths, 50, axis=0)
-    p75_time = np.percentile(paths, 75, axis=0)
-    
-    # Percentili finali
+    percentiles_time = {f'p{q}': np.percentile(paths, q, axis=0) for q in PERCENTILES_TIME}
+
+    # Percentili finali, statistiche e distribuzione CAGR
     final_values = paths[:, -1]
-    p3_final = np.percentile(final_values, 3)
-    p5_final = np.percentile(final_values, 5)
-    p7_final = np.percentile(final_values, 7)
-    p10_final = np.percentile(final_values, 10)
-    p25_final = np.percentile(final_values, 25)
-    p50_final = np.percentile(final_values, 50)
-    p75_final = np.percentile(final_values, 75)
-    
+    results = _terminal_statistics(final_values, S0, params['years'], n_sims)
+
+    # Metriche di percorso (obiettivi, rischio, ...)
+    results.update(path_metrics(paths, time, params))
+
+    # Traiettorie per il grafico
+    representative = representative_indices(final_values, results['percentiles_final'])
+    sampled = sample_path_indices(n_sims, params.get('sample_paths', DEFAULT_SAMPLE_PATHS), rng)
+
+    return {
+        'paths': paths,
+        'time': time,
+        'percentiles_time': percentiles_time,
+        **results,
+        'sample_paths': {
+            'representative': {label: paths[i].copy() for label, i in representative.items()},
+            'random': paths[sampled]
+        }
+    }
+
+
+def path_metrics(paths: np.ndarray, time: np.ndarray, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Metriche di percorso richieste da params (obiettivi, rischio, vedi
+    path_trackers.build_trackers) con un passaggio sulle colonne di paths.
+    """
+    n_sims, n_steps = paths.shape[0], paths.shape[1] - 1
+    trackers = build_trackers(params, n_sims, n_steps)
+    results = {}
+    if trackers:
+        for step in range(n_steps + 1):
+            column = paths[:, step]
+            for tracker in trackers:
+                tracker.update(step, column)
+        for tracker in trackers:
+            results.update(tracker.result(time))
+    return results
+
+
+def _terminal_statistics(final_values: np.ndarray, S0: float, T: float, n_sims: int) -> Dict[str, Any]:
+    """
+    Percentili finali, statistiche e distribuzione del CAGR (comuni ai due motori).
+    """
+    percentiles_final = {f'p{q}': np.percentile(final_values, q) for q in PERCENTILES_FINAL}
+
     # Statistiche
     mean_final = np.mean(final_values)
     std_final = np.std(final_values, ddof=1)
-    
+
     # CAGR per ogni simulazione
     cagr = (final_values / S0) ** (1/T) - 1
-    cagr_p3 = np.percentile(cagr, 3)
-    cagr_p25 = np.percentile(cagr, 25)
-    cagr_p50 = np.percentile(cagr, 50)
-    cagr_p75 = np.percentile(cagr, 75)
-    
+
     # Calcola distribuzione su CAGR con granularità fissa 0.2% (0.002)
     # Usiamo 'weights' per ottenere la % diretta invece della densità astratta
     cagr_min = np.floor(cagr.min() / 0.002) * 0.002
     cagr_max = np.ceil(cagr.max() / 0.002) * 0.002
     bins = np.arange(cagr_min, cagr_max + 0.002, 0.002)
-    
+
     hist_counts, hist_bins = np.histogram(cagr, bins=bins, weights=np.ones(len(cagr)) / len(cagr))
     hist_x = (hist_bins[:-1] + hist_bins[1:]) / 2
-    
+
     return {
-        'paths': paths,
-        'time': time,
-        'percentiles_time': {
-            'p3': p3_time,
-            'p25': p25_time,
-            'p50': p50_time,
-            'p75': p75_time
-        },
-        'percentiles_final': {
-            'p3': p3_final,
-            'p5': p5_final,
-            'p7': p7_final,
-            'p10': p10_final,
-            'p25': p25_final,
-            'p50': p50_final,
-            'p75': p75_final
-        },
+        'percentiles_final': percentiles_final,
         'stats': {
             'mean': mean_final,
             'std': std_final,
-            'cagr_p3': cagr_p3,
-            'cagr_p5': np.percentile(cagr, 5),
-            'cagr_p7': np.percentile(cagr, 7),
-            'cagr_p10': np.percentile(cagr, 10),
-            'cagr_p25': cagr_p25,
-            'cagr_p50': cagr_p50,
-            'cagr_p75': cagr_p75
+            **{f'cagr_p{q}': np.percentile(cagr, q) for q in PERCENTILES_FINAL}
         },
         'n_sims': n_sims,
         'distribution': {
@@ -137,7 +443,7 @@ if __name__ == "__main__":
         'n_sims': 10_000,
         'seed': 42
     }
-    
+
     results = run_monte_carlo_simulation(test_params)
     print(f"Mediana finale: €{results['percentiles_final']['p50']:,.0f}")
     print(f"CAGR mediano: {results['stats']['cagr_p50']*100:.2f}%")
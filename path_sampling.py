@@ -0,0 +1,75 @@
+"""
+path_sampling.py
+Selezione delle traiettorie da mostrare nel grafico ("spaghetti") senza
+conservare la matrice completa n_sims x n_steps.
+
+- Traiettorie rappresentative: quelle con valore finale più vicino a ciascun
+  percentile riportato (note in anticipo nel motore streaming, che estrae
+  prima lo shock totale W_T di ogni traiettoria).
+- Campione casuale: bottom-k su chiavi casuali (le k traiettorie con chiave
+  più piccola), equivalente a un campionamento uniforme senza reinserimento;
+  due campioni si fondono tenendo le k chiavi minime dell'unione, quindi
+  funziona anche a blocchi o su processi diversi.
+"""
+
+import numpy as np
+
+
+# Traiettorie casuali mostrate di default nel grafico
+DEFAULT_SAMPLE_PATHS = 10
+
+
+def representative_indices(final_values: np.ndarray, percentiles: dict) -> dict:
+    """
+    Indice della traiettoria con valore finale più vicino a ciascun percentile.
+
+    Args:
+        final_values: valori finali (n_sims)
+        percentiles: {etichetta: valore del percentile}, es. percentiles_final
+
+    Returns:
+        {etichetta: indice traiettoria}
+    """
+    return {label: int(np.argmin(np.abs(final_values - value)))
+            for label, value in percentiles.items()}
+
+
+class BottomKSample:
+    """
+    Campione uniforme di k indici tramite chiavi casuali (le k chiavi minime).
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self.indices = np.empty(0, dtype=np.int64)
+        self.keys = np.empty(0)
+
+    def offer(self, indices: np.ndarray, keys: np.ndarray):
+        """
+        Considera un blocco di traiettorie (indici globali e relative chiavi casuali).
+        """
+        if self.k <= 0:
+            return self
+        indices = np.concatenate([self.indices, np.asarray(indices, dtype=np.int64)])
+        keys = np.concatenate([self.keys, np.asarray(keys, dtype=float)])
+        if len(keys) > self.k:
+            keep = np.argpartition(keys, self.k - 1)[:self.k]
+            indices, keys = indices[keep], keys[keep]
+        self.indices, self.keys = indices, keys
+        return self
+
+    def merge(self, other: 'BottomKSample') -> 'BottomKSample':
+        return self.offer(other.indices, other.keys)
+
+    def sorted_indices(self) -> np.ndarray:
+        """
+        Indici del campione in ordine di chiave (ordine stabile per il grafico).
+        """
+        return self.indices[np.argsort(self.keys, kind='stable')]
+
+
+def sample_path_indices(n_sims: int, k: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    k indici casuali di traiettorie (bottom-k su chiavi uniformi).
+    """
+    return BottomKSample(min(k, n_sims)).offer(np.arange(n_sims), rng.random(n_sims)).sorted_indices()
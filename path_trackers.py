@@ -0,0 +1,185 @@
+"""
+path_trackers.py
+Metriche di percorso calcolate in un solo passaggio sugli stati simulati.
+
+Ogni tracker riceve i valori di tutte le traiettorie un passo alla volta con
+update(step, values) e conserva solo stato O(n_sims): lo usano sia il motore
+standard (colonna per colonna della matrice paths) sia il motore streaming,
+che la matrice non la costruisce mai. result(time) restituisce le
+distribuzioni compatte da aggiungere ai risultati.
+"""
+
+import numpy as np
+
+
+# Percentili del massimo drawdown e del tempo sott'acqua: i complementi dei
+# percentili della tabella (lo scenario al 3° percentile ↔ drawdown al 97°)
+RISK_PERCENTILES = (25, 50, 75, 90, 93, 95, 97)
+
+
+def _step_quantiles(steps: np.ndarray, sentinel: int, quantiles=(25, 50, 75)) -> dict:
+    """
+    Quantili (inverse CDF) di un tempo in passi; None se il quantile cade
+    tra le traiettorie che non hanno mai raggiunto l'evento (sentinel).
+    """
+    ordered = np.sort(steps)
+    n = len(ordered)
+    result = {}
+    for q in quantiles:
+        value = ordered[max(int(np.ceil(q / 100 * n)) - 1, 0)]
+        result[f'p{q}'] = None if value >= sentinel else int(value)
+    return result
+
+
+class GoalTracker:
+    """
+    Probabilità di raggiungere uno o più obiettivi di capitale.
+
+    Per ogni obiettivo X:
+        - P(V_t ≥ X) a ogni passo t
+        - distribuzione del tempo di primo raggiungimento (primo passo con
+          V_t ≥ X, monitoraggio mensile), per anno e cumulata
+    """
+
+    def __init__(self, targets, n_sims: int, n_steps: int):
+        self.targets = np.asarray(targets, dtype=float).reshape(-1)
+        self.n_steps = n_steps
+        self.above = np.zeros((len(self.targets), n_steps + 1))
+        # Primo passo di raggiungimento per traiettoria (-1 = non ancora)
+        self.first_hit = np.full((len(self.targets), n_sims), -1, dtype=np.int32)
+
+    def update(self, step: int, values: np.ndarray):
+        hit = values[None, :] >= self.targets[:, None]
+        self.above[:, step] = hit.mean(axis=1)
+        new = hit & (self.first_hit < 0)
+        self.first_hit[new] = step
+
+    def result(self, time: np.ndarray) -> dict:
+        steps_per_year = int(round(1 / (time[1] - time[0]))) if len(time) > 1 else 12
+        n_years = int(np.ceil(self.n_steps / steps_per_year))
+        sentinel = self.n_steps + 1
+
+        goals = []
+        for i, target in enumerate(self.targets):
+            first_hit = self.first_hit[i]
+            reached = first_hit >= 0
+            n_sims = len(first_hit)
+
+            # CDF del primo raggiungimento per passo: P(raggiunto entro t)
+            counts = np.bincount(first_hit[reached], minlength=self.n_steps + 1)
+            reached_by = np.cumsum(counts) / n_sims
+
+            # Per anno: anno 0 = già sopra l'obiettivo alla partenza
+            years_idx = np.ceil(first_hit[reached] / steps_per_year).astype(np.int64)
+            per_year = np.bincount(years_idx, minlength=n_years + 1) / n_sims
+
+            steps = np.where(reached, first_hit, sentinel)
+            quantiles = {k: (None if v is None else v / steps_per_year)
+                         for k, v in _step_quantiles(steps, sentinel).items()}
+
+            goals.append({
+                'target': float(target),
+                'probability': self.above[i],
+                'reached_by': reached_by,
+                'first_passage': {
+                    'years': list(range(n_years + 1)),
+                    'probability': per_year.tolist(),
+                    'never': float(1 - reached.mean()),
+                    'quantiles_years': quantiles
+                }
+            })
+        return {'goals': goals}
+
+
+class RiskTracker:
+    """
+    Rischio di percorso per traiettoria e per orizzonte.
+
+    Per ogni traiettoria:
+        - massimo drawdown: max_t (1 - V_t / max_{s≤t} V_s), sul massimo corrente
+        - tempo sott'acqua: durata del periodo più lungo sotto il massimo precedente
+    A ogni fine anno, sul rendimento cumulato dall'inizio r = V_t / V_0 - 1:
+        - VaR al livello di confidenza (perdita al quantile 1 - confidence)
+        - CVaR / expected shortfall (perdita media oltre il VaR)
+        - probabilità di perdita P(r < 0)
+    """
+
+    def __init__(self, n_sims: int, n_steps: int, confidence: float = 0.95, steps_per_year: int = 12):
+        self.confidence = confidence
+        self.steps_per_year = steps_per_year
+        self.base = None
+        self.running_max = np.empty(n_sims)
+        self.max_drawdown = np.zeros(n_sims)
+        self.underwater = np.zeros(n_sims, dtype=np.int32)        # passi dell'attuale periodo sotto il massimo
+        self.longest_underwater = np.zeros(n_sims, dtype=np.int32)
+        self.drawdown = np.empty(n_sims)
+        self.yearly = []
+
+    def update(self, step: int, values: np.ndarray):
+        if step == 0:
+            self.base = values.copy()
+            self.running_max[:] = values
+            return
+
+        np.maximum(self.running_max, values, out=self.running_max)
+        np.divide(values, self.running_max, out=self.drawdown)
+        np.subtract(1.0, self.drawdown, out=self.drawdown)
+        np.maximum(self.max_drawdown, self.drawdown, out=self.max_drawdown)
+
+        below = self.drawdown > 0
+        self.underwater += 1
+        self.underwater[~below] = 0
+        np.maximum(self.longest_underwater, self.underwater, out=self.longest_underwater)
+
+        if step % self.steps_per_year == 0:
+            returns = values / self.base - 1
+            cutoff = np.percentile(returns, 100 * (1 - self.confidence))
+            self.yearly.append((step // self.steps_per_year,
+                                -cutoff,
+                                -returns[returns <= cutoff].mean(),
+                                (returns < 0).mean()))
+
+    def result(self, time: np.ndarray) -> dict:
+        steps_per_year = int(round(1 / (time[1] - time[0]))) if len(time) > 1 else self.steps_per_year
+
+        # Distribuzione del massimo drawdown con granularità 1%
+        bins = np.arange(0, np.ceil(self.max_drawdown.max() / 0.01) * 0.01 + 0.01, 0.01)
+        counts, edges = np.histogram(self.max_drawdown, bins=bins)
+        underwater_years = self.longest_underwater / steps_per_year
+
+        years, var, cvar, prob_loss = (list(column) for column in zip(*self.yearly)) if self.yearly else ([],) * 4
+        return {'risk': {
+            'confidence': self.confidence,
+            'max_drawdown': {
+                'mean': float(self.max_drawdown.mean()),
+                **{f'p{q}': float(v) for q, v in zip(RISK_PERCENTILES, np.percentile(self.max_drawdown, RISK_PERCENTILES))}
+            },
+            'max_drawdown_distribution': {
+                'x': ((edges[:-1] + edges[1:]) / 2).tolist(),
+                'y': (counts / len(self.max_drawdown)).tolist()
+            },
+            'time_under_water': {
+                'mean': float(underwater_years.mean()),
+                **{f'p{q}': float(v) for q, v in zip(RISK_PERCENTILES, np.percentile(underwater_years, RISK_PERCENTILES))}
+            },
+            'yearly': {
+                'years': [int(y) for y in years],
+                'var': [float(v) for v in var],
+                'cvar': [float(v) for v in cvar],
+                'prob_loss': [float(v) for v in prob_loss]
+            }
+        }}
+
+
+def build_trackers(params: dict, n_sims: int, n_steps: int) -> list:
+    """
+    Tracker richiesti dai parametri della simulazione (metriche di rischio
+    sempre, salvo params['risk'] = False).
+    """
+    trackers = []
+    if params.get('risk', True):
+        trackers.append(RiskTracker(n_sims, n_steps))
+    targets = params.get('targets')
+    if targets is not None and len(np.atleast_1d(targets)):
+        trackers.append(GoalTracker(targets, n_sims, n_steps))
+    return trackers
@@ -0,0 +1,321 @@
+"""
+portfolio_model.py
+Modello rischio/rendimento degli asset (covarianza) e ricerca vettorializzata
+della frontiera efficiente.
+"""
+
+import json
+import numpy as np
+from typing import Dict, Any, Optional
+
+from asset_statistics import nearest_psd_correlation
+
+
+# Categoria di ogni asset (stessa suddivisione degli slider in index.html)
+ASSET_CATEGORIES = {
+    'sp500': 'core',
+    'world_ex_usa': 'core',
+    'emerging_markets': 'core',
+    'quality': 'factors',
+    'value': 'factors',
+    'momentum': 'factors',
+    'small_cap': 'factors',
+    'multifactor': 'factors',
+    'euro_aggregate': 'bonds',
+    'global_aggregate': 'bonds',
+    'gold': 'bonds'
+}
+
+
+class PortfolioModel:
+    """
+    Vettori mu/sigma e matrice di covarianza degli asset, indicizzati per chiave.
+
+    Costruito una sola volta a partire da asset_data.json: ogni calcolo
+    successivo è un prodotto matriciale, senza lookup per nome.
+    """
+
+    def __init__(self, keys: list, names: list, mu: np.ndarray, sigma: np.ndarray,
+                 correlation: np.ndarray, version: Optional[str] = None,
+                 covariance: Optional[np.ndarray] = None, cholesky: Optional[np.ndarray] = None):
+        self.version = version
+        self.keys = list(keys)
+        self.names = list(names)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.mu = np.asarray(mu, dtype=float)
+        self.sigma = np.asarray(sigma, dtype=float)
+        self.correlation = np.asarray(correlation, dtype=float)
+
+        if covariance is None:
+            # Dataset senza covarianza precalcolata: riparazione PSD una sola volta qui
+            self.correlation = nearest_psd_correlation(self.correlation)
+            covariance = self.sigma[:, None] * self.correlation * self.sigma[None, :]
+        self.covariance = np.asarray(covariance, dtype=float)
+        self.cholesky = (np.asarray(cholesky, dtype=float) if cholesky is not None
+                         else np.linalg.cholesky(self.covariance))
+
+        # Matrice di appartenenza asset x categoria (one-hot)
+        self.categories = sorted(set(ASSET_CATEGORIES.get(k, 'other') for k in self.keys))
+        self.category_matrix = np.zeros((len(self.keys), len(self.categories)))
+        for i, key in enumerate(self.keys):
+            j = self.categories.index(ASSET_CATEGORIES.get(key, 'other'))
+            self.category_matrix[i, j] = 1.0
+
+    @classmethod
+    def from_asset_data(cls, data: Dict[str, Any]) -> 'PortfolioModel':
+        """
+        Crea il modello dal contenuto di asset_data.json.
+
+        Le correlazioni possono essere indicizzate per chiave asset (export attuale)
+        o per nome visualizzato (export precedenti): vengono risolte entrambe.
+        Le coppie mancanti valgono 0, la diagonale vale sempre 1.
+        """
+        stats = data['stats']
+        correlations = data.get('correlations', {})
+
+        keys = list(stats.keys())
+        names = [stats[k].get('name', k) for k in keys]
+        mu = [stats[k]['mu'] for k in keys]
+        sigma = [stats[k]['sigma'] for k in keys]
+
+        def lookup(key, name):
+            if key in correlations:
+                return correlations[key]
+            return correlations.get(name, {})
+
+        n = len(keys)
+        correlation = np.eye(n)
+        for i in range(n):
+            column = lookup(keys[i], names[i])
+            for j in range(n):
+                if i == j:
+                    continue
+                rho = column.get(keys[j], column.get(names[j], 0.0))
+                correlation[i, j] = rho if rho is not None else 0.0
+
+        # Covarianza con shrinkage e fattore di Cholesky pubblicati da fetch_returns.py
+        covariance = cholesky = None
+        stored = data.get('covariance')
+        if stored and stored.get('keys') == keys:
+            covariance = stored['matrix']
+            cholesky = stored.get('cholesky')
+
+        return cls(keys, names, mu, sigma, correlation, version=data.get('version'),
+                   covariance=covariance, cholesky=cholesky)
+
+    def weights_vector(self, weights: Dict[str, float]) -> np.ndarray:
+        """
+        Converte un dizionario {chiave asset: peso %} nel vettore dei pesi (decimali).
+        """
+        w = np.zeros(len(self.keys))
+        for key, value in (weights or {}).items():
+            if key not in self.index:
+                raise ValueError(f"Asset sconosciuto: {key}")
+            w[self.index[key]] = float(value) / 100
+        return w
+
+    def weights_dict(self, w: np.ndarray) -> Dict[str, float]:
+        """
+        Converte un vettore di pesi (decimali) in {chiave asset: peso %}.
+        """
+        return {key: round(float(w[i]) * 100, 2) for i, key in enumerate(self.keys)}
+
+    def correlated_shocks(self, Z: np.ndarray) -> np.ndarray:
+        """
+        Trasforma shock normali standard indipendenti (..., n_assets) in shock
+        con covarianza self.covariance: un solo prodotto matriciale Z @ Lᵀ.
+        """
+        return np.asarray(Z, dtype=float) @ self.cholesky.T
+
+    def portfolio_stats(self, W: np.ndarray):
+        """
+        Rendimento atteso e volatilità di uno o più portafogli.
+
+        Args:
+            W: vettore pesi (n_assets) oppure matrice (n_portafogli x n_assets)
+
+        Returns:
+            tupla (mu, sigma) con la stessa dimensionalità in ingresso
+        """
+        W = np.asarray(W, dtype=float)
+        mu = W @ self.mu
+        variance = np.einsum('...i,ij,...j->...', W, self.covariance, W)
+        return mu, np.sqrt(np.maximum(variance, 0.0))
+
+
+def load_portfolio_model(path: str) -> PortfolioModel:
+    """
+    Legge asset_data.json e costruisce il modello di portafoglio.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return PortfolioModel.from_asset_data(json.load(f))
+
+
+def _category_bounds(model: PortfolioModel, constraints: Optional[Dict[str, Any]]):
+    """
+    Converte i vincoli {categoria: [min%, max%]} in due vettori (decimali).
+    """
+    n_cat = len(model.categories)
+    lower = np.zeros(n_cat)
+    upper = np.ones(n_cat)
+    for category, bounds in (constraints or {}).items():
+        if category not in model.categories:
+            raise ValueError(f"Categoria sconosciuta: {category}")
+        if isinstance(bounds, dict):
+            lo, hi = bounds.get('min', 0), bounds.get('max', 100)
+        else:
+            lo, hi = bounds
+        j = model.categories.index(category)
+        lower[j] = float(lo) / 100
+        upper[j] = float(hi) / 100
+    if lower.sum() > 1 + 1e-9 or upper.sum() < 1 - 1e-9 or np.any(lower > upper):
+        raise ValueError("Vincoli di categoria incompatibili (impossibile sommare al 100%)")
+    return lower, upper
+
+
+def sample_candidate_weights(model: PortfolioModel, n_candidates: int,
+                             constraints: Optional[Dict[str, Any]] = None,
+                             seed: Optional[int] = None) -> np.ndarray:
+    """
+    Genera portafogli casuali long-only che rispettano i vincoli di categoria.
+
+    Il campionamento avviene in due livelli: prima i pesi delle categorie
+    (Dirichlet, rigettando le righe fuori dai vincoli), poi i pesi degli asset
+    all'interno di ogni categoria. Si alternano concentrazioni basse e alte così
+    da coprire sia portafogli concentrati (bordo della frontiera) sia diversificati.
+
+    Returns:
+        matrice (n_candidates x n_assets) con righe che sommano a 1
+    """
+    rng = np.random.default_rng(seed)
+    lower, upper = _category_bounds(model, constraints)
+    n_cat = len(model.categories)
+    n_assets = len(model.keys)
+
+    # 1) Pesi per categoria, con rigetto vettorializzato (pochi giri bastano)
+    totals = np.empty((0, n_cat))
+    for _ in range(50):
+        needed = n_candidates - len(totals)
+        if needed <= 0:
+            break
+        batch = max(needed * 2, 1000)
+        alpha = rng.choice([0.3, 1.0, 3.0], size=(batch, 1))
+        g = rng.gamma(np.broadcast_to(alpha, (batch, n_cat)))
+        t = g / g.sum(axis=1, keepdims=True)
+        ok = np.all((t >= lower - 1e-12) & (t <= upper + 1e-12), axis=1)
+        totals = np.vstack([totals, t[ok]])
+    if len(totals) == 0:
+        raise ValueError("Nessun portafoglio valido trovato con i vincoli indicati")
+    totals = totals[:n_candidates]
+    n = len(totals)
+
+    # 2) Pesi degli asset all'interno di ogni categoria
+    alpha = rng.choice([0.2, 1.0], size=(n, 1))
+    g = rng.gamma(np.broadcast_to(alpha, (n, n_assets))) + 1e-12
+    category_of_asset = model.category_matrix.argmax(axis=1)
+    within = g / (g @ model.category_matrix)[:, category_of_asset]
+
+    return within * totals[:, category_of_asset]
+
+
+def efficient_frontier(model: PortfolioModel, current_weights: Optional[Dict[str, float]] = None,
+                       constraints: Optional[Dict[str, Any]] = None, n_candidates: int = 20_000,
+                       n_points: int = 40, seed: Optional[int] = 0) -> Dict[str, Any]:
+    """
+    Valuta in blocco migliaia di portafogli candidati e ne estrae la frontiera efficiente.
+
+    Args:
+        model: PortfolioModel
+        current_weights: allocazione corrente {chiave asset: peso %} (opzionale)
+        constraints: vincoli per categoria {categoria: [min%, max%]} (opzionale)
+        n_candidates: numero di portafogli casuali da valutare
+        n_points: numero massimo di punti della frontiera restituiti
+        seed: seed random per risultati riproducibili
+
+    Returns:
+        dizionario con:
+            - frontier: liste mu, sigma e pesi dei portafogli efficienti
+            - current: mu/sigma dell'allocazione corrente (se fornita)
+            - suggested: portafoglio efficiente più vicino all'allocazione corrente
+            - n_candidates: numero di candidati valutati
+    """
+    W = sample_candidate_weights(model, n_candidates, constraints, seed)
+
+    current = None
+    if current_weights:
+        w_cur = model.weights_vector(current_weights)
+        if w_cur.sum() <= 0:
+            raise ValueError("L'allocazione corrente è vuota")
+        w_cur = w_cur / w_cur.sum()
+        W = np.vstack([W, w_cur])
+
+    mu, sigma = model.portfolio_stats(W)
+
+    # Frontiera: ordinando per volatilità, un portafoglio è efficiente se il suo
+    # rendimento supera quello di tutti i portafogli meno volatili
+    order = np.argsort(sigma, kind='stable')
+    mu_sorted = mu[order]
+    best_before = np.concatenate([[-np.inf], np.maximum.accumulate(mu_sorted)[:-1]])
+    efficient = order[mu_sorted > best_before]
+
+    # Riduci a n_points distribuiti uniformemente lungo la volatilità
+    if len(efficient) > n_points:
+        targets = np.linspace(sigma[efficient[0]], sigma[efficient[-1]], n_points)
+        picks = np.unique(np.searchsorted(sigma[efficient], targets).clip(0, len(efficient) - 1))
+        frontier_idx = efficient[picks]
+    else:
+        frontier_idx = efficient
+
+    result = {
+        'frontier': {
+            'mu': mu[frontier_idx].tolist(),
+            'sigma': sigma[frontier_idx].tolist(),
+            'weights': [model.weights_dict(W[i]) for i in frontier_idx]
+        },
+        'n_candidates': int(len(W))
+    }
+
+    if current_weights:
+        mu_cur, sigma_cur = mu[-1], sigma[-1]
+
+        # Portafoglio efficiente più vicino (turnover minimo) tra quelli che
+        # dominano l'allocazione corrente; altrimenti il più vicino in assoluto
+        turnover = 0.5 * np.abs(W[efficient] - w_cur).sum(axis=1)
+        dominating = (mu[efficient] >= mu_cur) & (sigma[efficient] <= sigma_cur)
+        pool = np.flatnonzero(dominating) if dominating.any() else np.arange(len(efficient))
+        best = pool[np.argmin(turnover[pool])]
+        i_best = efficient[best]
+
+        result['current'] = {
+            'mu': float(mu_cur),
+            'sigma': float(sigma_cur),
+            'weights': model.weights_dict(w_cur)
+        }
+        result['suggested'] = {
+            'mu': float(mu[i_best]),
+            'sigma': float(sigma[i_best]),
+            'weights': model.weights_dict(W[i_best]),
+            'turnover': float(turnover[best]),
+            'dominates_current': bool(dominating.any())
+        }
+
+    return result
+
+
+# Test
+if __name__ == "__main__":
+    import time
+
+    model = load_portfolio_model('static/asset_data.json')
+    balanced = {
+        'sp500': 40, 'world_ex_usa': 20, 'emerging_markets': 5,
+        'euro_aggregate': 15, 'global_aggregate': 10, 'gold': 10
+    }
+
+    start = time.perf_counter()
+    frontier = efficient_frontier(model, balanced, constraints={'bonds': [20, 60]})
+    elapsed = time.perf_counter() - start
+
+    print(f"Candidati valutati: {frontier['n_candidates']:,} in {elapsed*1000:.0f} ms")
+    print(f"Corrente:  mu {frontier['current']['mu']*100:.2f}% | sigma {frontier['current']['sigma']*100:.2f}%")
+    print(f"Suggerito: mu {frontier['suggested']['mu']*100:.2f}% | sigma {frontier['suggested']['sigma']*100:.2f}%")
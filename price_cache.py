@@ -0,0 +1,179 @@
+"""
+price_cache.py
+Cache locale degli storici di prezzo grezzi con aggiornamento incrementale.
+
+Un file NPZ per ticker (date, prezzi e metadati JSON nello stesso file):
+un refresh scarica solo le barre successive all'ultima data in cache e
+riscrive il file in modo atomico (file temporaneo, fsync, rename).
+"""
+
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_CACHE_DIR = os.path.join('data', 'price_cache')
+
+# Tolleranza sul confronto dei prezzi delle barre di sovrapposizione
+OVERLAP_RTOL = 1e-6
+
+# Barre in comune fra cache e delta (per confermare una rettifica dello storico)
+OVERLAP_BARS = 2
+
+
+class PriceCache:
+    """
+    Archivio su disco {ticker: serie prezzi}, un file <ticker>.npz ciascuno.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR):
+        self.directory = directory
+
+    def path(self, ticker: str) -> str:
+        safe = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in ticker)
+        return os.path.join(self.directory, f"{safe}.npz")
+
+    def load(self, ticker: str):
+        """
+        Serie prezzi in cache (pd.Series indicizzata per data) oppure None.
+        """
+        path = self.path(ticker)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return pd.Series(data['prices'], index=pd.DatetimeIndex(data['dates']), name=ticker)
+
+    def metadata(self, ticker: str):
+        """
+        Metadati del ticker (first_date, last_date, rows, updated_at) oppure None.
+        """
+        path = self.path(ticker)
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return json.loads(str(data['meta']))
+
+    def store(self, ticker: str, prices: pd.Series, source: str = None):
+        """
+        Salva la serie completa in modo atomico: chi legge vede il file vecchio o quello nuovo.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        prices = prices.dropna().sort_index()
+        prices = prices[~prices.index.duplicated(keep='last')]
+        meta = {
+            'ticker': ticker,
+            'source': source,
+            'first_date': prices.index[0].strftime('%Y-%m-%d'),
+            'last_date': prices.index[-1].strftime('%Y-%m-%d'),
+            'rows': int(len(prices)),
+            'updated_at': datetime.now().isoformat(timespec='seconds')
+        }
+
+        path = self.path(ticker)
+        tmp_path = f"{path}.tmp-{os.getpid()}.npz"
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                dates=prices.index.values.astype('datetime64[ns]'),
+                prices=prices.values.astype(np.float64),
+                meta=np.array(json.dumps(meta))
+            )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+def merge_delta(cached: pd.Series, delta: pd.Series) -> pd.Series:
+    """
+    Accoda alle barre in cache quelle nuove (date successive all'ultima in cache).
+
+    Il delta parte dalla penultima data in cache (OVERLAP_BARS barre in
+    comune). Le barre in comune vengono sempre sostituite con i valori del
+    delta: l'ultima chiusura in cache può essere provvisoria (cache scritta a
+    mercato aperto) e va corretta senza toccare il resto dello storico. Lo
+    storico viene riscalato solo se la rettifica è confermata, cioè se tutte
+    le barre in comune (almeno due) cambiano dello stesso fattore, come
+    accade quando la sorgente rettifica i prezzi per dividendi/split.
+    """
+    if delta is None or len(delta) == 0:
+        return cached
+    last_date = cached.index[-1]
+    overlap = cached.index.intersection(delta.index)
+    if len(overlap) >= OVERLAP_BARS:
+        ratios = (delta.loc[overlap] / cached.loc[overlap]).to_numpy()
+        ratio = ratios[-1]
+        confirmed = (np.all(np.isfinite(ratios))
+                     and np.allclose(ratios, ratio, rtol=OVERLAP_RTOL, atol=0)
+                     and not np.isclose(ratio, 1.0, rtol=OVERLAP_RTOL, atol=0))
+        if confirmed:
+            cached = cached * ratio
+    history = cached.drop(overlap)
+    new_bars = delta[delta.index.isin(overlap) | (delta.index > last_date)]
+    return pd.concat([history, new_bars]).sort_index()
+
+
+class CachedSource:
+    """
+    Avvolge una sorgente (data_sources) aggiungendo la cache incrementale.
+
+    Per i ticker già in cache chiede alla sorgente solo le barre dalla
+    penultima data in cache in poi; i ticker nuovi vengono scaricati per
+    intero. Se il download fallisce (rete assente, nessun dato) i ticker in
+    cache restano disponibili con le serie già su disco.
+    Con offline=True non accede mai alla sorgente e restituisce solo la cache.
+    """
+
+    def __init__(self, source, cache: PriceCache, name: str = None, offline: bool = False):
+        self.source = source
+        self.cache = cache
+        self.name = name
+        self.offline = offline
+        if hasattr(source, 'batch_size'):
+            self.batch_size = source.batch_size
+
+    def fetch_prices(self, tickers: list) -> dict:
+        cached = {t: self.cache.load(t) for t in tickers}
+        prices = {t: s for t, s in cached.items() if s is not None and len(s)}
+        if self.offline:
+            return prices
+
+        known = list(prices)
+        missing = [t for t in tickers if t not in prices]
+        if missing:
+            try:
+                fresh = self.source.fetch_prices(missing)
+            except Exception as e:
+                if not known:
+                    raise
+                print(f"⚠️  Download {self.name} {missing} fallito: {e}")
+                fresh = {}
+            for ticker, series in fresh.items():
+                self.cache.store(ticker, series, self.name)
+                prices[ticker] = series
+
+        # Delta: un'unica richiesta dalla data più vecchia tra le penultime in cache
+        if known:
+            delta_start = min(cached[t].index[-min(OVERLAP_BARS, len(cached[t]))] for t in known)
+            try:
+                delta = self.source.fetch_prices(known, start=delta_start)
+            except Exception as e:
+                print(f"⚠️  Aggiornamento {self.name} fallito, uso la cache per {known}: {e}")
+                delta = {}
+            for ticker in known:
+                merged = merge_delta(cached[ticker], delta.get(ticker))
+                if not merged.equals(cached[ticker]):
+                    self.cache.store(ticker, merged, self.name)
+                prices[ticker] = merged
+
+        return prices
+
+
+def cached_sources(sources: dict, cache_dir: str = DEFAULT_CACHE_DIR, offline: bool = False) -> dict:
+    """
+    Applica CachedSource a tutte le sorgenti di default_sources().
+    """
+    cache = PriceCache(cache_dir)
+    return {name: CachedSource(source, cache, name, offline) for name, source in sources.items()}
@@ -0,0 +1,259 @@
+"""
+quantile_table.py
+Risultati del motore GBM standard senza simulare: tabella dei quantili
+standardizzati per (seed, n_sims, n_steps).
+
+Con seed e n_sims fissati gli shock Z sono sempre gli stessi; per ogni
+traiettoria
+    log V_t = log S0 + drift·t + sigma·sqrt(dt)·W_t,   W_t = Σ_{k≤t} Z_k
+che per sigma ≥ 0 è crescente in W_t: l'ordinamento delle traiettorie a ogni
+passo non dipende da mu, sigma o capitale. Basta quindi conservare, una volta
+sola, le statistiche d'ordine di W_t che np.percentile interpola:
+
+    - per ogni passo e percentile del grafico: W_(i), W_(i+1) e il peso γ
+      dell'interpolazione lineare (stesso metodo di np.percentile)
+    - i valori W_n finali (percentili finali, statistiche, istogramma CAGR,
+      sensibilità)
+    - gli shock delle candidate traiettorie rappresentative (le due
+      statistiche d'ordine attorno a ogni percentile finale) e del campione
+      casuale
+
+Qualunque richiesta con gli stessi (seed, n_sims, anni) si risolve poi in
+O(n_steps) operazioni più una trasformazione dei W_n finali, senza estrarre
+numeri casuali. I risultati coincidono con run_monte_carlo_simulation a meno
+dell'arrotondamento in virgola mobile (la somma cumulata del motore include
+il drift passo per passo).
+
+Le metriche che dipendono dall'intero percorso (obiettivi, drawdown, VaR per
+anno) non sono funzioni monotone di W_t: quando la richiesta le chiede (risk è
+attivo di default, anche nella UI) la tabella rigenera gli stessi shock e le
+calcola sulle traiettorie complete con i tracker del motore. Percentili,
+bande, statistiche e distribuzione restano dalla tabella; il risultato
+coincide comunque con quello della simulazione, a un costo di circa un terzo
+(10k x 360: ~170 ms contro ~450 ms) dominato dall'estrazione degli shock.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from typing import Dict, Any
+
+from monte_carlo_engine import PERCENTILES_TIME, PERCENTILES_FINAL, _terminal_statistics, path_metrics
+from path_sampling import DEFAULT_SAMPLE_PATHS, sample_path_indices
+from path_trackers import build_trackers
+
+
+# Tabelle tenute in memoria (una per combinazione seed/n_sims/anni)
+DEFAULT_MAX_TABLES = 64
+
+
+def _order_statistics(n: int, quantiles) -> tuple:
+    """
+    Indici delle statistiche d'ordine e pesi γ dell'interpolazione lineare
+    di np.percentile (metodo 'linear') per n valori.
+    """
+    virtual = np.asarray(quantiles, dtype=float) / 100 * (n - 1)
+    lower = np.floor(virtual).astype(np.int64)
+    upper = np.minimum(lower + 1, n - 1)
+    return lower, upper, virtual - lower
+
+
+def _lerp(a: np.ndarray, b: np.ndarray, gamma: np.ndarray) -> np.ndarray:
+    """
+    Interpolazione lineare con la stessa formula di np.percentile.
+    """
+    diff = b - a
+    return np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
+
+
+class QuantileTable:
+    """
+    Statistiche d'ordine di W_t per una combinazione (seed, n_sims, n_steps).
+    """
+
+    def __init__(self, seed: int, n_sims: int, n_steps: int, sample_paths: int = DEFAULT_SAMPLE_PATHS):
+        self.seed = seed
+        self.n_sims = n_sims
+        self.n_steps = n_steps
+        self.sample_paths = sample_paths
+
+        # Stessi shock del motore standard (np.random.seed + randn)
+        Z = self.regenerate_shocks()
+        W = np.cumsum(Z, axis=1)
+
+        # Valori finali (in ordine di traiettoria) e candidate rappresentative:
+        # degli shock di queste poche traiettorie si tengono gli Z originali,
+        # così i loro percorsi coincidono bit a bit con quelli del motore
+        self.terminal_w = W[:, -1].copy()
+        order = np.argsort(self.terminal_w, kind='stable')
+        lower, upper, self.gamma_final = _order_statistics(n_sims, PERCENTILES_FINAL)
+        self.candidates = np.stack([order[lower], order[upper]], axis=1)     # percentili x 2
+        unique = np.unique(self.candidates)
+        self._candidate_rows = {int(i): r for r, i in enumerate(unique)}
+        self.candidate_z = Z[unique]
+
+        # Campione casuale: stesso generatore separato del motore standard
+        sampled = sample_path_indices(n_sims, sample_paths, np.random.default_rng(seed))
+        self.sample_z = Z[sampled]
+        del Z
+
+        # Percentili nel tempo: solo le statistiche d'ordine interpolate
+        lower, upper, self.gamma_time = _order_statistics(n_sims, PERCENTILES_TIME)
+        ranks = np.unique(np.concatenate([lower, upper]))
+        W.partition(ranks, axis=0)   # in place: W non serve più per traiettoria
+        self.w_lower = np.vstack([np.zeros(len(lower)), W[lower].T])   # (n_steps + 1) x percentili
+        self.w_upper = np.vstack([np.zeros(len(upper)), W[upper].T])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.w_lower, self.w_upper, self.terminal_w,
+                                      self.candidate_z, self.sample_z))
+
+    def regenerate_shocks(self) -> np.ndarray:
+        """
+        Shock completi (n_sims x n_steps) della tabella, estratti di nuovo: non
+        vengono conservati per non moltiplicare la memoria per il numero di tabelle.
+        """
+        return np.random.RandomState(self.seed).randn(self.n_sims, self.n_steps)
+
+    def evaluate(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Risultati equivalenti a run_monte_carlo_simulation(params) per mu,
+        sigma e capitale qualsiasi (stesse chiavi, 'terminal_w' al posto di 'paths').
+        """
+        S0 = params['capital']
+        mu = params['mu']
+        sigma = params['sigma']
+        T = params['years']
+
+        dt = 1/12
+        drift = (mu - 0.5 * sigma**2) * dt
+        diffusion = sigma * np.sqrt(dt)
+        steps = np.arange(self.n_steps + 1)[:, None]
+        time = np.linspace(0, T, self.n_steps + 1)
+
+        def paths(z):
+            # Stessa formula del motore standard sugli shock originali
+            values = S0 * np.exp(np.cumsum(drift + diffusion * z, axis=1))
+            return np.column_stack([np.full(len(z), S0), values])
+
+        # Percentili nel tempo dalle statistiche d'ordine
+        lower = S0 * np.exp(drift * steps + diffusion * self.w_lower)
+        upper = S0 * np.exp(drift * steps + diffusion * self.w_upper)
+        bands = _lerp(lower, upper, self.gamma_time)
+        percentiles_time = {f'p{q}': bands[:, i] for i, q in enumerate(PERCENTILES_TIME)}
+
+        # Percentili finali, statistiche, distribuzione CAGR
+        final_values = S0 * np.exp(drift * self.n_steps + diffusion * self.terminal_w)
+        results = _terminal_statistics(final_values, S0, T, self.n_sims)
+
+        # Rappresentative: la più vicina al percentile fra le due candidate,
+        # con valori e percentile calcolati come nel motore (anche le parità,
+        # es. la mediana con n_sims pari, si risolvono allo stesso modo)
+        candidate_paths = paths(self.candidate_z)
+        representative = {}
+        for label, pair, gamma in zip(results['percentiles_final'], self.candidates, self.gamma_final):
+            rows = [self._candidate_rows[int(i)] for i in pair]
+            candidate_final = candidate_paths[rows, -1]
+            target = _lerp(candidate_final[0], candidate_final[1], gamma)
+            distance = np.abs(candidate_final - target)
+            best = rows[np.argmin(distance)] if distance[0] != distance[1] else rows[int(np.argmin(pair))]
+            representative[label] = candidate_paths[best]
+
+        # Metriche di percorso (se richieste) sulle traiettorie rigenerate
+        if build_trackers(params, 0, 0):
+            results.update(path_metrics(paths(self.regenerate_shocks()), time, params))
+
+        return {
+            'time': time,
+            'percentiles_time': percentiles_time,
+            **results,
+            'terminal_w': self.terminal_w,
+            'sample_paths': {
+                'representative': representative,
+                'random': paths(self.sample_z)
+            }
+        }
+
+
+class QuantileTableCache:
+    """
+    Tabelle dei quantili in memoria (LRU), costruite alla prima richiesta
+    di ogni combinazione (seed, n_sims, anni). Thread-safe.
+    """
+
+    def __init__(self, max_tables: int = DEFAULT_MAX_TABLES):
+        self.max_tables = max_tables
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def supports(params: Dict[str, Any]) -> bool:
+        """
+        True se la richiesta è risolvibile con la tabella: motore standard GBM con
+        seed fissato, sigma ≥ 0, campione di default e nessuna stima di coda
+        con importance sampling. Obiettivi e rischio sono ammessi (calcolati
+        sugli shock rigenerati, vedi evaluate).
+        """
+        return (params.get('seed') is not None
+                and not params.get('streaming')
+                and params.get('statistics', 'exact') == 'exact'
+                and params.get('model', 'gbm') == 'gbm'
+                and not params.get('tail_sampling')
+                and params.get('sigma', -1) >= 0
+                and params.get('sample_paths', DEFAULT_SAMPLE_PATHS) == DEFAULT_SAMPLE_PATHS)
+
+    def get(self, seed: int, n_sims: int, n_steps: int) -> QuantileTable:
+        key = (seed, n_sims, n_steps)
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                return table
+
+        # Costruzione fuori dal lock: richieste diverse non si bloccano a vicenda
+        table = QuantileTable(seed, n_sims, n_steps)
+        with self._lock:
+            self._tables[key] = table
+            self._tables.move_to_end(key)
+            while len(self._tables) > self.max_tables:
+                self._tables.popitem(last=False)
+        return table
+
+    def simulate(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Risultati dalla tabella (vedi supports()).
+        """
+        n_steps = int(params['years'] / (1/12))
+        return self.get(params['seed'], params['n_sims'], n_steps).evaluate(params)
+
+
+# Test
+if __name__ == "__main__":
+    import time as timer
+    from monte_carlo_engine import run_monte_carlo_simulation
+
+    params = {'capital': 400_000, 'mu': 0.0523, 'sigma': 0.0695, 'years': 30,
+              'n_sims': 10_000, 'seed': 42, 'risk': False}
+    cache = QuantileTableCache()
+
+    start = timer.perf_counter()
+    table = cache.get(42, 10_000, 360)
+    print(f"📐 Tabella costruita in {timer.perf_counter() - start:.2f}s ({table.nbytes / 1024:.0f} KB)")
+
+    for mu, sigma in [(0.0523, 0.0695), (0.08, 0.18), (0.02, 0.0)]:
+        p = {**params, 'mu': mu, 'sigma': sigma}
+        start = timer.perf_counter()
+        fast = cache.simulate(p)
+        t_fast = timer.perf_counter() - start
+        start = timer.perf_counter()
+        reference = run_monte_carlo_simulation(p)
+        t_ref = timer.perf_counter() - start
+
+        error = max(abs(fast['percentiles_time'][k] / reference['percentiles_time'][k] - 1).max()
+                    for k in reference['percentiles_time'])
+        error = max(error, max(abs(fast['percentiles_final'][k] / reference['percentiles_final'][k] - 1)
+                               for k in reference['percentiles_final']))
+        print(f"μ {mu:.2%} σ {sigma:.2%}: tabella {t_fast * 1000:.1f}ms, simulazione {t_ref * 1000:.0f}ms, "
+              f"errore relativo massimo {error:.1e}")
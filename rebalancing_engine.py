@@ -0,0 +1,196 @@
+"""
+rebalancing_engine.py
+Simulazione multi-asset con politica di ribilanciamento esplicita.
+
+Il motore standard simula un unico GBM con mu/sigma del portafoglio, cioè
+assume implicitamente un ribilanciamento continuo ai pesi obiettivo. Qui ogni
+asset evolve con il proprio GBM (shock correlati tramite Cholesky della
+covarianza) e le quote del portafoglio derivano fra un ribilanciamento e
+l'altro, secondo la politica scelta:
+
+    - 'none':      buy & hold, nessun ribilanciamento
+    - 'monthly':   ribilanciamento a fine mese
+    - 'quarterly': ribilanciamento a fine trimestre
+    - 'annual':    ribilanciamento a fine anno
+    - 'threshold': ribilanciamento quando un peso si scosta dall'obiettivo
+                   più della banda (punti percentuali assoluti)
+
+Lo stato è una matrice di controvalori n_sims x n_assets aggiornata a passi
+vettorializzati; le simulazioni sono elaborate a blocchi per limitare la
+memoria degli shock (blocco x passi x asset).
+"""
+
+import numpy as np
+from typing import Dict, Any
+
+from asset_statistics import nearest_psd_correlation
+from monte_carlo_engine import summarize_paths
+
+
+REBALANCING_POLICIES = ('none', 'monthly', 'quarterly', 'annual', 'threshold')
+
+# Passi (mesi) fra due ribilanciamenti di calendario
+CALENDAR_STEPS = {'monthly': 1, 'quarterly': 3, 'annual': 12}
+
+DEFAULT_THRESHOLD = 0.05
+
+# Elementi massimi del blocco di shock (blocco x passi x asset, float32 ≈ 16 MB)
+CHUNK_ELEMENTS = 4_000_000
+
+
+def _asset_cholesky(covariance: np.ndarray) -> np.ndarray:
+    """
+    Fattore di Cholesky della covarianza degli asset detenuti (riparata se non PSD).
+    """
+    try:
+        return np.linalg.cholesky(covariance)
+    except np.linalg.LinAlgError:
+        sigma = np.sqrt(np.maximum(np.diag(covariance), 0.0))
+        scale = np.where(sigma > 0, sigma, 1.0)
+        correlation = nearest_psd_correlation(covariance / np.outer(scale, scale))
+        return np.linalg.cholesky(sigma[:, None] * correlation * sigma[None, :]
+                                  + np.eye(len(sigma)) * 1e-12)
+
+
+def run_rebalancing_simulation(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Esegue la simulazione Monte Carlo multi-asset con ribilanciamento.
+
+    Args:
+        params: dizionario con le chiavi di run_monte_carlo_simulation
+            (capital, years, n_sims, seed, targets, ...) più:
+            - asset_weights: pesi obiettivo (decimali, normalizzati qui)
+            - asset_mu: rendimenti annui attesi degli asset (decimali)
+            - asset_covariance: covarianza annua degli asset (n_assets x n_assets)
+            - rebalancing: politica, una di REBALANCING_POLICIES
+            - threshold: banda di scostamento per 'threshold' (default 0.05)
+            - transaction_cost: costo proporzionale sul controvalore scambiato
+              (decimale, default 0)
+
+    Returns:
+        stesse chiavi di run_monte_carlo_simulation più 'rebalancing' con
+        numero medio di ribilanciamenti, turnover annuo e costi medi
+    """
+    policy = params.get('rebalancing', 'annual')
+    if policy not in REBALANCING_POLICIES:
+        raise ValueError(f"Politica di ribilanciamento sconosciuta: {policy} "
+                         f"(disponibili: {', '.join(REBALANCING_POLICIES)})")
+
+    S0 = params['capital']
+    T = params['years']
+    n_sims = params['n_sims']
+    threshold = float(params.get('threshold', DEFAULT_THRESHOLD))
+    cost_rate = float(params.get('transaction_cost', 0.0))
+    rng = np.random.default_rng(params.get('seed'))
+
+    # Solo gli asset detenuti: gli altri restano a zero con ogni politica
+    weights = np.asarray(params['asset_weights'], dtype=float)
+    if weights.sum() <= 0:
+        raise ValueError("Pesi del portafoglio mancanti o nulli")
+    held = weights > 0
+    w = weights[held] / weights[held].sum()
+    mu = np.asarray(params['asset_mu'], dtype=float)[held]
+    covariance = np.asarray(params['asset_covariance'], dtype=float)[np.ix_(held, held)]
+    n_assets = len(w)
+
+    dt = 1/12
+    n_steps = int(T / dt)
+    time = np.linspace(0, T, n_steps + 1)
+
+    # GBM per asset: log-rendimento mensile = drift + shock correlato
+    drift = ((mu - 0.5 * np.diag(covariance)) * dt).astype(np.float32)
+    chol_t = (_asset_cholesky(covariance) * np.sqrt(dt)).T.astype(np.float32)
+    period = CALENDAR_STEPS.get(policy)
+
+    paths = np.empty((n_sims, n_steps + 1))
+    paths[:, 0] = S0
+    rebalances = np.zeros(n_sims)
+    turnover = np.zeros(n_sims)
+    costs = np.zeros(n_sims)
+
+    chunk = max(1, CHUNK_ELEMENTS // max(n_steps * n_assets, 1))
+    for start in range(0, n_sims, chunk):
+        stop = min(start + chunk, n_sims)
+        size = stop - start
+
+        # Fattori di crescita mensili del blocco (size x n_steps x n_assets)
+        growth = rng.standard_normal((size, n_steps, n_assets), dtype=np.float32) @ chol_t
+        growth += drift
+        np.exp(growth, out=growth)
+
+        if policy == 'none':
+            # Buy & hold: controvalori = quote iniziali x crescita cumulata
+            np.cumprod(growth, axis=1, out=growth)
+            paths[start:stop, 1:] = growth @ (S0 * w).astype(np.float32)
+            continue
+
+        holdings = np.tile(S0 * w, (size, 1))
+        for k in range(n_steps):
+            holdings *= growth[:, k]
+            value = holdings.sum(axis=1)
+
+            if period is not None:
+                due = slice(None) if (k + 1) % period == 0 else None
+            else:
+                drift_max = np.abs(holdings / value[:, None] - w).max(axis=1)
+                due = np.flatnonzero(drift_max > threshold)
+                if len(due) == 0:
+                    due = None
+
+            if due is not None:
+                # Riporta i controvalori ai pesi obiettivo, al netto dei costi
+                # (costo sul controvalore scambiato calcolato prima dei costi)
+                v = value[due]
+                traded = np.abs(v[:, None] * w - holdings[due]).sum(axis=1)
+                cost = cost_rate * traded
+                v = v - cost
+                holdings[due] = v[:, None] * w
+                value[due] = v
+
+                idx = np.arange(start, stop)[due]
+                rebalances[idx] += 1
+                turnover[idx] += 0.5 * traded / (v + cost)
+                costs[idx] += cost / S0
+
+            paths[start:stop, k + 1] = value
+
+    results = summarize_paths(paths, time, params, rng)
+    results['rebalancing'] = {
+        'policy': policy,
+        'threshold': threshold if policy == 'threshold' else None,
+        'transaction_cost': cost_rate,
+        'rebalances': float(rebalances.mean()),
+        'turnover_per_year': float(turnover.mean() / T) if T else 0.0,
+        'costs': float(costs.mean())
+    }
+    return results
+
+
+# Test
+if __name__ == "__main__":
+    from portfolio_model import load_portfolio_model
+    import time as timer
+
+    model = load_portfolio_model('static/asset_data.json')
+    weights = model.weights_vector({'sp500': 40, 'world_ex_usa': 20, 'emerging_markets': 5,
+                                    'euro_aggregate': 15, 'global_aggregate': 10, 'gold': 10})
+    base = {
+        'capital': 400_000,
+        'years': 30,
+        'n_sims': 10_000,
+        'seed': 42,
+        'asset_weights': weights,
+        'asset_mu': model.mu,
+        'asset_covariance': model.covariance,
+        'transaction_cost': 0.001
+    }
+
+    for policy in REBALANCING_POLICIES:
+        start = timer.perf_counter()
+        results = run_rebalancing_simulation({**base, 'rebalancing': policy})
+        elapsed = timer.perf_counter() - start
+        info = results['rebalancing']
+        print(f"{policy:<10} mediana €{results['percentiles_final']['p50']:>12,.0f}  "
+              f"p5 €{results['percentiles_final']['p5']:>12,.0f}  "
+              f"ribil. {info['rebalances']:6.1f}  turnover {info['turnover_per_year'] * 100:5.2f}%/anno  "
+              f"({elapsed:.2f}s)")
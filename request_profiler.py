@@ -0,0 +1,130 @@
+"""
+request_profiler.py
+Profilazione su richiesta di una singola chiamata a /simulate (cProfile).
+
+Si attiva in due passi:
+    1. configurazione: variabile d'ambiente MC_PROFILING=1 (ed eventualmente
+       MC_PROFILING_ALLOWED con gli IP autorizzati, MC_PROFILING_DIR per la cartella)
+    2. richiesta: header "X-Profile: 1" oppure parametro "?profile=1", da un IP autorizzato
+
+Il profilo (motore, formatter, grafico, serializzazione) viene salvato in
+formato pstats e scaricato da /profiles/<nome>: si apre con
+`python -m pstats file.prof` o con snakeviz.
+Con la profilazione disattivata le view non vengono nemmeno avvolte:
+nessun costo aggiuntivo per richiesta.
+"""
+
+import cProfile
+import functools
+import io
+import os
+import pstats
+import re
+import uuid
+from datetime import datetime
+
+
+DEFAULT_PROFILE_DIR = 'profiles'
+DEFAULT_ALLOWED_CLIENTS = ('127.0.0.1', '::1')
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY_PARAM = 'profile'
+
+# Righe del riepilogo testuale salvato accanto al profilo
+SUMMARY_LINES = 40
+
+_SAFE_NAME = re.compile(r'^[A-Za-z0-9_.-]+\.(prof|txt)$')
+
+
+class RequestProfiler:
+    """
+    Decoratore per view Flask che profila le richieste esplicitamente marcate.
+    """
+
+    def __init__(self, enabled: bool = False, allowed_clients=DEFAULT_ALLOWED_CLIENTS,
+                 directory: str = DEFAULT_PROFILE_DIR):
+        self.enabled = enabled
+        self.allowed_clients = set(allowed_clients)
+        self.directory = directory
+
+    @classmethod
+    def from_env(cls) -> 'RequestProfiler':
+        allowed = os.environ.get('MC_PROFILING_ALLOWED')
+        return cls(
+            enabled=os.environ.get('MC_PROFILING', '') == '1',
+            allowed_clients=[c.strip() for c in allowed.split(',') if c.strip()] if allowed
+            else DEFAULT_ALLOWED_CLIENTS,
+            directory=os.environ.get('MC_PROFILING_DIR', DEFAULT_PROFILE_DIR)
+        )
+
+    def _client_allowed(self, request) -> bool:
+        return request.remote_addr in self.allowed_clients
+
+    def _requested(self, request) -> bool:
+        flag = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_QUERY_PARAM)
+        return flag is not None and flag.lower() in ('1', 'true', 'yes')
+
+    def profiled(self, view):
+        """
+        Avvolge una view: le richieste marcate da client autorizzati vengono profilate.
+
+        Con la profilazione disattivata restituisce la view invariata.
+        """
+        if not self.enabled:
+            return view
+
+        from flask import make_response, request, url_for
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not (self._requested(request) and self._client_allowed(request)):
+                return view(*args, **kwargs)
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                rv = view(*args, **kwargs)
+                response = make_response(rv)
+            finally:
+                profiler.disable()
+
+            name = self._save(profiler, view.__name__)
+            response.headers['X-Profile-Id'] = name
+            response.headers['X-Profile-Url'] = url_for('download_profile', filename=name)
+            return response
+
+        return wrapper
+
+    def _save(self, profiler: cProfile.Profile, label: str) -> str:
+        """
+        Salva il profilo (pstats) e un riepilogo testuale; restituisce il nome del file.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%dT%H%M%S')
+        name = f"{label}-{stamp}-{uuid.uuid4().hex[:8]}.prof"
+        path = os.path.join(self.directory, name)
+        profiler.dump_stats(path)
+
+        summary = io.StringIO()
+        stats = pstats.Stats(profiler, stream=summary)
+        stats.sort_stats('cumulative').print_stats(SUMMARY_LINES)
+        with open(path[:-len('.prof')] + '.txt', 'w', encoding='utf-8') as f:
+            f.write(summary.getvalue())
+        return name
+
+    def init_app(self, app):
+        """
+        Registra l'endpoint di download /profiles/<filename> (solo se abilitato).
+        """
+        if not self.enabled:
+            return
+
+        from flask import abort, request, send_from_directory
+
+        directory = os.path.abspath(self.directory)
+
+        @app.route('/profiles/<filename>')
+        def download_profile(filename):
+            if not self._client_allowed(request) or not _SAFE_NAME.match(filename):
+                abort(404)
+            return send_from_directory(directory, filename, as_attachment=True)
@@ -0,0 +1,440 @@
+"""
+return_models.py
+Modelli dei rendimenti mensili alternativi al GBM a volatilità costante.
+
+Il GBM sottostima le crisi "a grappolo" (vedi le note di TAIL_RISK_CONTEXT):
+qui la volatilità cambia nel tempo, con la stessa media e la stessa varianza
+di lungo periodo dei parametri mu/sigma richiesti: cambia la forma della
+distribuzione (code, crisi concentrate), non il livello del rischio.
+
+    - 'garch':  GARCH(1,1) sui log-rendimenti mensili
+                  r_t = m + ε_t,  ε_t = sqrt(h_t) z_t
+                  h_{t+1} = ω + α ε_t² + β h_t,   ω = σ²dt (1 - α - β)
+                (targeting della varianza: varianza non condizionata σ²dt)
+    - 'regime': catena di Markov a due stati (calmo / crisi), ciascuno con
+                media e volatilità proprie; medie e volatilità dei regimi sono
+                scelte in modo che la media e la varianza di lungo periodo
+                dei log-rendimenti coincidano con quelle del GBM
+
+I parametri di forma (α, β; probabilità di permanenza, rapporto fra le
+volatilità, distanza fra le medie) non dipendono dalla scala: si stimano
+sullo storico (fit_garch, fit_regime_switching, fit_return_models sui
+rendimenti mensili di fetch_returns.py) e si applicano a qualunque mu/sigma.
+
+La ricorsione nel tempo è vettorializzata su tutte le simulazioni a ogni
+passo; con jit=True e numba installato si usano kernel compilati con gli
+stessi numeri casuali (risultati identici a meno dell'arrotondamento).
+"""
+
+import logging
+
+import numpy as np
+from typing import Dict, Any
+
+
+logger = logging.getLogger(__name__)
+
+RETURN_MODELS = ('gbm', 'garch', 'regime')
+
+# Forme di default (valori tipici su azionario globale, rendimenti mensili)
+DEFAULT_GARCH = {'alpha': 0.10, 'beta': 0.85}
+DEFAULT_REGIME = {
+    'p_stay_calm': 0.98,     # durata media del regime calmo: 50 mesi
+    'p_stay_crisis': 0.90,   # durata media della crisi: 10 mesi
+    'vol_ratio': 2.5,        # volatilità in crisi / volatilità in calma
+    'mean_gap': 0.3          # media calma - media crisi, in deviazioni standard mensili
+}
+
+# Chiavi di model_params ammesse per modello (vedi garch_parameters / regime_parameters)
+MODEL_SHAPES = {'gbm': {}, 'garch': DEFAULT_GARCH, 'regime': DEFAULT_REGIME}
+
+# Quota massima della varianza di lungo periodo dovuta alla distanza fra le
+# medie dei regimi (il resto è volatilità entro il regime)
+MAX_BETWEEN_SHARE = 0.5
+
+# Persistenza massima accettata per il GARCH (α + β < 1: varianza finita)
+MAX_PERSISTENCE = 0.999
+
+
+# ========== KERNEL ==========
+
+def _garch_numpy(z: np.ndarray, mean: float, omega: float, alpha: float, beta: float,
+                 h0: float) -> np.ndarray:
+    """
+    Log-rendimenti GARCH(1,1): un passo alla volta, vettoriale sulle simulazioni.
+    """
+    n_sims, n_steps = z.shape
+    returns = np.empty((n_sims, n_steps))
+    h = np.full(n_sims, h0)
+    for t in range(n_steps):
+        eps = np.sqrt(h) * z[:, t]
+        returns[:, t] = mean + eps
+        h = omega + alpha * eps * eps + beta * h
+    return returns
+
+
+def _garch_loops(z, mean, omega, alpha, beta, h0, returns):
+    # Versione a cicli espliciti per numba (stessa ricorsione di _garch_numpy)
+    n_sims, n_steps = z.shape
+    for i in range(n_sims):
+        h = h0
+        for t in range(n_steps):
+            eps = np.sqrt(h) * z[i, t]
+            returns[i, t] = mean + eps
+            h = omega + alpha * eps * eps + beta * h
+
+
+def _regime_numpy(z: np.ndarray, u: np.ndarray, state0: np.ndarray, means: np.ndarray,
+                  sds: np.ndarray, p_stay: np.ndarray) -> np.ndarray:
+    """
+    Log-rendimenti a regimi: lo stato del passo t decide media e volatilità,
+    poi transizione con probabilità di permanenza p_stay[stato].
+    """
+    n_sims, n_steps = z.shape
+    returns = np.empty((n_sims, n_steps))
+    state = state0.copy()
+    for t in range(n_steps):
+        returns[:, t] = means[state] + sds[state] * z[:, t]
+        state = np.where(u[:, t] < p_stay[state], state, 1 - state)
+    return returns
+
+
+def _regime_loops(z, u, state0, means, sds, p_stay, returns):
+    n_sims, n_steps = z.shape
+    for i in range(n_sims):
+        state = state0[i]
+        for t in range(n_steps):
+            returns[i, t] = means[state] + sds[state] * z[i, t]
+            if u[i, t] >= p_stay[state]:
+                state = 1 - state
+
+
+_JIT_KERNELS = {}
+
+
+def _jit_kernel(name: str):
+    """
+    Kernel compilato con numba (None se numba non è installato).
+    """
+    if name not in _JIT_KERNELS:
+        try:
+            import numba
+        except ImportError:
+            logger.info("numba non disponibile: kernel numpy per il modello %s", name)
+            _JIT_KERNELS[name] = None
+        else:
+            loops = {'garch': _garch_loops, 'regime': _regime_loops}[name]
+            _JIT_KERNELS[name] = numba.njit(cache=True)(loops)
+    return _JIT_KERNELS[name]
+
+
+# ========== PARAMETRI ==========
+
+def garch_parameters(mu: float, sigma: float, shape: Dict[str, float] = None, dt: float = 1/12) -> dict:
+    """
+    Parametri mensili del GARCH con varianza non condizionata σ²dt.
+    """
+    shape = {**DEFAULT_GARCH, **(shape or {})}
+    alpha, beta = float(shape['alpha']), float(shape['beta'])
+    if alpha < 0 or beta < 0 or alpha + beta >= MAX_PERSISTENCE:
+        raise ValueError(f"Parametri GARCH non stazionari: alpha={alpha}, beta={beta}")
+    variance = sigma**2 * dt
+    return {
+        'mean': (mu - 0.5 * sigma**2) * dt,
+        'omega': variance * (1 - alpha - beta),
+        'alpha': alpha,
+        'beta': beta,
+        'h0': variance
+    }
+
+
+def regime_parameters(mu: float, sigma: float, shape: Dict[str, float] = None, dt: float = 1/12) -> dict:
+    """
+    Medie, volatilità e probabilità di permanenza dei due regimi (0 = calmo,
+    1 = crisi) con la media del GBM equivalente e la stessa varianza di lungo
+    periodo (varianza della somma dei log-rendimenti per passo = σ²dt).
+    """
+    shape = {**DEFAULT_REGIME, **(shape or {})}
+    p_stay = np.array([shape['p_stay_calm'], shape['p_stay_crisis']], dtype=float)
+    if np.any(p_stay <= 0) or np.any(p_stay >= 1):
+        raise ValueError("Le probabilità di permanenza dei regimi devono essere in (0, 1)")
+
+    # Probabilità stazionaria della crisi
+    pi = (1 - p_stay[0]) / ((1 - p_stay[0]) + (1 - p_stay[1]))
+    mean = (mu - 0.5 * sigma**2) * dt
+    variance = sigma**2 * dt
+
+    # Le medie dei regimi sono autocorrelate (λ = p_calm + p_crisi - 1): il loro
+    # contributo alla varianza di lungo periodo è π(1-π)·gap²·(1+λ)/(1-λ).
+    # Si limita la distanza perché resti al massimo MAX_BETWEEN_SHARE del totale
+    lam = p_stay.sum() - 1
+    persistence = (1 + lam) / (1 - lam)
+    gap = float(shape['mean_gap']) * np.sqrt(variance)
+    gap = min(gap, np.sqrt(MAX_BETWEEN_SHARE * variance / (pi * (1 - pi) * persistence)))
+    within = variance - pi * (1 - pi) * gap**2 * persistence
+    ratio = float(shape['vol_ratio'])
+    sd_calm = np.sqrt(within / ((1 - pi) + pi * ratio**2))
+
+    return {
+        'means': np.array([mean + gap * pi, mean - gap * (1 - pi)]),
+        'sds': np.array([sd_calm, sd_calm * ratio]),
+        'p_stay': p_stay,
+        'stationary_crisis': pi
+    }
+
+
+def validate_model_params(model: str, model_params: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Forma del modello richiesta dall'esterno (es. /simulate): solo le chiavi di
+    MODEL_SHAPES[model], convertite in float. Una chiave sconosciuta (es. un
+    refuso) solleva ValueError invece di lasciare in silenzio il default.
+    I dizionari di fit_garch / fit_regime_switching contengono anche le
+    statistiche della stima: vanno filtrati prima di passarli qui.
+    """
+    if model not in MODEL_SHAPES:
+        raise ValueError(f"Modello dei rendimenti sconosciuto: {model}")
+    model_params = model_params or {}
+    unknown = sorted(set(model_params) - set(MODEL_SHAPES[model]))
+    if unknown:
+        allowed = ', '.join(MODEL_SHAPES[model]) or 'nessuno'
+        raise ValueError(f"Parametri sconosciuti per il modello {model}: {', '.join(unknown)} "
+                         f"(ammessi: {allowed})")
+    return {key: float(value) for key, value in model_params.items()}
+
+
+def simulate_log_returns(model: str, params: Dict[str, Any], n_sims: int, n_steps: int,
+                         rng: np.random.Generator) -> np.ndarray:
+    """
+    Matrice n_sims x n_steps dei log-rendimenti mensili del modello.
+
+    Args:
+        model: 'garch' o 'regime'
+        params: parametri della simulazione (mu, sigma) più gli opzionali
+            model_params (forma del modello, vedi DEFAULT_GARCH / DEFAULT_REGIME)
+            e jit (kernel numba se disponibile)
+        rng: generatore dei numeri casuali
+    """
+    shape = params.get('model_params')
+    jit = params.get('jit', False)
+    z = rng.standard_normal((n_sims, n_steps))
+
+    if model == 'garch':
+        p = garch_parameters(params['mu'], params['sigma'], shape)
+        kernel = _jit_kernel('garch') if jit else None
+        if kernel is None:
+            return _garch_numpy(z, p['mean'], p['omega'], p['alpha'], p['beta'], p['h0'])
+        returns = np.empty_like(z)
+        kernel(z, p['mean'], p['omega'], p['alpha'], p['beta'], p['h0'], returns)
+        return returns
+
+    if model == 'regime':
+        p = regime_parameters(params['mu'], params['sigma'], shape)
+        # Stato iniziale dalla distribuzione stazionaria
+        state0 = (rng.random(n_sims) < p['stationary_crisis']).astype(np.int64)
+        u = rng.random((n_sims, n_steps))
+        kernel = _jit_kernel('regime') if jit else None
+        if kernel is None:
+            return _regime_numpy(z, u, state0, p['means'], p['sds'], p['p_stay'])
+        returns = np.empty_like(z)
+        kernel(z, u, state0, p['means'], p['sds'], p['p_stay'], returns)
+        return returns
+
+    raise ValueError(f"Modello dei rendimenti sconosciuto: {model} "
+                     f"(disponibili: {', '.join(RETURN_MODELS)})")
+
+
+# ========== STIMA SULLO STORICO ==========
+
+def _log_returns(returns) -> np.ndarray:
+    """
+    Log-rendimenti validi da rendimenti semplici (array o serie con NaN).
+    """
+    r = np.asarray(returns, dtype=float)
+    r = r[np.isfinite(r)]
+    if len(r) < 24:
+        raise ValueError("Storico troppo corto per la stima (servono almeno 24 mesi)")
+    return np.log1p(r)
+
+
+def _garch_log_likelihood(e: np.ndarray, variance: float, alpha: np.ndarray, beta: np.ndarray) -> np.ndarray:
+    """
+    Log-verosimiglianza gaussiana per una griglia di (α, β), vettoriale sulla griglia.
+    """
+    omega = variance * (1 - alpha - beta)
+    h = np.full(alpha.shape, variance)
+    ll = np.zeros(alpha.shape)
+    for x in e:
+        ll -= 0.5 * (np.log(2 * np.pi * h) + x * x / h)
+        h = omega + alpha * x * x + beta * h
+    return ll
+
+
+def fit_garch(returns) -> dict:
+    """
+    Stima GARCH(1,1) con targeting della varianza: massima verosimiglianza su
+    (α, β) per ricerca a griglia con due raffinamenti successivi.
+
+    Args:
+        returns: rendimenti mensili semplici (decimali)
+
+    Returns:
+        dict con alpha, beta (forma, per model_params), persistenza, media e
+        varianza mensili dei log-rendimenti, log-verosimiglianza e numero di mesi
+    """
+    r = _log_returns(returns)
+    e = r - r.mean()
+    variance = float(e.var())
+
+    alpha_grid, beta_grid = np.linspace(0.0, 0.4, 41), np.linspace(0.0, 0.99, 100)
+    for _ in range(3):
+        alpha, beta = (g.ravel() for g in np.meshgrid(alpha_grid, beta_grid))
+        valid = alpha + beta < MAX_PERSISTENCE
+        alpha, beta = alpha[valid], beta[valid]
+        ll = _garch_log_likelihood(e, variance, alpha, beta)
+        best = int(np.argmax(ll))
+        a_step, b_step = alpha_grid[1] - alpha_grid[0], beta_grid[1] - beta_grid[0]
+        alpha_grid = np.clip(np.linspace(alpha[best] - a_step, alpha[best] + a_step, 21), 0, 1)
+        beta_grid = np.clip(np.linspace(beta[best] - b_step, beta[best] + b_step, 21), 0, 1)
+
+    return {
+        'alpha': float(alpha[best]),
+        'beta': float(beta[best]),
+        'persistence': float(alpha[best] + beta[best]),
+        'monthly_mean': float(r.mean()),
+        'monthly_variance': variance,
+        'log_likelihood': float(ll[best]),
+        'n_months': int(len(r))
+    }
+
+
+def fit_regime_switching(returns, iterations: int = 200, tol: float = 1e-6) -> dict:
+    """
+    Stima del modello a due regimi gaussiani con EM (filtro di Hamilton e
+    smoother di Kim). Il regime 0 è quello a volatilità più bassa (calmo).
+
+    Args:
+        returns: rendimenti mensili semplici (decimali)
+
+    Returns:
+        dict con la forma per model_params (p_stay_calm, p_stay_crisis,
+        vol_ratio, mean_gap) più medie e volatilità mensili dei regimi,
+        probabilità stazionaria della crisi, log-verosimiglianza e numero di mesi
+    """
+    r = _log_returns(returns)
+    T = len(r)
+    sd = r.std()
+
+    means = np.array([r.mean() + 0.25 * sd, r.mean() - 0.75 * sd])
+    sds = np.array([0.7 * sd, 1.6 * sd])
+    P = np.array([[0.95, 0.05], [0.20, 0.80]])
+    start = np.array([0.8, 0.2])
+    previous = -np.inf
+
+    for _ in range(iterations):
+        # E-step: filtro in avanti (due stati: aritmetica scalare, più rapida
+        # di numpy su vettori di due elementi)
+        density = np.exp(-0.5 * ((r[:, None] - means) / sds) ** 2) / (np.sqrt(2 * np.pi) * sds)
+        d0, d1 = density[:, 0].tolist(), density[:, 1].tolist()
+        p00, p01, p10, p11 = P[0, 0], P[0, 1], P[1, 0], P[1, 1]
+        filtered = [None] * T
+        predicted = [None] * T
+        log_likelihood = 0.0
+        a0, a1 = start
+        for t in range(T):
+            predicted[t] = (a0, a1)
+            j0, j1 = a0 * d0[t], a1 * d1[t]
+            total = j0 + j1
+            log_likelihood += np.log(total)
+            f0, f1 = j0 / total, j1 / total
+            filtered[t] = (f0, f1)
+            a0, a1 = f0 * p00 + f1 * p10, f0 * p01 + f1 * p11
+
+        # Smoother all'indietro e transizioni attese
+        smoothed = np.empty((T, 2))
+        smoothed[-1] = filtered[-1]
+        n00 = n01 = n10 = n11 = 0.0
+        s0, s1 = filtered[-1]
+        for t in range(T - 2, -1, -1):
+            q0, q1 = predicted[t + 1]
+            r0, r1 = s0 / max(q0, 1e-300), s1 / max(q1, 1e-300)
+            f0, f1 = filtered[t]
+            t00, t01, t10, t11 = f0 * p00 * r0, f0 * p01 * r1, f1 * p10 * r0, f1 * p11 * r1
+            n00 += t00
+            n01 += t01
+            n10 += t10
+            n11 += t11
+            s0, s1 = t00 + t01, t10 + t11
+            smoothed[t] = (s0, s1)
+        transitions = np.array([[n00, n01], [n10, n11]])
+
+        # M-step
+        weights = smoothed.sum(axis=0)
+        means = (smoothed * r[:, None]).sum(axis=0) / weights
+        sds = np.sqrt((smoothed * (r[:, None] - means) ** 2).sum(axis=0) / weights)
+        sds = np.maximum(sds, 1e-6)
+        P = transitions / transitions.sum(axis=1, keepdims=True)
+        start = smoothed[0]
+
+        if log_likelihood - previous < tol:
+            break
+        previous = log_likelihood
+
+    # Regime 0 = calmo (volatilità più bassa)
+    if sds[0] > sds[1]:
+        means, sds, P = means[::-1], sds[::-1], P[::-1, ::-1]
+    p_stay = np.clip(np.diag(P), 1e-4, 1 - 1e-4)
+    pi = (1 - p_stay[0]) / ((1 - p_stay[0]) + (1 - p_stay[1]))
+    return {
+        'p_stay_calm': float(p_stay[0]),
+        'p_stay_crisis': float(p_stay[1]),
+        'vol_ratio': float(sds[1] / sds[0]),
+        'mean_gap': float((means[0] - means[1]) / r.std()),
+        'monthly_means': means.tolist(),
+        'monthly_sds': sds.tolist(),
+        'stationary_crisis': float(pi),
+        'log_likelihood': float(log_likelihood),
+        'n_months': int(T)
+    }
+
+
+def fit_return_models(monthly) -> dict:
+    """
+    Stima di entrambi i modelli per ogni colonna dei rendimenti mensili
+    (DataFrame largo di compute_asset_statistics, con NaN fuori storico).
+
+    Returns:
+        {chiave asset: {'garch': {...}, 'regime': {...}}}; gli asset con
+        storico troppo corto sono omessi
+    """
+    fits = {}
+    for key, series in monthly.items():
+        try:
+            fits[key] = {'garch': fit_garch(series.to_numpy(dtype=float)),
+                         'regime': fit_regime_switching(series.to_numpy(dtype=float))}
+        except ValueError:
+            continue
+    return fits
+
+
+# Test
+if __name__ == "__main__":
+    import time as timer
+    from monte_carlo_engine import run_monte_carlo_simulation
+
+    params = {'capital': 400_000, 'mu': 0.0523, 'sigma': 0.0695, 'years': 30,
+              'n_sims': 10_000, 'seed': 42, 'risk': False}
+    for model in RETURN_MODELS:
+        start = timer.perf_counter()
+        results = run_monte_carlo_simulation({**params, 'model': model})
+        elapsed = timer.perf_counter() - start
+        pf = results['percentiles_final']
+        print(f"{model:<7} p3 €{pf['p3']:>12,.0f}  mediana €{pf['p50']:>12,.0f}  "
+              f"p75 €{pf['p75']:>12,.0f}  ({elapsed * 1000:.0f}ms)")
+
+    # Stima su uno storico sintetico GARCH
+    rng = np.random.default_rng(0)
+    true = garch_parameters(0.07, 0.16, {'alpha': 0.12, 'beta': 0.82})
+    history = np.expm1(_garch_numpy(rng.standard_normal((1, 1200)), true['mean'], true['omega'],
+                                    true['alpha'], true['beta'], true['h0'])[0])
+    fit = fit_garch(history)
+    print(f"GARCH stimato su 1200 mesi: alpha {fit['alpha']:.3f}, beta {fit['beta']:.3f} (veri 0.12, 0.82)")
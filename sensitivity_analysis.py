@@ -0,0 +1,180 @@
+"""
+sensitivity_analysis.py
+Sensibilità dei risultati Monte Carlo a rendimento atteso, volatilità e orizzonte.
+
+Tutti gli scenari "perturbati" riusano gli stessi shock della simulazione base
+(common random numbers): per il GBM il valore finale dipende dagli shock solo
+tramite la loro somma W_n, quindi basta ricostruire W_n una volta e valutare
+tutti gli scenari in un'unica operazione vettoriale.
+"""
+
+import numpy as np
+from typing import Dict, Any, Optional
+
+
+# Percentili riportati nella tabella scenari (vedi create_summary_table)
+REPORTED_PERCENTILES = [3, 5, 7, 10, 25, 50, 75]
+
+# Perturbazioni di default: ±1% su mu e sigma, ±1 anno sull'orizzonte
+DEFAULT_BUMPS = {'mu': 0.01, 'sigma': 0.01, 'years': 1}
+
+PARAMETER_LABELS = {
+    'mu': 'Rendimento atteso',
+    'sigma': 'Volatilità',
+    'years': 'Orizzonte'
+}
+
+DT = 1 / 12  # step mensile, come in monte_carlo_engine
+
+
+def terminal_shocks_from_paths(results: Dict[str, Any], params: Dict[str, Any]) -> np.ndarray:
+    """
+    Ricostruisce la somma degli shock normali W_n di ogni traiettoria.
+
+    Inverte la formula GBM sul valore finale:
+        log(V_T / S0) = (mu - sigma²/2)·dt·n + sigma·sqrt(dt)·W_n
+
+    Con sigma nulla le traiettorie non dipendono dagli shock: si usano allora
+    shock freschi (servono solo per lo scenario con sigma perturbata).
+    """
+    n_steps = int(params['years'] / DT)
+    sigma = params['sigma']
+
+    if sigma <= 0:
+        rng = np.random.default_rng(params.get('seed'))
+        return rng.standard_normal(results['n_sims']) * np.sqrt(n_steps)
+
+    # Il motore streaming restituisce direttamente W_n
+    if 'terminal_w' in results:
+        return np.asarray(results['terminal_w'])
+
+    final_values = results['paths'][:, -1]
+    drift = (params['mu'] - 0.5 * sigma**2) * DT
+    diffusion = sigma * np.sqrt(DT)
+    return (np.log(final_values / params['capital']) - drift * n_steps) / diffusion
+
+
+def compute_sensitivity(terminal_w: np.ndarray, params: Dict[str, Any],
+                        bumps: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    Calcola la sensibilità di percentili finali e CAGR a mu, sigma e anni.
+
+    Differenze finite centrali su common random numbers: ogni scenario riusa
+    gli stessi W_n della simulazione base. Per l'orizzonte ±1 anno:
+        - anni + 1: W_{n+12} = W_n + sqrt(12)·Z
+        - anni - 1: W_{n-12} campionato dal ponte browniano condizionato a W_n
+    così ogni traiettoria resta la stessa, solo più lunga o più corta.
+
+    Args:
+        terminal_w: somme degli shock W_n (una per simulazione)
+        params: parametri della simulazione (capital, mu, sigma, years, seed)
+        bumps: ampiezza delle perturbazioni (default DEFAULT_BUMPS)
+
+    Returns:
+        dizionario pronto per un grafico a tornado con:
+            - bumps: perturbazioni applicate
+            - base: percentili e CAGR dello scenario base
+            - metrics: per ogni metrica, lista di barre ordinate per impatto
+    """
+    bumps = {**DEFAULT_BUMPS, **(bumps or {})}
+    S0 = params['capital']
+    mu = params['mu']
+    sigma = params['sigma']
+    years = params['years']
+    n_steps = int(years / DT)
+    step_year = int(round(1 / DT))
+
+    w = np.asarray(terminal_w, dtype=float)
+    rng = np.random.default_rng(params.get('seed'))
+    z = rng.standard_normal((2, len(w)))
+
+    # Scenari: base + coppie (giù, su) per ogni parametro, tutte sugli stessi W
+    d_years = int(bumps['years'])
+    years_down = max(years - d_years, 1)
+    k_down = (years - years_down) * step_year
+    k_up = d_years * step_year
+    n_down = n_steps - k_down
+    w_down = w * n_down / n_steps + np.sqrt(k_down * n_down / n_steps) * z[0]
+    w_up = w + np.sqrt(k_up) * z[1]
+
+    base_scenario = {'parameter': 'base', 'mu': mu, 'sigma': sigma, 'years': years, 'w': w}
+    scenarios = [
+        base_scenario,
+        {**base_scenario, 'parameter': 'mu', 'mu': mu - bumps['mu']},
+        {**base_scenario, 'parameter': 'mu', 'mu': mu + bumps['mu']},
+        {**base_scenario, 'parameter': 'sigma', 'sigma': max(sigma - bumps['sigma'], 0.0)},
+        {**base_scenario, 'parameter': 'sigma', 'sigma': sigma + bumps['sigma']},
+        {**base_scenario, 'parameter': 'years', 'years': years_down, 'w': w_down},
+        {**base_scenario, 'parameter': 'years', 'years': years + d_years, 'w': w_up},
+    ]
+
+    # Un'unica matrice (scenari x simulazioni) di log-rendimenti finali
+    s_mu = np.array([s['mu'] for s in scenarios])[:, None]
+    s_sigma = np.array([s['sigma'] for s in scenarios])[:, None]
+    s_years = np.array([s['years'] for s in scenarios], dtype=float)[:, None]
+    s_w = np.vstack([s['w'] for s in scenarios])
+
+    log_growth = (s_mu - 0.5 * s_sigma**2) * s_years + s_sigma * np.sqrt(DT) * s_w
+    final_values = S0 * np.exp(log_growth)
+    cagr = np.exp(log_growth / s_years) - 1
+
+    value_pct = np.percentile(final_values, REPORTED_PERCENTILES, axis=1)
+    cagr_pct = np.percentile(cagr, REPORTED_PERCENTILES, axis=1)
+
+    metrics = {}
+    for i, q in enumerate(REPORTED_PERCENTILES):
+        metrics[f'p{q}'] = value_pct[i]
+        metrics[f'cagr_p{q}'] = cagr_pct[i]
+
+    base = {name: float(values[0]) for name, values in metrics.items()}
+
+    tornado = {}
+    for name, values in metrics.items():
+        bars = []
+        for i_low in range(1, len(scenarios), 2):
+            i_high = i_low + 1
+            parameter = scenarios[i_low]['parameter']
+            span = scenarios[i_high][parameter] - scenarios[i_low][parameter]
+            low, high = float(values[i_low]), float(values[i_high])
+            bars.append({
+                'parameter': parameter,
+                'label': PARAMETER_LABELS[parameter],
+                'low': low,
+                'high': high,
+                'delta_low': low - base[name],
+                'delta_high': high - base[name],
+                # Derivata (differenza finita) per unità del parametro
+                'derivative': (high - low) / span if span > 0 else 0.0
+            })
+        bars.sort(key=lambda b: abs(b['high'] - b['low']), reverse=True)
+        tornado[name] = bars
+
+    return {
+        'bumps': bumps,
+        'base': base,
+        'metrics': tornado
+    }
+
+
+# Test
+if __name__ == "__main__":
+    import time
+    from monte_carlo_engine import run_monte_carlo_simulation
+
+    test_params = {
+        'capital': 400_000,
+        'mu': 0.0523,
+        'sigma': 0.0695,
+        'years': 30,
+        'n_sims': 10_000,
+        'seed': 42
+    }
+
+    results = run_monte_carlo_simulation(test_params)
+    start = time.perf_counter()
+    sensitivity = compute_sensitivity(terminal_shocks_from_paths(results, test_params), test_params)
+    elapsed = time.perf_counter() - start
+
+    print(f"Sensibilità calcolata in {elapsed*1000:.1f} ms")
+    for bar in sensitivity['metrics']['p50']:
+        print(f"  Mediana, {bar['label']}: {bar['delta_low']:+,.0f} / {bar['delta_high']:+,.0f}")
@@ -0,0 +1,352 @@
+"""
+simulation_pool.py
+Pool di processi di simulazione pre-forkati, separato dai worker HTTP.
+
+Il server del pool apre un socket Unix (multiprocessing.connection), prepara
+una volta sola le tabelle dei quantili più richieste e poi esegue il fork dei
+worker: le tabelle sono condivise copy-on-write e ogni worker accetta
+connessioni direttamente dal socket in ascolto (modello prefork, il kernel
+distribuisce le richieste al primo worker libero). Il numero di worker segue
+i core disponibili, indipendentemente da quanti worker HTTP usa gunicorn.
+
+Protocollo: il client invia i parametri della simulazione (piccoli, via
+pickle); il worker copia tutti gli array numpy del risultato in un unico
+blocco multiprocessing.shared_memory e risponde con la struttura del
+risultato in cui ogni array è sostituito da (offset, shape, dtype). Il client
+ricostruisce gli array come viste sul blocco, senza copie né pickle dei dati,
+li passa alla funzione che prepara la risposta e poi rilascia il blocco
+(close + unlink).
+
+Avvio:
+    python simulation_pool.py --socket /tmp/montecarlo_pool.sock --workers 4
+e per i worker HTTP:
+    MC_POOL_SOCKET=/tmp/montecarlo_pool.sock gunicorn web_app:app
+
+Senza MC_POOL_SOCKET (o con il pool non raggiungibile) le simulazioni girano
+nel processo web come prima.
+"""
+
+import argparse
+import logging
+import os
+import signal
+import sys
+import time
+from multiprocessing import AuthenticationError, get_context
+from multiprocessing.connection import Client, Listener
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from typing import Dict, Any
+
+from monte_carlo_engine import run_monte_carlo_simulation
+from quantile_table import QuantileTableCache
+from rebalancing_engine import run_rebalancing_simulation
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = '/tmp/montecarlo_pool.sock'
+
+# Tabelle dei quantili costruite prima del fork: seed dell'interfaccia,
+# n_sims e orizzonti più frequenti
+WARM_SEEDS = (42,)
+WARM_N_SIMS = (1_000, 5_000, 10_000)
+WARM_YEARS = (10, 20, 30, 40)
+
+# Allineamento degli array nel blocco condiviso (byte)
+_ALIGNMENT = 64
+
+# Pausa prima di riavviare un worker terminato in modo anomalo (secondi)
+_RESPAWN_DELAY = 1.0
+
+
+def available_cores() -> int:
+    """
+    Core utilizzabili da questo processo (affinità CPU se disponibile).
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def run_simulation(params: Dict[str, Any], tables: QuantileTableCache = None) -> Dict[str, Any]:
+    """
+    Sceglie il motore per i parametri: ribilanciamento multi-asset, tabella
+    dei quantili (se la richiesta lo consente) o simulazione standard.
+    """
+    if params.get('rebalancing'):
+        return run_rebalancing_simulation(params)
+    if tables is not None and tables.supports(params):
+        return tables.simulate(params)
+    return run_monte_carlo_simulation(params)
+
+
+# ========== TRASFERIMENTO IN MEMORIA CONDIVISA ==========
+
+def _create_segment(size: int) -> shared_memory.SharedMemory:
+    """
+    Blocco condiviso creato dal worker e rilasciato dal client: il resource
+    tracker del worker non deve rimuoverlo all'uscita.
+    """
+    try:
+        return shared_memory.SharedMemory(create=True, size=max(size, 1), track=False)
+    except TypeError:
+        # Python < 3.13: niente track=False, si annulla la registrazione
+        segment = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        resource_tracker.unregister(segment._name, 'shared_memory')
+        return segment
+
+
+def _collect_arrays(value, arrays: list):
+    """
+    Sostituisce ricorsivamente gli array numpy con un indice nella lista arrays.
+    """
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        arrays.append(value)
+        return ('__shm__', len(arrays) - 1)
+    if isinstance(value, dict):
+        return {k: _collect_arrays(v, arrays) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_collect_arrays(v, arrays) for v in value)
+    return value
+
+
+def pack_results(results: Dict[str, Any]) -> tuple:
+    """
+    Copia gli array del risultato in un blocco condiviso.
+
+    Returns:
+        (nome del blocco o None, struttura con descrittori al posto degli array)
+    """
+    arrays = []
+    skeleton = _collect_arrays(results, arrays)
+    if not arrays:
+        return None, skeleton
+
+    layout, offset = [], 0
+    for arr in arrays:
+        offset = -(-offset // _ALIGNMENT) * _ALIGNMENT
+        layout.append((offset, arr.shape, arr.dtype.str))
+        offset += arr.nbytes
+
+    segment = _create_segment(offset)
+    try:
+        for arr, (start, shape, dtype) in zip(arrays, layout):
+            np.ndarray(shape, dtype=dtype, buffer=segment.buf, offset=start)[...] = arr
+    finally:
+        segment.close()
+    return segment.name, {'layout': layout, 'results': skeleton}
+
+
+def _restore_arrays(value, arrays: list):
+    if isinstance(value, tuple) and len(value) == 2 and value[0] == '__shm__':
+        return arrays[value[1]]
+    if isinstance(value, dict):
+        return {k: _restore_arrays(v, arrays) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_restore_arrays(v, arrays) for v in value)
+    return value
+
+
+def attach_results(name: str, payload) -> tuple:
+    """
+    Ricostruisce il risultato con gli array come viste sul blocco condiviso.
+
+    Returns:
+        (blocco condiviso o None, risultato)
+    """
+    if name is None:
+        return None, payload
+    segment = shared_memory.SharedMemory(name=name)
+    arrays = [np.ndarray(shape, dtype=dtype, buffer=segment.buf, offset=start)
+              for start, shape, dtype in payload['layout']]
+    return segment, _restore_arrays(payload['results'], arrays)
+
+
+def release_segment(segment: shared_memory.SharedMemory):
+    """
+    Chiude e rimuove il blocco: le viste sugli array non devono più essere in uso.
+    """
+    if segment is None:
+        return
+    try:
+        segment.close()
+    except BufferError:
+        logger.warning("Viste sul blocco %s ancora in uso alla chiusura", segment.name)
+    segment.unlink()
+
+
+# ========== SERVER DEL POOL ==========
+
+def _handle(connection, tables: QuantileTableCache):
+    try:
+        params = connection.recv()
+    except EOFError:
+        return
+    try:
+        name, payload = pack_results(run_simulation(params, tables))
+    except Exception as e:
+        connection.send(('error', str(e), None))
+        return
+    try:
+        connection.send(('ok', name, payload))
+    except OSError:
+        # Client sparito: nessuno rilascerebbe il blocco
+        if name is not None:
+            shared_memory.SharedMemory(name=name).unlink()
+        raise
+
+
+def _worker_loop(listener: Listener, tables: QuantileTableCache):
+    """
+    Ciclo di un worker: accetta una connessione alla volta dal socket condiviso.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            connection = listener.accept()
+        except (OSError, AuthenticationError):
+            continue
+        with connection:
+            try:
+                _handle(connection, tables)
+            except OSError as e:
+                logger.warning("Connessione interrotta: %s", e)
+
+
+class SimulationPool:
+    """
+    Processo principale del pool: socket in ascolto, cache calde e worker pre-forkati.
+    """
+
+    def __init__(self, address: str = DEFAULT_SOCKET, workers: int = None,
+                 authkey: bytes = None, warm: bool = True):
+        self.address = address
+        self.n_workers = workers or available_cores()
+        self.authkey = authkey
+        self.warm = warm
+        self.tables = QuantileTableCache()
+        self.processes = []
+        self._stopping = False
+
+    def warm_up(self):
+        """
+        Costruisce le tabelle dei quantili più richieste prima del fork.
+        """
+        start = time.perf_counter()
+        for seed in WARM_SEEDS:
+            for n_sims in WARM_N_SIMS:
+                for years in WARM_YEARS:
+                    self.tables.get(seed, n_sims, years * 12)
+        print(f"🔥 {len(WARM_SEEDS) * len(WARM_N_SIMS) * len(WARM_YEARS)} tabelle dei quantili "
+              f"pronte in {time.perf_counter() - start:.1f}s")
+
+    def _spawn(self, listener: Listener):
+        process = get_context('fork').Process(target=_worker_loop, args=(listener, self.tables), daemon=True)
+        process.start()
+        return process
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        if self.warm:
+            self.warm_up()
+
+        listener = Listener(self.address, family='AF_UNIX', authkey=self.authkey)
+        os.chmod(self.address, 0o600)
+
+        def stop(signum, frame):
+            self._stopping = True
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.processes = [self._spawn(listener) for _ in range(self.n_workers)]
+        print(f"🚀 Pool di simulazione su {self.address}: {self.n_workers} worker "
+              f"(core disponibili: {available_cores()})")
+
+        try:
+            while not self._stopping:
+                time.sleep(0.5)
+                for i, process in enumerate(self.processes):
+                    if not process.is_alive() and not self._stopping:
+                        print(f"⚠️  Worker {process.pid} terminato (exit {process.exitcode}), riavvio")
+                        time.sleep(_RESPAWN_DELAY)
+                        self.processes[i] = self._spawn(listener)
+        finally:
+            for process in self.processes:
+                process.terminate()
+            for process in self.processes:
+                process.join(timeout=5)
+            listener.close()
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+            print("👋 Pool di simulazione arrestato")
+
+
+# ========== CLIENT (WORKER HTTP) ==========
+
+class PoolClient:
+    """
+    Invia le simulazioni al pool; se il pool non risponde le esegue nel processo.
+    """
+
+    def __init__(self, address: str = None, authkey: bytes = None,
+                 tables: QuantileTableCache = None):
+        self.address = address
+        self.authkey = authkey
+        self.tables = tables if tables is not None else QuantileTableCache()
+
+    @classmethod
+    def from_env(cls, tables: QuantileTableCache = None) -> 'PoolClient':
+        authkey = os.environ.get('MC_POOL_AUTHKEY')
+        return cls(address=os.environ.get('MC_POOL_SOCKET') or None,
+                   authkey=authkey.encode('utf-8') if authkey else None,
+                   tables=tables)
+
+    def run(self, params: Dict[str, Any], consume):
+        """
+        Esegue la simulazione e restituisce consume(risultati).
+
+        Con il pool gli array dei risultati sono viste sulla memoria condivisa,
+        valide solo durante consume: il valore restituito non deve contenerle
+        (liste, scalari o copie).
+        """
+        if self.address is None:
+            return consume(run_simulation(params, self.tables))
+
+        try:
+            with Client(self.address, family='AF_UNIX', authkey=self.authkey) as connection:
+                connection.send(params)
+                status, name, payload = connection.recv()
+        except (OSError, EOFError) as e:
+            logger.warning("Pool di simulazione non raggiungibile (%s): esecuzione locale", e)
+            return consume(run_simulation(params, self.tables))
+
+        if status != 'ok':
+            raise ValueError(name)
+        segment, results = attach_results(name, payload)
+        try:
+            return consume(results)
+        finally:
+            del results
+            release_segment(segment)
+
+def main():
+    parser = argparse.ArgumentParser(description="Pool di processi di simulazione Monte Carlo")
+    parser.add_argument('--socket', default=os.environ.get('MC_POOL_SOCKET', DEFAULT_SOCKET),
+                        help="percorso del socket Unix")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="numero di worker (default: core disponibili)")
+    parser.add_argument('--no-warm', action='store_true', help="non precalcolare le tabelle dei quantili")
+    args = parser.parse_args()
+
+    authkey = os.environ.get('MC_POOL_AUTHKEY')
+    SimulationPool(args.socket, args.workers, authkey.encode('utf-8') if authkey else None,
+                   warm=not args.no_warm).serve_forever()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""
+sketches.py
+Riassunti fondibili (mergeable) delle simulazioni: statistiche calcolate su
+blocchi o processi diversi e poi combinate senza tenere in memoria i valori.
+
+    - KLLSketch: quantili approssimati (compattatori KLL, Karnin-Lang-Liberty
+      2016) con limite di errore sul rango calcolato esattamente
+    - Moments: conteggio, media e varianza (formula di Chan per la fusione)
+    - GridHistogram: istogramma su una griglia fissa (stessa larghezza dei bin
+      del motore), fusione per somma dei conteggi
+    - PathSummary: tutto quello che serve al grafico e alla tabella per un
+      insieme di traiettorie (percentili nel tempo, finali, statistiche,
+      distribuzione del CAGR, campione casuale), serializzabile in binario
+
+Errore del KLLSketch: finché non c'è stata compattazione i quantili sono
+esatti (stessa interpolazione di np.percentile). Ogni compattazione di un
+livello con peso w (ordinamento, tenuto un elemento ogni 2^j con peso
+moltiplicato per 2^j) sposta il rango stimato di qualunque valore al massimo
+di w·(2^j - 1); la somma di questi contributi, anche attraverso le fusioni, è
+il limite garantito `rank_error` (in frazione di n), riportato con i risultati.
+"""
+
+import io
+
+import numpy as np
+
+
+# Dimensione dei compattatori: più grande = più preciso e più memoria
+# (capacità totale circa 3·k valori per sketch)
+DEFAULT_K = 1000
+TERMINAL_K = 4000
+
+# Riduzione della capacità per ogni livello sotto il più alto (KLL)
+_CAPACITY_DECAY = 2 / 3
+
+
+class KLLSketch:
+    """
+    Sketch dei quantili a compattatori: livello h contiene valori di peso 2^h.
+    """
+
+    def __init__(self, k: int = DEFAULT_K):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self.offsets = [0]          # scelta alternata pari/dispari per livello
+        self.error = 0.0            # limite sull'errore di rango (pesi assoluti)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * _CAPACITY_DECAY ** depth)), 2)
+
+    def _compact(self, level: int):
+        items = np.sort(self.levels[level])
+        # Salto di più livelli in un colpo per i blocchi molto grandi: fino al
+        # primo livello in cui gli elementi promossi stanno nella capacità
+        jump = 1
+        while len(items) >> jump > self._capacity(min(level + jump, len(self.levels) - 1)):
+            jump += 1
+        stride = 1 << jump
+        usable = len(items) - len(items) % stride
+
+        offset = self.offsets[level] % stride
+        self.offsets[level] += 1
+        promoted = items[offset:usable:stride]
+
+        target = level + jump
+        while len(self.levels) <= target:
+            self.levels.append(np.empty(0))
+            self.offsets.append(0)
+        self.levels[target] = np.concatenate([self.levels[target], promoted])
+        self.levels[level] = items[usable:].copy()   # non trattenere il blocco ordinato
+        self.error += (1 << level) * (stride - 1)
+
+    def _compress(self):
+        while True:
+            over = [h for h in range(len(self.levels)) if len(self.levels[h]) > self._capacity(h)]
+            if not over:
+                return
+            self._compact(over[0])
+
+    def update(self, values) -> 'KLLSketch':
+        values = np.asarray(values, dtype=float).ravel()
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.n += len(values)
+        self._compress()
+        return self
+
+    def merge(self, other: 'KLLSketch') -> 'KLLSketch':
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+            self.offsets.append(0)
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+            self.offsets[h] += other.offsets[h]
+        self.n += other.n
+        self.error += other.error
+        self._compress()
+        return self
+
+    @property
+    def exact(self) -> bool:
+        return self.error == 0
+
+    @property
+    def rank_error(self) -> float:
+        """
+        Limite garantito dell'errore sul rango normalizzato (0 = esatto).
+        """
+        return self.error / self.n if self.n else 0.0
+
+    def quantiles(self, percentiles) -> np.ndarray:
+        """
+        Valori ai percentili richiesti (0-100). Esatti come np.percentile
+        finché lo sketch non ha compattato.
+        """
+        if self.n == 0:
+            return np.full(len(np.atleast_1d(percentiles)), np.nan)
+        if self.exact:
+            return np.percentile(self.levels[0], percentiles)
+
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), float(1 << h)) for h, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        values, cumulative = values[order], np.cumsum(weights[order])
+        # Inversa della CDF pesata
+        ranks = np.asarray(percentiles, dtype=float) / 100 * cumulative[-1]
+        idx = np.minimum(np.searchsorted(cumulative, ranks, side='left'), len(values) - 1)
+        return values[idx]
+
+    def state(self) -> dict:
+        return {'k': self.k, 'n': self.n, 'error': self.error,
+                'offsets': np.asarray(self.offsets, dtype=np.int64),
+                'sizes': np.asarray([len(items) for items in self.levels], dtype=np.int64),
+                'values': np.concatenate(self.levels)}
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'KLLSketch':
+        sketch = cls(int(state['k']))
+        sketch.n = int(state['n'])
+        sketch.error = float(state['error'])
+        sketch.offsets = [int(o) for o in state['offsets']]
+        bounds = np.cumsum(np.concatenate([[0], state['sizes']]))
+        sketch.levels = [np.asarray(state['values'][a:b], dtype=float) for a, b in zip(bounds[:-1], bounds[1:])]
+        return sketch
+
+
+class Moments:
+    """
+    Conteggio, media e somma dei quadrati degli scarti (M2), fondibili.
+    """
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, values) -> 'Moments':
+        values = np.asarray(values, dtype=float)
+        if len(values):
+            self.merge(Moments(len(values), float(values.mean()), float(((values - values.mean()) ** 2).sum())))
+        return self
+
+    def merge(self, other: 'Moments') -> 'Moments':
+        count = self.count + other.count
+        if count == 0:
+            return self
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        return self
+
+    @property
+    def std(self) -> float:
+        """
+        Deviazione standard campionaria (ddof=1, come np.std(..., ddof=1)).
+        """
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else float('nan')
+
+
+class GridHistogram:
+    """
+    Istogramma su bin [i·width, (i+1)·width): conteggi per indice di bin.
+    """
+
+    def __init__(self, width: float):
+        self.width = width
+        self.start = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def _extend(self, start: int, stop: int):
+        if len(self.counts) == 0:
+            self.start, self.counts = start, np.zeros(stop - start, dtype=np.int64)
+            return
+        new_start = min(start, self.start)
+        new_stop = max(stop, self.start + len(self.counts))
+        if new_start == self.start and new_stop == self.start + len(self.counts):
+            return
+        counts = np.zeros(new_stop - new_start, dtype=np.int64)
+        counts[self.start - new_start:self.start - new_start + len(self.counts)] = self.counts
+        self.start, self.counts = new_start, counts
+
+    def update(self, values) -> 'GridHistogram':
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return self
+        bins = np.floor(values / self.width).astype(np.int64)
+        low, high = int(bins.min()), int(bins.max())
+        self._extend(low, high + 1)
+        self.counts += np.bincount(bins - self.start, minlength=len(self.counts))
+        return self
+
+    def merge(self, other: 'GridHistogram') -> 'GridHistogram':
+        if len(other.counts):
+            self._extend(other.start, other.start + len(other.counts))
+            offset = other.start - self.start
+            self.counts[offset:offset + len(other.counts)] += other.counts
+        return self
+
+    def distribution(self) -> dict:
+        """
+        Frazioni per bin con i centri, nello stesso formato di 'distribution' del motore.
+        """
+        total = self.counts.sum()
+        centers = (np.arange(len(self.counts)) + self.start + 0.5) * self.width
+        return {'x': centers.tolist(), 'y': (self.counts / max(total, 1)).tolist()}
+
+
+class PathSummary:
+    """
+    Riassunto fondibile di un insieme di traiettorie con lo stesso asse temporale.
+
+    Percentili nel tempo da uno sketch per passo, valori finali da uno sketch
+    più preciso, media/deviazione dei valori finali, istogramma del CAGR e un
+    campione casuale bottom-k con le traiettorie complete.
+    """
+
+    def __init__(self, n_steps: int, capital: float, years: float, sample_paths: int = 0,
+                 k: int = DEFAULT_K, terminal_k: int = TERMINAL_K, cagr_width: float = 0.002):
+        self.n_steps = n_steps
+        self.capital = capital
+        self.years = years
+        self.sample_paths = sample_paths
+        self.steps = [KLLSketch(k) for _ in range(n_steps + 1)]
+        self.terminal = KLLSketch(terminal_k)
+        self.moments = Moments()
+        self.cagr = GridHistogram(cagr_width)
+        self.sample_keys = np.empty(0)
+        self.sample_values = np.empty((0, n_steps + 1))
+
+    def update_step(self, step: int, values: np.ndarray):
+        self.steps[step].update(values)
+
+    def update_final(self, values: np.ndarray):
+        self.terminal.update(values)
+        self.moments.update(values)
+        self.cagr.update((values / self.capital) ** (1 / self.years) - 1)
+
+    def offer_samples(self, keys: np.ndarray, paths: np.ndarray):
+        """
+        Traiettorie candidate al campione con le loro chiavi casuali (bottom-k).
+        """
+        keys = np.concatenate([self.sample_keys, keys])
+        paths = np.concatenate([self.sample_values, paths])
+        if len(keys) > self.sample_paths:
+            keep = np.argsort(keys, kind='stable')[:self.sample_paths]
+            keys, paths = keys[keep], paths[keep]
+        self.sample_keys, self.sample_values = keys, paths
+
+    def merge(self, other: 'PathSummary') -> 'PathSummary':
+        for mine, theirs in zip(self.steps, other.steps):
+            mine.merge(theirs)
+        self.terminal.merge(other.terminal)
+        self.moments.merge(other.moments)
+        self.cagr.merge(other.cagr)
+        self.offer_samples(other.sample_keys, other.sample_values)
+        return self
+
+    @property
+    def n_sims(self) -> int:
+        return self.moments.count
+
+    def rank_errors(self) -> dict:
+        """
+        Limiti garantiti dell'errore di rango (frazione di n_sims).
+        """
+        return {'terminal': self.terminal.rank_error,
+                'time': max(sketch.rank_error for sketch in self.steps)}
+
+    def results(self, percentiles_time, percentiles_final) -> dict:
+        """
+        Risultati con le stesse chiavi del motore standard (senza 'paths';
+        nessuna traiettoria rappresentativa, che richiederebbe un secondo passaggio).
+        """
+        bands = np.array([sketch.quantiles(percentiles_time) for sketch in self.steps])
+        final = self.terminal.quantiles(percentiles_final)
+        cagr = (final / self.capital) ** (1 / self.years) - 1
+        order = np.argsort(self.sample_keys, kind='stable')
+        return {
+            'time': np.linspace(0, self.years, self.n_steps + 1),
+            'percentiles_time': {f'p{q}': bands[:, i] for i, q in enumerate(percentiles_time)},
+            'percentiles_final': {f'p{q}': float(v) for q, v in zip(percentiles_final, final)},
+            'stats': {
+                'mean': self.moments.mean,
+                'std': self.moments.std,
+                **{f'cagr_p{q}': float(v) for q, v in zip(percentiles_final, cagr)}
+            },
+            'n_sims': self.n_sims,
+            'distribution': self.cagr.distribution(),
+            'sample_paths': {'representative': {}, 'random': self.sample_values[order]},
+            'sketch': {'rank_error': self.rank_errors()}
+        }
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializzazione binaria (npz) per il trasferimento fra processi o nodi.
+        """
+        arrays = {
+            'meta': np.array([self.n_steps, self.capital, self.years, self.sample_paths,
+                              self.cagr.width, self.cagr.start]),
+            'moments': np.array([self.moments.count, self.moments.mean, self.moments.m2]),
+            'cagr_counts': self.cagr.counts,
+            'sample_keys': self.sample_keys,
+            'sample_values': self.sample_values
+        }
+        for name, sketch in [('terminal', self.terminal)] + [(f'step{i}', s) for i, s in enumerate(self.steps)]:
+            state = sketch.state()
+            arrays[f'{name}_header'] = np.array([state['k'], state['n'], state['error']])
+            arrays[f'{name}_offsets'] = state['offsets']
+            arrays[f'{name}_sizes'] = state['sizes']
+            arrays[f'{name}_values'] = state['values']
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'PathSummary':
+        with np.load(io.BytesIO(data)) as arrays:
+            n_steps, capital, years, sample_paths, width, start = arrays['meta']
+            summary = cls(int(n_steps), float(capital), float(years), int(sample_paths), cagr_width=float(width))
+            count, mean, m2 = arrays['moments']
+            summary.moments = Moments(int(count), float(mean), float(m2))
+            summary.cagr.start = int(start)
+            summary.cagr.counts = arrays['cagr_counts']
+            summary.sample_keys = arrays['sample_keys']
+            summary.sample_values = arrays['sample_values']
+
+            def sketch(name):
+                k, n, error = arrays[f'{name}_header']
+                return KLLSketch.from_state({'k': k, 'n': n, 'error': error,
+                                             'offsets': arrays[f'{name}_offsets'],
+                                             'sizes': arrays[f'{name}_sizes'],
+                                             'values': arrays[f'{name}_values']})
+            summary.terminal = sketch('terminal')
+            summary.steps = [sketch(f'step{i}') for i in range(summary.n_steps + 1)]
+        return summary
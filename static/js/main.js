@@ -273,6 +273,33 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     });
 
+    // -- SCENARI DI STRESS --
+    // L'importance sampling delle code vale solo per il GBM di un singolo asset:
+    // con GARCH/regimi o con una politica di ribilanciamento il selettore è disattivato
+    function tailSamplingAvailable(suffix) {
+        const modelEl = document.getElementById(`model${suffix}`);
+        const rebalancingEl = suffix === '-alloc' ? document.getElementById('rebalancing-alloc') : null;
+        const model = modelEl && modelEl.value ? modelEl.value : 'gbm';
+        return model === 'gbm' && !(rebalancingEl && rebalancingEl.value);
+    }
+
+    function syncTailSelect(suffix) {
+        const tailEl = document.getElementById(`tail${suffix}`);
+        if (!tailEl) return;
+        const available = tailSamplingAvailable(suffix);
+        if (!available) tailEl.value = '';
+        tailEl.disabled = !available;
+    }
+
+    ['-alloc', '-manual'].forEach(suffix => {
+        const ids = [`model${suffix}`].concat(suffix === '-alloc' ? ['rebalancing-alloc'] : []);
+        ids.forEach(id => {
+            const el = document.getElementById(id);
+            if (el) el.addEventListener('change', () => syncTailSelect(suffix));
+        });
+        syncTailSelect(suffix);
+    });
+
     // -- LAZY PORTFOLIO LOGIC --
     const lazySelect = document.getElementById('lazy-portfolios');
     if (lazySelect) {
@@ -384,11 +411,13 @@ document.addEventListener('DOMContentLoaded', () => {
             for (let i = 0; i < w.length; i++) {
                 for (let j = 0; j < w.length; j++) {
                     let rho = 0;
-                    if (corrKeys[i] && corrKeys[j]) {
-                        // Check correlation availability (symmetric)
-                        if (assetData.correlations && assetData.correlations[corrKeys[i]]) {
-                            rho = assetData.correlations[corrKeys[i]][corrKeys[j]] || 0;
-                        }
+                    // Current exports index correlations by asset key, older ones by name
+                    const corrs = assetData.correlations || {};
+                    const keyI = ASSETS[i].key, keyJ = ASSETS[j].key;
+                    if (corrs[keyI] && corrs[keyI][keyJ] !== undefined) {
+                        rho = corrs[keyI][keyJ] || 0;
+                    } else if (corrKeys[i] && corrKeys[j] && corrs[corrKeys[i]]) {
+                        rho = corrs[corrKeys[i]][corrKeys[j]] || 0;
                     }
                     // If i==j rho is 1
                     if (i === j) rho = 1;
@@ -481,6 +510,14 @@ document.addEventListener('DOMContentLoaded', () => {
                 n_sims: simsEl ? simsEl.value : 1000
             };
 
+            // Modello dei rendimenti (GBM, GARCH, regimi): solo senza ribilanciamento per asset
+            const modelEl = document.getElementById(`model${suffix}`);
+            if (modelEl && modelEl.value) data.model = modelEl.value;
+
+            // Scenari di stress (p1, p0.1) con importance sampling: solo GBM senza ribilanciamento
+            const tailEl = document.getElementById(`tail${suffix}`);
+            if (tailEl && tailEl.value && tailSamplingAvailable(suffix)) data.tail_sampling = true;
+
             if (currentMode === 'params') {
                 const muEl = document.getElementById('mu');
                 const sigmaEl = document.getElementById('sigma');
@@ -489,6 +526,31 @@ document.addEventListener('DOMContentLoaded', () => {
             } else {
                 data.mu = form.dataset.calcMu;
                 data.sigma = form.dataset.calcSigma;
+
+                const allocationWeights = () => {
+                    const weights = {};
+                    for (let asset of ASSETS) {
+                        const el = document.getElementById(`weight-${asset.id}`);
+                        if (el) weights[asset.key] = parseFloat(el.value) || 0;
+                    }
+                    return weights;
+                };
+
+                // Finestra storica: mu/sigma ricalcolati dal server sulle statistiche precalcolate
+                const lookbackEl = document.getElementById('lookback-alloc');
+                if (lookbackEl && lookbackEl.value) {
+                    data.lookback = lookbackEl.value;
+                    data.weights = allocationWeights();
+                }
+
+                // Politica di ribilanciamento: simulazione per asset sul server
+                const rebalancingEl = document.getElementById('rebalancing-alloc');
+                if (rebalancingEl && rebalancingEl.value) {
+                    const costEl = document.getElementById('cost-alloc');
+                    data.rebalancing = rebalancingEl.value;
+                    data.transaction_cost = costEl ? parseFloat(costEl.value) || 0 : 0;
+                    data.weights = allocationWeights();
+                }
             }
 
             const response = await fetch('/simulate', {
@@ -513,7 +575,17 @@ document.addEventListener('DOMContentLoaded', () => {
             if (emptyRow) emptyRow.style.display = 'none';
             if (downloadBtn) downloadBtn.disabled = false;
 
-            updateStatus('Simulazione completata!', 'success');
+            const notes = [];
+            if (result.inputs) {
+                const mu = (result.inputs.mu * 100).toFixed(2);
+                const sigma = (result.inputs.sigma * 100).toFixed(2);
+                notes.push(`ultimi ${result.inputs.lookback} anni: μ ${mu}%, σ ${sigma}%`);
+            }
+            if (result.rebalancing) {
+                const turnover = (result.rebalancing.turnover_per_year * 100).toFixed(1);
+                notes.push(`${result.rebalancing.rebalances.toFixed(0)} ribilanciamenti medi, turnover ${turnover}%/anno`);
+            }
+            updateStatus(notes.length ? `Simulazione completata! (${notes.join('; ')})` : 'Simulazione completata!', 'success');
 
         } catch (error) {
             console.error(error);
@@ -749,6 +821,7 @@ ${100 - p}% dei casi sopra questo valore
                 <td><strong>${row.value_formatted}</strong></td>
                 <td style="color: ${isPos ? '#16a34a' : '#dc2626'}">${row.variation}</td>
                 <td>${row.cagr_formatted}</td>
+                <td style="color: #dc2626">${row.max_drawdown_formatted || '-'}</td>
             `;
             tbody.appendChild(tr);
         });
@@ -0,0 +1,206 @@
+"""
+tail_sampling.py
+Percentili di coda estrema (1°, 0,1°) con importance sampling.
+
+Con il campionamento diretto il percentile 0,1 su 10.000 traiettorie dipende
+da circa 10 valori: la stima cambia sensibilmente da un seed all'altro e
+servirebbero centinaia di migliaia di traiettorie per stabilizzarla. Qui gli
+shock sono estratti da una distribuzione spostata verso la coda sfavorevole e
+ogni traiettoria viene pesata con il rapporto di verosimiglianza, in modo che
+le stime restino corrette per la distribuzione originale.
+
+Nel GBM il valore finale dipende dagli shock solo tramite lo shock totale
+standardizzato W = Σ Z_t / √n. Spostando la media di ogni Z_t di a / √n lo
+shock totale diventa N(a, 1) e il rapporto di verosimiglianza dipende solo
+da W: p(W) / q_a(W) = exp(-a·W + a²/2). Si usa una miscela a quote fisse
+(multiple importance sampling con euristica di bilanciamento):
+    - una componente non spostata (difensiva: limita i pesi ovunque)
+    - una componente centrata su ciascun percentile di coda richiesto,
+      a = Φ⁻¹(p)
+con peso w(W) = 1 / Σ_k quota_k · exp(a_k·W - a_k²/2). I percentili sono
+quelli della CDF empirica pesata; la dimensione campionaria effettiva (ESS,
+di Kish: (Σw)² / Σw²) è riportata sia sull'intero campione sia sulle
+traiettorie sotto ciascun percentile, che sono quelle da cui dipende la stima.
+
+Con 10.000 traiettorie la deviazione standard della stima del percentile 0,1
+è oltre dieci volte più piccola che con il campionamento diretto sullo stesso
+numero di traiettorie (equivalente a oltre un milione di traiettorie non
+pesate); i percentili del massimo drawdown migliorano in misura minore.
+Vale solo per il GBM: con GARCH o regimi il rapporto di verosimiglianza non
+dipende dal solo shock totale.
+"""
+
+import numpy as np
+from statistics import NormalDist
+from typing import Dict, Any
+
+
+# Percentili di coda stimati con importance sampling (tabella scenari)
+TAIL_PERCENTILES = (1, 0.1)
+
+# Quota di traiettorie non spostate nella miscela
+DEFENSIVE_SHARE = 0.2
+
+# Traiettorie minime della simulazione di coda (stime stabili del percentile 0,1)
+DEFAULT_TAIL_SIMS = 10_000
+
+
+def percentile_label(q: float) -> str:
+    """
+    Chiave del percentile nei risultati: 1 -> 'p1', 0.1 -> 'p0.1', 99.9 -> 'p99.9'.
+    """
+    return f'p{q:g}'
+
+
+def mixture_shifts(percentiles: tuple = TAIL_PERCENTILES) -> tuple:
+    """
+    Componenti della miscela: spostamenti dello shock totale W e quote.
+
+    Returns:
+        (shifts, shares): componente difensiva (spostamento 0) più una
+        centrata su ogni percentile, con quote uguali per le componenti spostate
+    """
+    normal = NormalDist()
+    shifts = np.array([0.0] + [normal.inv_cdf(q / 100) for q in percentiles])
+    shares = np.array([DEFENSIVE_SHARE] + [(1 - DEFENSIVE_SHARE) / len(percentiles)] * len(percentiles))
+    return shifts, shares
+
+
+def likelihood_ratio(w_total: np.ndarray, shifts: np.ndarray, shares: np.ndarray) -> np.ndarray:
+    """
+    Peso di ogni traiettoria: densità originale di W su densità della miscela.
+    """
+    density = np.zeros_like(w_total)
+    for shift, share in zip(shifts, shares):
+        density += share * np.exp(shift * w_total - 0.5 * shift**2)
+    return 1.0 / density
+
+
+def weighted_percentiles(values: np.ndarray, weights: np.ndarray, percentiles) -> np.ndarray:
+    """
+    Percentili della CDF empirica pesata (primo valore con CDF ≥ q).
+
+    Args:
+        values: valori campionati
+        weights: pesi (non normalizzati)
+        percentiles: percentili in [0, 100]
+    """
+    order = np.argsort(values)
+    cdf = np.cumsum(weights[order])
+    cdf /= cdf[-1]
+    positions = np.searchsorted(cdf, np.asarray(percentiles, dtype=float) / 100)
+    return values[order][np.minimum(positions, len(values) - 1)]
+
+
+def effective_sample_size(weights: np.ndarray) -> float:
+    """
+    Dimensione campionaria effettiva di Kish: (Σw)² / Σw².
+    """
+    if len(weights) == 0:
+        return 0.0
+    return float(weights.sum()**2 / np.square(weights).sum())
+
+
+def run_tail_sampling(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Simulazione GBM con shock spostati verso la coda sfavorevole e stime
+    pesate dei percentili estremi del valore finale, del CAGR e del massimo
+    drawdown (percentili complementari, es. p99.9 per lo scenario 0,1%).
+
+    Args:
+        params: parametri di run_monte_carlo_simulation più, opzionali:
+            - tail_sims: traiettorie della simulazione di coda
+              (default max(n_sims, DEFAULT_TAIL_SIMS))
+            - tail_percentiles: percentili da stimare (default TAIL_PERCENTILES)
+
+    Returns:
+        dizionario con:
+            - percentiles_final: {'p1': ..., 'p0.1': ...} valori finali
+            - stats: {'cagr_p1': ..., 'cagr_p0.1': ...}
+            - max_drawdown: {'p99': ..., 'p99.9': ...}
+            - n_sims: traiettorie simulate
+            - ess: dimensione campionaria effettiva sull'intero campione
+            - ess_tail: ESS delle traiettorie sotto ciascun percentile
+            - shifts, shares: componenti della miscela (spostamenti di W e quote)
+    """
+    S0 = params['capital']
+    mu = params['mu']
+    sigma = params['sigma']
+    T = params['years']
+    percentiles = tuple(params.get('tail_percentiles', TAIL_PERCENTILES))
+    n_sims = int(params.get('tail_sims') or max(int(params['n_sims']), DEFAULT_TAIL_SIMS))
+    rng = np.random.default_rng(params.get('seed'))
+
+    dt = 1/12
+    n_steps = int(T / dt)
+    drift = (mu - 0.5 * sigma**2) * dt
+    diffusion = sigma * np.sqrt(dt)
+
+    # Componenti assegnate a quote fisse (l'ultima assorbe gli arrotondamenti)
+    shifts, shares = mixture_shifts(percentiles)
+    counts = np.floor(shares * n_sims).astype(np.int64)
+    counts[-1] += n_sims - counts.sum()
+    step_shift = np.repeat(shifts, counts) / np.sqrt(n_steps)
+
+    # Un passo alla volta: memoria O(n_sims), massimo drawdown sul log-valore
+    shock_sum = np.zeros(n_sims)
+    log_growth = np.zeros(n_sims)
+    log_peak = np.zeros(n_sims)
+    max_log_drawdown = np.zeros(n_sims)
+    for _ in range(n_steps):
+        Z = rng.standard_normal(n_sims)
+        Z += step_shift
+        shock_sum += Z
+        log_growth += drift + diffusion * Z
+        np.maximum(log_peak, log_growth, out=log_peak)
+        np.maximum(max_log_drawdown, log_peak - log_growth, out=max_log_drawdown)
+
+    weights = likelihood_ratio(shock_sum / np.sqrt(n_steps), shifts, shares)
+    final_values = S0 * np.exp(log_growth)
+    max_drawdown = -np.expm1(-max_log_drawdown)
+
+    values = weighted_percentiles(final_values, weights, percentiles)
+    drawdowns = weighted_percentiles(max_drawdown, weights, [100 - q for q in percentiles])
+    cagr = (values / S0) ** (1 / T) - 1
+
+    return {
+        'percentiles_final': {percentile_label(q): float(v) for q, v in zip(percentiles, values)},
+        'stats': {f'cagr_{percentile_label(q)}': float(c) for q, c in zip(percentiles, cagr)},
+        'max_drawdown': {percentile_label(100 - q): float(d) for q, d in zip(percentiles, drawdowns)},
+        'n_sims': n_sims,
+        'ess': effective_sample_size(weights),
+        'ess_tail': {percentile_label(q): effective_sample_size(weights[final_values <= v])
+                     for q, v in zip(percentiles, values)},
+        'shifts': shifts.tolist(),
+        'shares': shares.tolist()
+    }
+
+
+# Confronto con il campionamento diretto sugli stessi parametri
+if __name__ == "__main__":
+    import time
+
+    test_params = {'capital': 400_000, 'mu': 0.0523, 'sigma': 0.0695, 'years': 30, 'n_sims': 10_000}
+    normal = NormalDist()
+    n_steps = 360
+    drift = (test_params['mu'] - 0.5 * test_params['sigma']**2) * test_params['years']
+    scale = test_params['sigma'] * np.sqrt(test_params['years'])
+
+    print("📐 Percentile 0,1 del valore finale su 20 seed (10.000 traiettorie)")
+    exact = test_params['capital'] * np.exp(drift + scale * normal.inv_cdf(0.001))
+    weighted, direct = [], []
+    start = time.perf_counter()
+    for seed in range(20):
+        tail = run_tail_sampling({**test_params, 'seed': seed})
+        weighted.append(tail['percentiles_final']['p0.1'])
+    elapsed = (time.perf_counter() - start) / 20
+    for seed in range(20):
+        rng = np.random.default_rng(seed)
+        W = rng.standard_normal((10_000, n_steps)).sum(axis=1) / np.sqrt(n_steps)
+        direct.append(np.percentile(test_params['capital'] * np.exp(drift + scale * W), 0.1))
+
+    print(f"   valore esatto:          €{exact:>12,.0f}")
+    print(f"   importance sampling:    €{np.mean(weighted):>12,.0f} ± {np.std(weighted):,.0f}  ({elapsed*1000:.0f} ms)")
+    print(f"   campionamento diretto:  €{np.mean(direct):>12,.0f} ± {np.std(direct):,.0f}")
+    print(f"   ESS totale {tail['ess']:,.0f}, in coda p1 {tail['ess_tail']['p1']:,.0f}, "
+          f"p0.1 {tail['ess_tail']['p0.1']:,.0f}")
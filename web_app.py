@@ -1,17 +1,48 @@
 from flask import Flask, render_template, request, jsonify
 import json
-import plotly
-from monte_carlo_engine import run_monte_carlo_simulation
-from chart_generator import create_monte_carlo_chart
-from data_formatter import prepare_plotly_data, create_summary_table
+import os
+import numpy as np
+from quantile_table import QuantileTableCache
+from simulation_pool import PoolClient
+from chart_generator import monte_carlo_figure, WEB_TEMPLATE
+from data_formatter import prepare_plotly_data, create_summary_table, format_goals
+from asset_store import AssetDataStore
+from portfolio_model import efficient_frontier
+from return_models import validate_model_params
+from request_profiler import RequestProfiler
+from sensitivity_analysis import compute_sensitivity, terminal_shocks_from_paths
 
 app = Flask(__name__)
 
+# Dataset asset in memoria (modello di covarianza e statistiche per finestra),
+# ricaricato a caldo quando fetch_returns.py pubblica una nuova versione
+ASSET_STORE = AssetDataStore(
+    os.path.join(app.static_folder, 'asset_data.json'),
+    os.path.join(app.static_folder, 'asset_stats.npz')
+)
+
+# Tabelle dei quantili per (seed, n_sims, anni): risultati del motore standard
+# senza simulare (le metriche di percorso sugli shock rigenerati)
+QUANTILE_TABLES = QuantileTableCache()
+
+# Pool di simulazione separato (MC_POOL_SOCKET); senza pool si simula nel processo
+SIMULATOR = PoolClient.from_env(tables=QUANTILE_TABLES)
+
+# Profilazione su richiesta (MC_PROFILING=1 + header X-Profile da IP autorizzati)
+PROFILER = RequestProfiler.from_env()
+PROFILER.init_app(app)
+
+@app.before_request
+def start_asset_watcher():
+    ASSET_STORE.ensure_watcher()
+
 @app.route('/')
 def index():
-    return render_template('index.html')
+    # Finestra storica solo se fetch_returns.py ha prodotto asset_stats.npz
+    return render_template('index.html', window_stats_available=ASSET_STORE.window_stats is not None)
 
 @app.route('/simulate', methods=['POST'])
+@PROFILER.profiled
 def simulate():
     try:
         # Get parameters from request
@@ -22,26 +53,129 @@ def simulate():
             'sigma': float(data.get('sigma', 6.95)) / 100, # Convert percentage to decimal
             'years': int(data.get('years', 30)),
             'n_sims': int(data.get('n_sims', 1000)),
-            'seed': 42 # Optional: make this random or user-selectable? For now fixed for reproducibility as per original
+            'seed': 42, # Optional: make this random or user-selectable? For now fixed for reproducibility as per original
+            'streaming': _flag(data, 'streaming', False),  # motore a memoria limitata
+            'targets': [float(t) for t in data.get('targets') or []],  # obiettivi di capitale (€)
+            'risk': _flag(data, 'risk', True),  # drawdown, VaR/CVaR (metriche di percorso)
+            'model': data.get('model') or 'gbm',  # modello dei rendimenti (gbm, garch, regime)
+            'model_params': data.get('model_params') or {},
+            'tail_sampling': _flag(data, 'tail_sampling', False)  # p1 e p0.1 con importance sampling
         }
+        params['model_params'] = validate_model_params(params['model'], params['model_params'])
 
-        # Run simulation
-        results = run_monte_carlo_simulation(params)
-        
-        # Prepare chart
-        plotly_data = prepare_plotly_data(results)
-        fig = create_monte_carlo_chart(plotly_data, params)
-        graphJSON = json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
-        
-        # Prepare table
-        table_data = create_summary_table(results, params['capital'])
-        
-        return jsonify({
-            'status': 'success',
-            'chart': graphJSON,
-            'table': table_data,
-            'distribution': results.get('distribution')
-        })
+        # Lookback: mu/sigma del portafoglio dalle statistiche precalcolate della finestra
+        inputs = None
+        if data.get('lookback') is not None:
+            window_stats = ASSET_STORE.window_stats
+            if window_stats is None:
+                raise ValueError("Statistiche per finestra non disponibili: eseguire fetch_returns.py")
+            inputs = window_stats.portfolio_inputs(data.get('weights'), data['lookback'], data.get('as_of'))
+            params['mu'] = inputs['mu']
+            params['sigma'] = inputs['sigma']
+
+        # Ribilanciamento: simulazione per asset sui pesi dell'allocazione
+        # (senza politica: GBM unico del portafoglio, ribilanciamento continuo)
+        if data.get('rebalancing'):
+            params.update(_rebalancing_params(data))
+
+        # Simulazione nel pool dedicato (se configurato) o nel processo
+        response = SIMULATOR.run(params, lambda results: _simulation_response(results, params, data))
+        response['inputs'] = inputs
+        return jsonify(response)
+
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+def _simulation_response(results: dict, params: dict, data: dict) -> dict:
+    """
+    Grafico, tabella e metriche della risposta di /simulate. Restituisce solo
+    dati serializzabili (liste e scalari): gli array di results possono essere
+    viste sulla memoria condivisa del pool, valide solo durante questa chiamata.
+    """
+    # Prepare chart
+    plotly_data = prepare_plotly_data(results)
+    fig = monte_carlo_figure(plotly_data, params, template=WEB_TEMPLATE)
+    graphJSON = json.dumps(fig)
+
+    # Prepare table
+    table_data = create_summary_table(results, params['capital'])
+
+    # Sensibilità a mu/sigma/anni (tornado), sugli stessi shock della simulazione
+    # (la ricostruzione degli shock totali dai valori finali vale solo per il GBM
+    # di un singolo asset: esclusi i modelli GARCH/regimi e il ribilanciamento)
+    sensitivity = None
+    if (_flag(data, 'sensitivity', True) and params.get('model', 'gbm') == 'gbm'
+            and not params.get('rebalancing')):
+        sensitivity = compute_sensitivity(terminal_shocks_from_paths(results, params), params)
+
+    return {
+        'status': 'success',
+        'chart': graphJSON,
+        'table': table_data,
+        'distribution': results.get('distribution'),
+        'sensitivity': sensitivity,
+        'goals': format_goals(results['goals'], results['time']) if 'goals' in results else None,
+        'risk': results.get('risk'),
+        'rebalancing': results.get('rebalancing')
+    }
+
+def _flag(data: dict, key: str, default: bool) -> bool:
+    """
+    Opzione booleana della richiesta JSON: accetta true/false e le stringhe
+    "true"/"false", "1"/"0", "yes"/"no", "on"/"off" (bool("false") sarebbe True).
+    """
+    value = data.get(key)
+    if value is None:
+        return default
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ('true', '1', 'yes', 'on'):
+            return True
+        if value in ('false', '0', 'no', 'off', ''):
+            return False
+        raise ValueError(f"Valore non valido per {key}: {data.get(key)!r}")
+    return bool(value)
+
+def _rebalancing_params(data: dict) -> dict:
+    """
+    Parametri per asset del motore di ribilanciamento: pesi dell'allocazione,
+    mu e covarianza dal modello corrente o dalla finestra storica richiesta.
+    Soglia e costi arrivano in percentuale, come mu e sigma.
+    """
+    if data.get('lookback') is not None:
+        assets = ASSET_STORE.window_stats.asset_inputs(data.get('weights'), data['lookback'], data.get('as_of'))
+        weights, mu, covariance = assets['weights'], assets['mu'], assets['covariance']
+    else:
+        model = ASSET_STORE.model
+        weights, mu, covariance = model.weights_vector(data.get('weights')), model.mu, model.covariance
+
+    # mu/sigma equivalenti del portafoglio (sottotitolo del grafico)
+    held = weights > 0
+    w = weights[held] / weights[held].sum() if held.any() else weights[held]
+    return {
+        'asset_weights': weights,
+        'asset_mu': mu,
+        'asset_covariance': covariance,
+        'mu': float(w @ mu[held]),
+        'sigma': float(np.sqrt(max(w @ covariance[np.ix_(held, held)] @ w, 0.0))),
+        'rebalancing': data['rebalancing'],
+        'threshold': float(data.get('threshold', 5)) / 100,
+        'transaction_cost': float(data.get('transaction_cost', 0)) / 100
+    }
+
+@app.route('/frontier', methods=['POST'])
+def frontier():
+    try:
+        data = request.json or {}
+        model = ASSET_STORE.model
+        result = efficient_frontier(
+            model,
+            current_weights=data.get('weights'),      # {chiave asset: peso %}
+            constraints=data.get('constraints'),      # {categoria: [min%, max%]}
+            n_candidates=min(int(data.get('n_candidates', 20000)), 100000),
+            n_points=int(data.get('n_points', 40))
+        )
+        return jsonify({'status': 'success', 'data_version': model.version, **result})
 
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 400
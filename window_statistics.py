@@ -0,0 +1,274 @@
+"""
+window_statistics.py
+Statistiche per finestra storica (lookback) precalcolate dalla pipeline dati.
+
+Per ogni fine mese e per ogni lookback (10, 20, 30 anni e storia completa)
+salva mu, sigma e matrice di covarianza annualizzati degli asset, calcolati
+sui rendimenti mensili disponibili nella finestra. Tutte le finestre si
+ottengono in un solo passaggio da somme cumulate (conteggi, somme, prodotti
+incrociati) sull'asse del tempo: finestra = C[t] - C[t - L].
+
+L'artefatto è un NPZ in float32 indicizzato per (lookback, mese, asset):
+la risoluzione di un lookback in web_app è un accesso diretto all'array.
+Il calcolo (pipeline dati) usa pandas, importato al primo uso: il caricamento
+e la lettura dell'artefatto in web_app richiedono solo numpy.
+"""
+
+import json
+import os
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+DEFAULT_STATS_PATH = os.path.join('static', 'asset_stats.npz')
+
+# Finestre in anni; 0 = storia completa (finestra espandente)
+LOOKBACK_YEARS = (0, 10, 20, 30)
+FULL_HISTORY = 'full'
+
+# Mesi minimi nella finestra perché una statistica sia considerata valida
+MIN_MONTHS = 24
+
+MONTHS_PER_YEAR = 12
+
+
+def compute_window_statistics(monthly: 'pd.DataFrame', lookbacks=LOOKBACK_YEARS) -> dict:
+    """
+    Calcola mu/sigma/covarianze annualizzati per tutte le finestre e tutti i mesi.
+
+    Args:
+        monthly: DataFrame largo dei rendimenti mensili (indice fine mese, colonne = asset),
+                 NaN dove l'asset non ha storico
+        lookbacks: finestre in anni (0 = espandente)
+
+    Returns:
+        dict di array (vedi save_window_statistics): mu/sigma [L, T, N],
+        covariance [L, T, N, N], n_obs [L, T, N]
+    """
+    import pandas as pd
+
+    # Mesi contigui: la posizione di un mese nell'artefatto è aritmetica
+    monthly = monthly.reindex(pd.date_range(monthly.index[0], monthly.index[-1], freq='ME'))
+    values = monthly.to_numpy(dtype=float)
+    mask = ~np.isnan(values)
+    m = mask.astype(float)
+
+    # Centra sulla media dell'intero campione: le covarianze non cambiano,
+    # le somme cumulate restano piccole (meno cancellazione numerica)
+    col_mean = np.nanmean(values, axis=0)
+    x = np.where(mask, values - col_mean, 0.0)
+
+    # Somme cumulate dei termini a coppie, con una riga di zeri iniziale
+    # (C[t+1] - C[t+1-L] = somma sui mesi t-L+1..t)
+    def cumulative(a):
+        return np.concatenate([np.zeros((1,) + a.shape[1:]), np.cumsum(a, axis=0)])
+
+    c_n = cumulative(m[:, :, None] * m[:, None, :])          # n_ij
+    c_sx = cumulative(x[:, :, None] * m[:, None, :])         # Σ x_i (dove c'è anche j)
+    c_sxy = cumulative(x[:, :, None] * x[:, None, :])        # Σ x_i x_j
+
+    n_months = len(values)
+    end = np.arange(1, n_months + 1)
+
+    shape = (len(lookbacks), n_months) + values.shape[1:]
+    mu = np.full(shape, np.nan)
+    sigma = np.full(shape, np.nan)
+    covariance = np.full(shape + values.shape[1:], np.nan)
+    n_obs = np.zeros(shape, dtype=np.int32)
+
+    diag = np.arange(values.shape[1])
+    for li, years in enumerate(lookbacks):
+        start = np.zeros_like(end) if years == 0 else np.maximum(end - years * MONTHS_PER_YEAR, 0)
+        n = c_n[end] - c_n[start]
+        sx = c_sx[end] - c_sx[start]
+        sxy = c_sxy[end] - c_sxy[start]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = (sxy - sx * np.swapaxes(sx, 1, 2) / n) / (n - 1)
+            mean = sx[:, diag, diag] / n[:, diag, diag] + col_mean
+
+        valid = n >= MIN_MONTHS
+        cov[~valid] = np.nan
+        n_diag = n[:, diag, diag]
+        mean[n_diag < MIN_MONTHS] = np.nan
+
+        covariance[li] = cov * MONTHS_PER_YEAR
+        mu[li] = mean * MONTHS_PER_YEAR
+        sigma[li] = np.sqrt(cov[:, diag, diag] * MONTHS_PER_YEAR)
+        n_obs[li] = n_diag.astype(np.int32)
+
+    return {
+        'keys': list(monthly.columns),
+        'months': monthly.index.values.astype('datetime64[M]'),
+        'lookbacks': np.asarray(lookbacks, dtype=np.int16),
+        'mu': mu,
+        'sigma': sigma,
+        'covariance': covariance,
+        'n_obs': n_obs
+    }
+
+
+def save_window_statistics(window_stats: dict, names: dict, path: str = DEFAULT_STATS_PATH):
+    """
+    Scrive l'artefatto NPZ in float32 (covarianze come triangolo superiore), in modo atomico.
+    """
+    keys = window_stats['keys']
+    iu = np.triu_indices(len(keys))
+    covariance = window_stats['covariance']
+    meta = {
+        'keys': keys,
+        'names': [names.get(k, k) for k in keys],
+        'first_month': str(window_stats['months'][0]),
+        'last_month': str(window_stats['months'][-1]),
+        'min_months': MIN_MONTHS
+    }
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}.npz"
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            months=window_stats['months'],
+            lookbacks=window_stats['lookbacks'],
+            mu=window_stats['mu'].astype(np.float32),
+            sigma=window_stats['sigma'].astype(np.float32),
+            covariance=covariance[..., iu[0], iu[1]].astype(np.float32),
+            n_obs=np.minimum(window_stats['n_obs'], np.iinfo(np.int16).max).astype(np.int16),
+            meta=np.array(json.dumps(meta))
+        )
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class WindowStatisticsStore:
+    """
+    Artefatto delle statistiche per finestra caricato in memoria.
+
+    resolve() trova gli input di un (lookback, mese) con soli accessi diretti:
+    lookback -> indice da dizionario, mese -> aritmetica sul primo mese.
+    """
+
+    def __init__(self, path: str = DEFAULT_STATS_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            self.months = data['months']
+            self.lookbacks = [int(y) for y in data['lookbacks']]
+            self.mu = data['mu']
+            self.sigma = data['sigma']
+            self.covariance = data['covariance']
+            self.n_obs = data['n_obs']
+
+        self.keys = meta['keys']
+        self.names = meta['names']
+        self.index = {k: i for i, k in enumerate(self.keys)}
+        self.min_months = meta['min_months']
+        self._lookback_index = {(y or FULL_HISTORY): i for i, y in enumerate(self.lookbacks)}
+        self._first_month = int(self.months[0].astype(np.int64))
+        self._triu = np.triu_indices(len(self.keys))
+
+    @property
+    def available_lookbacks(self) -> list:
+        return list(self._lookback_index)
+
+    def _lookback_position(self, lookback) -> int:
+        if lookback is None or str(lookback).lower() == FULL_HISTORY:
+            lookback = FULL_HISTORY
+        else:
+            lookback = int(lookback)
+        if lookback not in self._lookback_index:
+            raise ValueError(f"Lookback non disponibile: {lookback} "
+                             f"(disponibili: {', '.join(map(str, self.available_lookbacks))})")
+        return self._lookback_index[lookback]
+
+    def _month_position(self, as_of) -> int:
+        if as_of is None:
+            return len(self.months) - 1
+        import pandas as pd   # solo per interpretare la data richiesta
+
+        month = pd.Timestamp(as_of)
+        pos = (month.year - 1970) * 12 + month.month - 1 - self._first_month
+        if not 0 <= pos < len(self.months):
+            raise ValueError(f"Data fuori dallo storico: {as_of} "
+                             f"({self.months[0]} - {self.months[-1]})")
+        return pos
+
+    def resolve(self, lookback=None, as_of=None) -> dict:
+        """
+        Input precalcolati per un lookback (anni o 'full') a una data (default: ultimo mese).
+
+        Returns:
+            dict con keys, mu, sigma, covariance (N x N), n_obs, lookback, as_of
+        """
+        li = self._lookback_position(lookback)
+        ti = self._month_position(as_of)
+
+        n = len(self.keys)
+        covariance = np.empty((n, n))
+        covariance[self._triu] = self.covariance[li, ti]
+        covariance.T[self._triu] = self.covariance[li, ti]
+
+        return {
+            'keys': self.keys,
+            'mu': self.mu[li, ti].astype(float),
+            'sigma': self.sigma[li, ti].astype(float),
+            'covariance': covariance,
+            'n_obs': self.n_obs[li, ti].astype(int),
+            'lookback': self.lookbacks[li] or FULL_HISTORY,
+            'as_of': str(self.months[ti])
+        }
+
+    def asset_inputs(self, weights: dict, lookback=None, as_of=None) -> dict:
+        """
+        Input per asset di un lookback per i pesi dati (in %, normalizzati):
+        vettore dei pesi, mu e covarianza degli asset.
+
+        Gli asset con peso non nullo devono avere almeno min_months mesi nella finestra;
+        mu e covarianza degli asset non detenuti possono essere NaN.
+        """
+        inputs = self.resolve(lookback, as_of)
+        w = np.zeros(len(self.keys))
+        for key, value in (weights or {}).items():
+            if key not in self.index:
+                raise ValueError(f"Asset sconosciuto: {key}")
+            w[self.index[key]] = float(value)
+        if w.sum() <= 0:
+            raise ValueError("Pesi del portafoglio mancanti o nulli")
+        w = w / w.sum()
+
+        held = w > 0
+        short = [self.keys[i] for i in np.flatnonzero(held & ~np.isfinite(inputs['mu']))]
+        if short:
+            raise ValueError(f"Storico insufficiente nella finestra {inputs['lookback']} per: "
+                             f"{', '.join(short)}")
+        if not np.isfinite(inputs['covariance'][np.ix_(held, held)]).all():
+            raise ValueError(f"Covarianze non disponibili nella finestra {inputs['lookback']}")
+
+        return {'weights': w, 'mu': inputs['mu'], 'covariance': inputs['covariance'],
+                'lookback': inputs['lookback'], 'as_of': inputs['as_of']}
+
+    def portfolio_inputs(self, weights: dict, lookback=None, as_of=None) -> dict:
+        """
+        mu/sigma annualizzati del portafoglio (pesi in %, normalizzati) per un lookback.
+
+        Gli asset con peso non nullo devono avere almeno min_months mesi nella finestra.
+        """
+        inputs = self.asset_inputs(weights, lookback, as_of)
+        w = inputs['weights']
+        held = w > 0
+        mu = float(w[held] @ inputs['mu'][held])
+        cov = inputs['covariance'][np.ix_(held, held)]
+        sigma = float(np.sqrt(max(w[held] @ cov @ w[held], 0.0)))
+        return {'mu': mu, 'sigma': sigma, 'lookback': inputs['lookback'], 'as_of': inputs['as_of']}
+
+def load_window_statistics(path: str = DEFAULT_STATS_PATH):
+    """
+    Carica l'artefatto se presente (None altrimenti: lookback non disponibili).
+    """
+    if not os.path.exists(path):
+        return None
+    return WindowStatisticsStore(path)